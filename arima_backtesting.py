@@ -1,100 +1,161 @@
-import warnings
-warnings.filterwarnings('ignore', category=FutureWarning)
-
-from pmdarima import auto_arima
-from backtesting import Backtest, Strategy
-from utils import get_spy_data
-from plotting import create_backtest_visualization
-
-# ARIMA Trading Strategy Class
-class ARIMAStrategy(Strategy):
-    def init(self):
-        # Fit ARIMA model on the full dataset
-        print("Fitting ARIMA model for backtesting...")
-        try:
-            self.model = auto_arima(self.data.Close, seasonal=False, stepwise=True, 
-                                  max_p=3, max_q=3, suppress_warnings=True)
-            print(f"Best ARIMA model: {self.model.order}")
-        except Exception as e:
-            print(f"Error fitting ARIMA model: {e}")
-            self.model = None
-    
-    def next(self):
-        if self.model is None:
-            return
-            
-        try:
-            # Generate forecast
-            forecast, conf_int = self.model.predict(n_periods=5, return_conf_int=True)
-            lo, hi = conf_int[:,0].min(), conf_int[:,1].max()
-            current_price = self.data.Close[-1]
-            
-            # Trading signals based on ARIMA confidence intervals
-            if current_price < lo:  # Price below lower bound - go long
-                if not self.position:
-                    self.buy()
-            elif current_price > hi:  # Price above upper bound - go short
-                if not self.position:
-                    self.sell()
-            else:  # Price within range - close position
-                if self.position:
-                    self.position.close()
-                    
-        except Exception:
-            # If forecast fails, do nothing
-            pass
-
-print("Starting ARIMA Backtesting Strategy...")
+"""
+ARIMA trading strategy backtest
 
-# 1. Load data with error handling using utils
-data = get_spy_data(for_backtesting=True, date_range=("2020-01-01", "2025-06-24"))
+Heavy dependencies (backtesting, pmdarima, matplotlib) are imported on the code
+path that needs them, so importing this module is cheap.
+"""
 
-if data is None or data.empty:
-    print("Failed to obtain data. Exiting.")
-    exit(1)
-
-# Clean the data by removing any NaN values and interpolating missing values
-print(f"Data shape before cleaning: {data.shape}")
-print(f"NaN values before cleaning: {data.isnull().sum().sum()}")
-
-# Fill any missing values and ensure no NaN values remain
-data = data.ffill().bfill()
-data = data.dropna()
+import argparse
+import warnings
+warnings.filterwarnings('ignore', category=FutureWarning)
 
-# Ensure all OHLC relationships are maintained
-data['High'] = data[['Open', 'High', 'Low', 'Close']].max(axis=1)
-data['Low'] = data[['Open', 'High', 'Low', 'Close']].min(axis=1)
+from instrumentation import span, timed
+from utils import get_ticker_data, ohlc_bounds
 
-print(f"Data shape after cleaning: {data.shape}")
-print(f"NaN values after cleaning: {data.isnull().sum().sum()}")
+def __getattr__(name):
+    # ARIMAStrategy lives in strategy.py; importing it pulls in backtesting
+    if name in ('ARIMAStrategy', 'aggregate_band'):
+        import strategy
+        return getattr(strategy, name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
-close = data['Close']
-print(f"Successfully loaded {len(close)} data points from {close.index[0].date()} to {close.index[-1].date()}")
-print(f"Price range: ${close.min():.2f} - ${close.max():.2f}")
+@timed('backtest.clean_data')
+def clean_backtest_data(data):
+    """Fill missing values and enforce consistent OHLC relationships"""
+    # Fill any missing values and ensure no NaN values remain
+    data = data.ffill().bfill()
+    data = data.dropna()
+    
+    # Ensure all OHLC relationships are maintained, on the raw array
+    values = ohlc_bounds(data[['Open', 'High', 'Low', 'Close']].to_numpy(dtype=float, copy=True))
+    data['High'] = values[:, 1]
+    data['Low'] = values[:, 2]
+    return data
 
-# 2. Run backtest
-print("Running backtest...")
-try:
+def run_backtest(data, cash=10000, commission=.001, engine='backtesting', **strategy_params):
+    """
+    Run the ARIMA strategy backtest on cleaned OHLC data
+    
+    Args:
+        data (pandas.DataFrame): OHLCV data
+        cash (float): Initial capital
+        commission (float): Commission per trade as a fraction
+        engine (str): 'backtesting' runs the strategy bar by bar in
+            ``backtesting.Backtest``; 'fast' computes the bands once and
+            replays the trades with ``fast_backtest`` (same statistics, no
+            Backtest instance for interactive plots)
+        **strategy_params: Overrides for ARIMAStrategy class parameters
+    
+    Returns:
+        tuple: (stats, bt) - the backtesting statistics and the Backtest
+        instance (None for the fast engine); ``stats['_orders']`` lists the
+        (bar, order) of every ARIMA order selection
+    """
+    if engine == 'fast':
+        from fast_backtest import run_band_backtest
+        from strategy import strategy_bands
+        
+        with span('backtest.run', n_bars=len(data), engine=engine):
+            orders = []
+            lo, hi = strategy_bands(data['Close'].to_numpy(), orders=orders, **strategy_params)
+            stats = run_band_backtest(data, lo, hi, cash=cash, commission=commission)
+        stats['_orders'] = orders
+        return stats, None
+    if engine != 'backtesting':
+        raise ValueError(f"Unknown backtest engine: {engine!r}")
+    
+    from backtesting import Backtest
+    from strategy import ARIMAStrategy
+    
     bt = Backtest(data, ARIMAStrategy,
-                  cash=10000, commission=.001,
+                  cash=cash, commission=commission,
                   hedging=True, exclusive_orders=True)
-    stats = bt.run()
-    print("\n=== Backtest Results ===")
-    print(stats)
+    with span('backtest.run', n_bars=len(data)):
+        stats = bt.run(**strategy_params)
+    stats['_orders'] = stats['_strategy'].arima_orders
+    return stats, bt
+
+def describe_orders(orders):
+    """Summarize (bar, order) selections as e.g. '(1, 1, 0) x3, (2, 1, 1) x1'"""
+    counts = {}
+    for _, order in orders:
+        order = tuple(int(o) for o in order)
+        counts[order] = counts.get(order, 0) + 1
+    return ', '.join(f"{order} x{count}" for order, count in counts.items())
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Backtest the ARIMA trading strategy")
+    parser.add_argument('--ticker', default="SPY", help="Ticker symbol (default: SPY)")
+    parser.add_argument('--start', default="2020-01-01", help="Start date (YYYY-MM-DD)")
+    parser.add_argument('--end', default="2025-06-24", help="End date (YYYY-MM-DD)")
+    parser.add_argument('--backend', default="pmdarima", choices=['pmdarima', 'fast'],
+                        help="Order search backend (default: pmdarima)")
+    parser.add_argument('--engine', default="backtesting", choices=['backtesting', 'fast'],
+                        help="Backtest engine (default: backtesting)")
+    parser.add_argument('--interval', default=None,
+                        help="Backtest on intraday bars of this interval, e.g. 5m (see intraday.py)")
+    parser.add_argument('--bar-size', default=None, help="Resample intraday bars to this size, e.g. 15min")
+    parser.add_argument('--train-window', type=int, default=None, help="Walk-forward training window in bars")
+    parser.add_argument('--reselect-every', type=int, default=None, help="Bars between order re-selections")
+    parser.add_argument('--no-plots', action='store_true', help="Skip the visualizations")
+    args = parser.parse_args(argv)
+    
+    print("Starting ARIMA Backtesting Strategy...")
     
-    # Additional performance metrics
-    print("\n=== Additional Metrics ===")
-    print(f"Total Return: {stats['Return [%]']:.2f}%")
-    print(f"Sharpe Ratio: {stats['Sharpe Ratio']:.3f}")
-    print(f"Max Drawdown: {stats['Max. Drawdown [%]']:.2f}%")
-    print(f"Number of Trades: {stats['# Trades']}")
-    if stats['# Trades'] > 0:
-        print(f"Win Rate: {stats['Win Rate [%]']:.2f}%")
+    # 1. Load data with error handling using utils
+    if args.interval:
+        from intraday import load_intraday
+        data = load_intraday(args.ticker, (args.start, args.end), interval=args.interval, bar_size=args.bar_size)
+    else:
+        data = get_ticker_data(args.ticker, for_backtesting=True, date_range=(args.start, args.end))
     
-    # 3. Create visualizations
-    print("\nCreating visualizations...")
-    create_backtest_visualization(data, stats, bt)
+    if data is None or data.empty:
+        print("Failed to obtain data. Exiting.")
+        exit(1)
     
-except Exception as e:
-    print(f"Error running backtest: {e}")
-    print("This might be due to insufficient data or model fitting issues.")
+    # Clean the data by removing any NaN values and interpolating missing values
+    print(f"Data shape before cleaning: {data.shape}")
+    print(f"NaN values before cleaning: {data.isnull().sum().sum()}")
+    
+    data = clean_backtest_data(data)
+    
+    print(f"Data shape after cleaning: {data.shape}")
+    print(f"NaN values after cleaning: {data.isnull().sum().sum()}")
+    
+    close = data['Close']
+    print(f"Successfully loaded {len(close)} data points from {close.index[0].date()} to {close.index[-1].date()}")
+    print(f"Price range: ${close.min():.2f} - ${close.max():.2f}")
+    
+    # 2. Run backtest
+    print("Running backtest...")
+    try:
+        strategy_params = {name: value for name, value in (('train_window', args.train_window),
+                                                           ('reselect_every', args.reselect_every))
+                           if value is not None}
+        commission = .001
+        stats, _ = run_backtest(data, commission=commission, engine=args.engine, backend=args.backend,
+                                **strategy_params)
+        print("\n=== Backtest Results ===")
+        print(stats)
+        
+        # Additional performance metrics
+        print("\n=== Additional Metrics ===")
+        print(f"Total Return: {stats['Return [%]']:.2f}%")
+        print(f"Sharpe Ratio: {stats['Sharpe Ratio']:.3f}")
+        print(f"Max Drawdown: {stats['Max. Drawdown [%]']:.2f}%")
+        print(f"Number of Trades: {stats['# Trades']}")
+        if stats['# Trades'] > 0:
+            print(f"Win Rate: {stats['Win Rate [%]']:.2f}%")
+        
+        # 3. Create visualizations
+        if not args.no_plots:
+            print("\nCreating visualizations...")
+            from plotting import create_backtest_visualization
+            create_backtest_visualization(data, stats, ticker=args.ticker, commission=commission)
+        
+    except Exception as e:
+        print(f"Error running backtest: {e}")
+        print("This might be due to insufficient data or model fitting issues.")
+
+if __name__ == "__main__":
+    main()
@@ -1,75 +1,162 @@
+"""
+ARIMA price forecast
+
+Heavy dependencies (pmdarima, matplotlib) are imported on the code path that
+needs them, so importing this module is cheap.
+"""
+
+import argparse
 import warnings
-from pmdarima import auto_arima
-from utils import get_spy_data
-from plotting import create_dual_plot
 from datetime import datetime, timedelta
 
+import numpy as np
+import pandas as pd
+
+from instrumentation import span
+from utils import get_ticker_data
+
 # Suppress future warnings and statsmodels warnings to clean up output
 warnings.filterwarnings('ignore', category=FutureWarning)
 warnings.filterwarnings('ignore', message='No supported index is available')
 warnings.filterwarnings('ignore', category=UserWarning, module='statsmodels')
 
-# Download SPY data with error handling
-print("Starting ARIMA modeling for SPY...")
-
-# Calculate yesterday's date
-yesterday = (datetime.now() - timedelta(days=1)).strftime('%Y-%m-%d')
-
-# Use the utility function to get SPY data for ARIMA modeling
-data = get_spy_data(for_backtesting=False, date_range=("2024-01-01", yesterday))
-
-if data is None or len(data) == 0:
-    print("Failed to obtain data. Exiting.")
-    exit(1)
-
-# Remove missing values (important for FRED and other sources)
-data = data.dropna()
-
-print(f"Successfully loaded {len(data)} data points from {data.index[0].date()} to {data.index[-1].date()}")
-print(f"Price range: ${data.min():.2f} - ${data.max():.2f}")
-
+def run_forecast_bands(data, n_periods=5, levels=(0.8, 0.95), information_criterion="bic", max_p=3, max_q=3,
+                       cache=True, backend="pmdarima"):
+    """
+    Fit an ARIMA model to a close price series and forecast bands for several levels
+    
+    The forecast mean and variance come from one forecast call; the bands of
+    all confidence levels are derived from them (see ``forecast_bands.level_bands``).
+    
+    Args:
+        data (pandas.Series): Close prices with DatetimeIndex
+        n_periods (int): Forecast horizon
+        levels (iterable): Confidence levels, e.g. (0.5, 0.8, 0.95)
+        information_criterion (str): Criterion for the auto_arima order search
+        max_p (int): Maximum AR order
+        max_q (int): Maximum MA order
+        cache (ModelCache or bool): Model selection cache, see ``model_cache.cached_auto_arima``
+        backend (str): Order search backend, 'pmdarima' or 'fast' (see ``arima_backends``)
+    
+    Returns:
+        tuple: (model, forecast, bands) - fitted model, forecast values (a
+        Series indexed by the forecast dates for a Series input, like
+        ``model.predict``) and a dict level -> (lo, hi) bound arrays
+    """
+    from forecast_bands import level_bands
+    from model_cache import cached_auto_arima
+    
+    with span('model.select', n_obs=len(data)):
+        model = cached_auto_arima(data, cache=cache, seasonal=False, stepwise=True,
+                                  information_criterion=information_criterion, max_p=max_p, max_q=max_q,
+                                  suppress_warnings=True, backend=backend)
+    with span('model.forecast', n_periods=n_periods, n_levels=len(levels)):
+        prediction = model.arima_res_.get_forecast(n_periods)
+        forecast = prediction.predicted_mean
+        bands = level_bands(np.asarray(forecast, dtype=float), np.asarray(prediction.var_pred_mean, dtype=float),
+                            levels)
+    return model, forecast, bands
 
+def run_forecast(data, n_periods=5, information_criterion="bic", max_p=3, max_q=3, cache=True,
+                 backend="pmdarima", level=0.95):
+    """
+    Fit an ARIMA model to a close price series and forecast it
+    
+    Args:
+        data (pandas.Series): Close prices with DatetimeIndex
+        n_periods (int): Forecast horizon
+        information_criterion (str): Criterion for the auto_arima order search
+        max_p (int): Maximum AR order
+        max_q (int): Maximum MA order
+        cache (ModelCache or bool): Model selection cache, see ``model_cache.cached_auto_arima``
+        backend (str): Order search backend, 'pmdarima' or 'fast' (see ``arima_backends``)
+        level (float): Confidence level of the bounds (default: 0.95)
+    
+    Returns:
+        tuple: (model, forecast, lo, hi) - fitted model, forecast values (a
+        Series with the forecast dates for a Series input) and the lower/upper
+        confidence bounds as NumPy arrays
+    """
+    model, forecast, bands = run_forecast_bands(data, n_periods=n_periods, levels=(level,),
+                                                information_criterion=information_criterion,
+                                                max_p=max_p, max_q=max_q, cache=cache, backend=backend)
+    lo, hi = bands[float(level)]
+    return model, forecast, lo, hi
 
-# Fit ARIMA model
-print("Fitting ARIMA model...")
-try:
-    model = auto_arima(data, seasonal=False, stepwise=True,
-                       information_criterion="bic", max_p=3, max_q=3,
-                       suppress_warnings=True)
-    print(f"Best ARIMA model: {model.order}")
+def main(argv=None):
+    # Calculate yesterday's date
+    yesterday = (datetime.now() - timedelta(days=1)).strftime('%Y-%m-%d')
     
-    # Generate forecast
-    forecast, conf_int = model.predict(n_periods=5, return_conf_int=True)
-    lo, hi = conf_int[:,0], conf_int[:,1]
+    parser = argparse.ArgumentParser(description="Forecast prices with an ARIMA model")
+    parser.add_argument('--ticker', default="SPY", help="Ticker symbol (default: SPY)")
+    parser.add_argument('--start', default="2024-01-01", help="Start date (YYYY-MM-DD)")
+    parser.add_argument('--end', default=yesterday, help="End date (YYYY-MM-DD, default: yesterday)")
+    parser.add_argument('--periods', type=int, default=5, help="Forecast horizon (default: 5)")
+    parser.add_argument('--levels', type=float, nargs='+', default=[0.5, 0.8, 0.95],
+                        help="Confidence levels of the forecast bands (default: 0.5 0.8 0.95)")
+    parser.add_argument('--backend', default="pmdarima", choices=['pmdarima', 'fast'],
+                        help="Order search backend (default: pmdarima)")
+    parser.add_argument('--no-plots', action='store_true', help="Skip the visualization")
+    args = parser.parse_args(argv)
     
-    print("\n=== ARIMA Forecast Results ===")
-    current_date = data.index[-1].strftime('%Y-%m-%d')
-    print(f"Current price ({current_date}): ${data.iloc[-1]:.2f}")
-    print("Forecast horizon: 5 periods")
-    print(f"Predicted range: ${lo.min():.2f} – ${hi.max():.2f}")
-    print(f"Average forecast: ${forecast.mean():.2f}")
+    # Download data with error handling
+    print(f"Starting ARIMA modeling for {args.ticker}...")
     
-    # Show individual forecasts with dates
-    print("\nDetailed 5-day forecast:")
-    n = min(5, len(forecast), len(lo), len(hi))
-    if n == 0:
-        print("No forecast values available.")
-    else:
-        import pandas as pd
-        last_date = data.index[-1]
-        forecast_dates = pd.date_range(start=last_date + pd.Timedelta(days=1), periods=n, freq='D')
-        
-        for i in range(n):
-            # forecast is a Pandas Series, lo/hi are NumPy Arrays
-            f_val = float(forecast.iloc[i])
-            l_val = float(lo[i])
-            h_val = float(hi[i])
-            date_str = forecast_dates[i].strftime('%Y-%m-%d')
-            print(f"Day {i+1} ({date_str}): ${f_val:.2f} (Range: ${l_val:.2f} - ${h_val:.2f})")
+    # Use the utility function to get data for ARIMA modeling
+    data = get_ticker_data(args.ticker, for_backtesting=False, date_range=(args.start, args.end))
+    
+    if data is None or len(data) == 0:
+        print("Failed to obtain data. Exiting.")
+        exit(1)
     
-    # Visualization of price data with forecast
-    create_dual_plot(data, forecast, lo, hi)
+    # Remove missing values (important for FRED and other sources)
+    data = data.dropna()
+    
+    print(f"Successfully loaded {len(data)} data points from {data.index[0].date()} to {data.index[-1].date()}")
+    print(f"Price range: ${data.min():.2f} - ${data.max():.2f}")
+    
+    # Fit ARIMA model
+    print("Fitting ARIMA model...")
+    try:
+        levels = sorted(set(args.levels))
+        model, forecast, bands = run_forecast_bands(data, n_periods=args.periods, levels=levels,
+                                                    backend=args.backend)
+        # The widest band is reported; all levels are drawn in the fan chart
+        level = levels[-1]
+        lo, hi = bands[level]
+        print(f"Best ARIMA model: {model.order}")
+        
+        print("\n=== ARIMA Forecast Results ===")
+        current_date = data.index[-1].strftime('%Y-%m-%d')
+        print(f"Current price ({current_date}): ${data.iloc[-1]:.2f}")
+        print(f"Forecast horizon: {args.periods} periods")
+        print(f"Predicted range ({level:.0%} band): ${lo.min():.2f} – ${hi.max():.2f}")
+        print(f"Average forecast: ${forecast.mean():.2f}")
         
-except Exception as e:
-    print(f"Error fitting ARIMA model: {e}")
-    print("This might be due to insufficient data or data quality issues.")
+        # Show individual forecasts with dates
+        print(f"\nDetailed {args.periods}-day forecast:")
+        n = min(args.periods, len(forecast), len(lo), len(hi))
+        if n == 0:
+            print("No forecast values available.")
+        else:
+            last_date = data.index[-1]
+            forecast_dates = pd.date_range(start=last_date + pd.Timedelta(days=1), periods=n, freq='D')
+            
+            for i in range(n):
+                f_val = float(forecast.iloc[i])
+                l_val = float(lo[i])
+                h_val = float(hi[i])
+                date_str = forecast_dates[i].strftime('%Y-%m-%d')
+                print(f"Day {i+1} ({date_str}): ${f_val:.2f} (Range: ${l_val:.2f} - ${h_val:.2f})")
+        
+        # Visualization of price data with forecast
+        if not args.no_plots:
+            from plotting import create_dual_plot
+            create_dual_plot(data, forecast, lo, hi, bands=bands)
+            
+    except Exception as e:
+        print(f"Error fitting ARIMA model: {e}")
+        print("This might be due to insufficient data or data quality issues.")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,135 @@
+"""
+Concurrent data-source racing with per-source deadlines
+"""
+
+import asyncio
+import contextvars
+import functools
+from concurrent.futures import ThreadPoolExecutor
+
+# Default per-source deadlines in seconds
+SOURCE_DEADLINES = {
+    'yfinance': 20.0,
+    'fred': 20.0,
+    'alpha_vantage': 30.0,
+}
+
+# Sources with a small request quota (Alpha Vantage's free tier allows a few
+# requests per minute); they are never hedged, only queried after every source
+# ahead of them has failed
+RATE_LIMITED_SOURCES = frozenset({'alpha_vantage'})
+
+
+def _is_valid(data):
+    return data is not None and not data.empty
+
+
+async def race_sources_async(ticker, date_range, sources, deadlines=None, hedge_delay=1.0,
+                             default_deadline=30.0, rate_limited=RATE_LIMITED_SOURCES):
+    """
+    Query several data sources concurrently and return the best valid response
+
+    Source i is started ``i * hedge_delay`` seconds after the first one unless
+    the result is already decided (``hedge_delay=0`` starts all at once). The
+    result is the response of the highest-priority source that returns valid
+    data: a lower-priority response is only accepted once every source ahead
+    of it has failed or missed its deadline. Remaining requests are cancelled.
+    Rate-limited sources are not hedged: they are started only once every
+    source ahead of them has come back empty, so a request is not spent on
+    them while a better source may still answer.
+
+    Args:
+        ticker (str): Ticker symbol
+        date_range (tuple): (start_date, end_date) as strings
+        sources (list): (name, fetch) pairs in priority order, where
+            ``fetch(ticker, date_range)`` is a blocking download function
+        deadlines (dict): Source name -> deadline in seconds (default: SOURCE_DEADLINES)
+        hedge_delay (float): Delay in seconds between starting consecutive sources
+        default_deadline (float): Deadline for sources missing from ``deadlines``
+        rate_limited (set): Names of sources that are only queried as a
+            fallback (default: RATE_LIMITED_SOURCES)
+
+    Returns:
+        tuple: (name, data) of the winning source, or (None, None) if all fail
+    """
+    if deadlines is None:
+        deadlines = SOURCE_DEADLINES
+    loop = asyncio.get_running_loop()
+    executor = ThreadPoolExecutor(max_workers=max(1, len(sources)), thread_name_prefix='data-source')
+
+    async def run_source(position, name, fetch):
+        if name in rate_limited and position:
+            # Only a fallback: wait for every source ahead of it to come back
+            # (a valid response ends the race and cancels this task)
+            await asyncio.wait(tasks[:position])
+        elif position and hedge_delay:
+            await asyncio.sleep(position * hedge_delay)
+        deadline = deadlines.get(name, default_deadline)
+        try:
+            # Run in a copy of this context, so the spans reach an active instrumentation.collect()
+            call = functools.partial(contextvars.copy_context().run, fetch, ticker, date_range)
+            data = await asyncio.wait_for(loop.run_in_executor(executor, call),
+                                          timeout=deadline)
+        except asyncio.TimeoutError:
+            print(f"{name} did not respond within {deadline:.0f}s")
+            return None
+        except Exception as e:
+            print(f"{name} failed: {e}")
+            return None
+        return data if _is_valid(data) else None
+
+    # The tasks only start running at the first await below, once the list is complete
+    tasks = [asyncio.ensure_future(run_source(i, name, fetch)) for i, (name, fetch) in enumerate(sources)]
+    try:
+        for (name, _), task in zip(sources, tasks):
+            # Waiting in priority order: a finished lower-priority task is only
+            # looked at after every task ahead of it has come back empty
+            data = await task
+            if data is not None:
+                return name, data
+        return None, None
+    finally:
+        for task in tasks:
+            task.cancel()
+        # Threads that are still downloading cannot be interrupted; they are
+        # left to finish in the background and their results are discarded
+        executor.shutdown(wait=False, cancel_futures=True)
+
+
+def fetch_sequential(ticker, date_range, sources):
+    """
+    Query the sources one after another in priority order
+
+    Returns:
+        tuple: (name, data) of the first source with valid data, or (None, None)
+    """
+    for name, fetch in sources:
+        try:
+            data = fetch(ticker, date_range)
+        except Exception as e:
+            print(f"{name} failed: {e}")
+            continue
+        if _is_valid(data):
+            return name, data
+    return None, None
+
+
+def race_sources(ticker, date_range, sources, deadlines=None, hedge_delay=1.0, default_deadline=30.0,
+                 rate_limited=RATE_LIMITED_SOURCES):
+    """
+    Blocking wrapper around ``race_sources_async``
+
+    ``asyncio.run`` cannot be called from a thread whose event loop is already
+    running (e.g. in a Jupyter notebook), so there the sources are queried
+    sequentially with ``fetch_sequential`` instead.
+    """
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        pass
+    else:
+        print("Event loop already running, querying data sources sequentially...")
+        return fetch_sequential(ticker, date_range, sources)
+    return asyncio.run(race_sources_async(ticker, date_range, sources, deadlines=deadlines,
+                                          hedge_delay=hedge_delay, default_deadline=default_deadline,
+                                          rate_limited=rate_limited))
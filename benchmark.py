@@ -0,0 +1,229 @@
+"""
+Offline benchmark suite for the data, modeling, backtest and plotting stages
+
+Runs on synthetic data at several series lengths and records wall time, peak
+Python memory (tracemalloc) and per-bar latency for each stage. Results are
+written as JSON and can be compared against a baseline file:
+
+    python benchmark.py --sizes 1y 5y --output benchmarks/current.json
+    python benchmark.py --baseline benchmarks/baseline.json
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import shutil
+import tempfile
+import time
+import tracemalloc
+import warnings
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+warnings.filterwarnings('ignore')
+
+# Series lengths in bars; 'intraday' is one year of 5-minute bars (78 per session)
+SIZES = {
+    '1y': 252,
+    '5y': 1260,
+    '20y': 5040,
+    'intraday': 252 * 78,
+}
+
+# A stage is flagged as a regression when it is this much slower than the baseline
+REGRESSION_THRESHOLD = 1.2
+
+
+def _synthetic_ohlcv(n_bars):
+    from utils import generate_synthetic_spy_data
+
+    # Business days only, so the calendar span is chosen to yield n_bars rows
+    end = pd.Timestamp("2000-01-03") + pd.tseries.offsets.BDay(n_bars - 1)
+    with contextlib.redirect_stdout(io.StringIO()):
+        return generate_synthetic_spy_data("2000-01-03", end, for_backtesting=True)
+
+
+def measure(stage, size, n_bars, func, repeat=1, memory=True):
+    """
+    Time ``func`` and record its peak traced memory
+
+    The fastest of ``repeat`` runs is reported. tracemalloc slows allocation-heavy
+    code down considerably, so memory is measured in one extra run that is not timed.
+    """
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            func()
+        timings.append(time.perf_counter() - start)
+
+    peak = 0
+    if memory:
+        tracemalloc.start()
+        with contextlib.redirect_stdout(io.StringIO()):
+            func()
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+
+    wall = min(timings)
+    result = {
+        'stage': stage,
+        'size': size,
+        'n_bars': n_bars,
+        'wall_s': round(wall, 6),
+        'peak_mb': round(peak / 2 ** 20, 3),
+        'per_bar_us': round(wall / n_bars * 1e6, 3),
+    }
+    print(f"{stage:<22} {size:>9} {wall:>10.3f}s {result['peak_mb']:>10.1f} MB "
+          f"{result['per_bar_us']:>12.1f} us/bar")
+    return result
+
+
+def run_benchmarks(sizes=('1y', '5y', '20y', 'intraday'), repeat=1, stages=None, memory=True):
+    """
+    Run every benchmark stage at every size
+
+    Args:
+        sizes (iterable): Keys of SIZES
+        repeat (int): Repetitions per stage; the fastest run is reported
+        stages (iterable): Subset of 'data_load', 'model_selection',
+            'backtest_per_bar', 'backtest_precomputed', 'backtest_fast', 'plotting'
+            (default: all)
+        memory (bool): Also measure peak memory (one extra run per stage)
+
+    Returns:
+        list: One result dict per (stage, size)
+    """
+    from arima_backtesting import clean_backtest_data, run_backtest
+    from data_cache import LocalDataProvider, OHLCVCache
+    from model_cache import cached_auto_arima
+    from plotting import RENDER_OPTIONS, configure_rendering, create_backtest_visualization
+
+    all_stages = ['data_load', 'model_selection', 'backtest_per_bar', 'backtest_precomputed', 'backtest_fast',
+                  'plotting']
+    stages = list(stages or all_stages)
+    # The plotting stage points the output at the scratch directory; the
+    # caller's settings are put back afterwards
+    render_options = dict(RENDER_OPTIONS)
+    configure_rendering(headless=True)
+    work_dir = tempfile.mkdtemp(prefix='arima_bench_')
+    results = []
+
+    print(f"{'Stage':<22} {'Size':>9} {'Wall':>11} {'Peak mem':>13} {'Per bar':>19}")
+    try:
+        for size in sizes:
+            n_bars = SIZES[size]
+            data = clean_backtest_data(_synthetic_ohlcv(n_bars))
+            date_range = (data.index[0].strftime('%Y-%m-%d'), data.index[-1].strftime('%Y-%m-%d'))
+            backtest_params = dict(use_model_cache=False)
+
+            if 'data_load' in stages:
+                def data_load():
+                    # Cold fetch through the cache followed by a warm read
+                    cache = OHLCVCache(cache_dir=tempfile.mkdtemp(dir=work_dir))
+                    provider = LocalDataProvider(data)
+                    cache.get('BENCH', 'local', date_range, provider)
+                    cache.get('BENCH', 'local', date_range, provider)
+                results.append(measure('data_load', size, n_bars, data_load, repeat, memory))
+
+            if 'model_selection' in stages:
+                results.append(measure('model_selection', size, n_bars, lambda: cached_auto_arima(
+                    data['Close'], cache=False, seasonal=False, stepwise=True, max_p=3, max_q=3,
+                    suppress_warnings=True), repeat, memory))
+
+            if 'backtest_per_bar' in stages:
+                results.append(measure('backtest_per_bar', size, n_bars, lambda: run_backtest(
+                    data, precompute_bands=False, **backtest_params), repeat, memory))
+
+            if 'backtest_precomputed' in stages:
+                results.append(measure('backtest_precomputed', size, n_bars, lambda: run_backtest(
+                    data, precompute_bands=True, **backtest_params), repeat, memory))
+
+            if 'backtest_fast' in stages:
+                results.append(measure('backtest_fast', size, n_bars, lambda: run_backtest(
+                    data, engine='fast', **backtest_params), repeat, memory))
+
+            if 'plotting' in stages:
+                with contextlib.redirect_stdout(io.StringIO()):
+                    stats, _ = run_backtest(data, **backtest_params)
+                configure_rendering(plots_dir=work_dir, results_dir=work_dir)
+                results.append(measure('plotting', size, n_bars, lambda: create_backtest_visualization(
+                    data, stats), repeat, memory))
+    finally:
+        RENDER_OPTIONS.update(render_options)
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    return results
+
+
+def compare(results, baseline, threshold=REGRESSION_THRESHOLD):
+    """
+    Compare results against a baseline
+
+    Returns:
+        pandas.DataFrame: Wall times, the ratio to the baseline and a regression flag
+    """
+    current = pd.DataFrame(results).set_index(['stage', 'size'])
+    previous = pd.DataFrame(baseline['results']).set_index(['stage', 'size'])
+    table = current[['wall_s']].join(previous[['wall_s']], rsuffix='_baseline', how='inner')
+    table['ratio'] = table['wall_s'] / table['wall_s_baseline']
+    table['regression'] = table['ratio'] > threshold
+    return table
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the ARIMA pipeline stages on synthetic data")
+    parser.add_argument('--sizes', nargs='+', default=list(SIZES), choices=list(SIZES),
+                        help="Series lengths to benchmark")
+    parser.add_argument('--stages', nargs='+', default=None,
+                        choices=['data_load', 'model_selection', 'backtest_per_bar',
+                                 'backtest_precomputed', 'backtest_fast', 'plotting'],
+                        help="Stages to benchmark (default: all)")
+    parser.add_argument('--repeat', type=int, default=1, help="Repetitions per stage (fastest is kept)")
+    parser.add_argument('--no-memory', action='store_true', help="Skip the peak memory measurement")
+    parser.add_argument('--output', default=None,
+                        help="JSON output file (default: benchmarks/benchmark_<timestamp>.json)")
+    parser.add_argument('--baseline', default=None, help="Baseline JSON file to compare against")
+    parser.add_argument('--threshold', type=float, default=REGRESSION_THRESHOLD,
+                        help="Slowdown ratio that counts as a regression")
+    args = parser.parse_args(argv)
+
+    results = run_benchmarks(sizes=args.sizes, repeat=args.repeat, stages=args.stages,
+                             memory=not args.no_memory)
+    report = {
+        'created': datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'machine': platform.machine(),
+        'cpu_count': os.cpu_count(),
+        'numpy': np.__version__,
+        'pandas': pd.__version__,
+        'results': results,
+    }
+
+    output = args.output
+    if output is None:
+        os.makedirs('benchmarks', exist_ok=True)
+        output = f"benchmarks/benchmark_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2)
+    print(f"\nBenchmark results saved to: {output}")
+
+    if args.baseline:
+        with open(args.baseline, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+        table = compare(results, baseline, threshold=args.threshold)
+        print("\n=== Comparison with baseline ===")
+        print(table.to_string(float_format=lambda v: f"{v:.3f}"))
+        if table['regression'].any():
+            print(f"\n{int(table['regression'].sum())} stage(s) slower than {args.threshold:.2f}x the baseline")
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,80 @@
+"""
+Command line entry point for the ARIMA trading tools
+
+Usage:
+    python cli.py forecast [--ticker SPY] [--start 2024-01-01] [--end YYYY-MM-DD]
+    python cli.py backtest [--ticker SPY] [--start 2020-01-01] [--end 2025-06-24]
+    python cli.py universe SPY QQQ IWM [--workers 4] [--store price_store] [--journal run_journal.sqlite]
+    python cli.py store SPY QQQ IWM [--path price_store]
+    python cli.py intraday SPY [--interval 1m] [--bar-size 15min] [--store intraday_store]
+    python cli.py sweep [--grid n_periods=1,3,5 --grid max_p=1,2,3]
+    python cli.py robustness [--synthetic 500 --bootstrap 500]
+    python cli.py live SPY QQQ [--replay prices.csv] [--delay 0.5]
+    python cli.py panel SPY QQQ IWM [--no-refine] [--output forecasts.csv]
+    python cli.py evaluate SPY QQQ [--window sliding] [--refit-every 21] [--workers 4]
+    python cli.py journal [--path run_journal.sqlite] [--job JOB]
+    python cli.py results [--list] [--runs RUN ...] [--format html] [--output report.html]
+
+Options before the command:
+    --events FILE     Append one JSON line per timed stage (all processes)
+    --metrics FILE    Write span totals and counters as JSON when done
+    --profile FILE    Run the command under cProfile and save the profile
+
+Each command only imports the modules it needs.
+"""
+
+import contextlib
+import importlib
+import sys
+
+# Command -> module providing main(argv)
+COMMANDS = {
+    'forecast': 'arima_modeling',
+    'backtest': 'arima_backtesting',
+    'universe': 'universe',
+    'store': 'price_store',
+    'intraday': 'intraday',
+    'sweep': 'sweep',
+    'robustness': 'robustness',
+    'live': 'live_service',
+    'panel': 'panel',
+    'evaluate': 'forecast_evaluation',
+    'journal': 'journal',
+    'results': 'results_store',
+}
+
+# Options taking a file name that may precede the command
+GLOBAL_OPTIONS = ('--events', '--metrics', '--profile')
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else list(argv)
+    options = {}
+    while len(argv) >= 2 and argv[0] in GLOBAL_OPTIONS:
+        options[argv[0]] = argv[1]
+        argv = argv[2:]
+    if not argv or argv[0] in ('-h', '--help') or argv[0] not in COMMANDS:
+        print(__doc__.strip())
+        if argv and argv[0] not in ('-h', '--help'):
+            print(f"\nUnknown command: {argv[0]}")
+            return 2
+        return 0
+
+    import instrumentation
+    if '--events' in options:
+        instrumentation.configure(events_file=options['--events'])
+    profiler = (instrumentation.profile(options['--profile']) if '--profile' in options
+                else contextlib.nullcontext())
+
+    try:
+        with profiler, instrumentation.span(f"cli.{argv[0]}"):
+            module = importlib.import_module(COMMANDS[argv[0]])
+            module.main(argv[1:])
+    finally:
+        if '--metrics' in options:
+            print(f"Metrics saved to: {instrumentation.write_metrics(options['--metrics'])}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
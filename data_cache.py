@@ -0,0 +1,207 @@
+"""
+Persistent on-disk cache for downloaded price data
+"""
+
+import json
+import os
+from datetime import datetime, timedelta
+
+import pandas as pd
+
+
+class OHLCVCache:
+    """
+    Parquet cache for price data keyed by ticker and data source.
+
+    Each (ticker, source) pair is stored as one Parquet file plus a small JSON
+    file recording the requested date range that the file covers and when it
+    was last topped up. Requests inside the covered range are served from disk;
+    only the missing head or tail of the range is downloaded and merged in. A
+    top-up that finds no new bars (weekends, holidays) is recorded as checked,
+    so the tail is not requested again until ``max_age_hours`` have passed.
+
+    Parameters:
+    -----------
+    cache_dir : str, optional
+        Directory for the cache files (default: "data_cache")
+    max_age_hours : float, optional
+        A cached range that ends at (or after) the day it was fetched is
+        considered fresh for this many hours; after that the tail is fetched
+        again (default: 12)
+    """
+
+    def __init__(self, cache_dir="data_cache", max_age_hours=12):
+        self.cache_dir = cache_dir
+        self.max_age = timedelta(hours=max_age_hours)
+
+    def _paths(self, ticker, source):
+        name = f"{ticker.upper()}_{source}"
+        return (os.path.join(self.cache_dir, f"{name}.parquet"),
+                os.path.join(self.cache_dir, f"{name}.json"))
+
+    def load(self, ticker, source):
+        """Return (data, meta) for a cached entry, or (None, None) if there is none"""
+        data_path, meta_path = self._paths(ticker, source)
+        if not (os.path.exists(data_path) and os.path.exists(meta_path)):
+            return None, None
+        try:
+            with open(meta_path, 'r', encoding='utf-8') as f:
+                meta = json.load(f)
+            data = pd.read_parquet(data_path)
+        except Exception as e:
+            print(f"Could not read cached {ticker} data ({source}): {e}")
+            return None, None
+
+        if meta.get('kind') == 'series':
+            data = data.iloc[:, 0]
+        return data, meta
+
+    def save(self, ticker, source, data, start, end):
+        """Store data covering the requested range [start, end]"""
+        os.makedirs(self.cache_dir, exist_ok=True)
+        data_path, meta_path = self._paths(ticker, source)
+        is_series = isinstance(data, pd.Series)
+        frame = data.to_frame(name=data.name or 'Close') if is_series else data
+        try:
+            frame.to_parquet(data_path)
+        except ImportError:
+            print("pyarrow not installed, data is not cached. Install it with: pip install pyarrow")
+            return
+        meta = {
+            'kind': 'series' if is_series else 'frame',
+            'start': pd.Timestamp(start).strftime('%Y-%m-%d'),
+            'end': pd.Timestamp(end).strftime('%Y-%m-%d'),
+            'fetched_at': datetime.now().isoformat(timespec='seconds'),
+        }
+        with open(meta_path, 'w', encoding='utf-8') as f:
+            json.dump(meta, f)
+
+    def _update_meta(self, ticker, source, **changes):
+        _, meta_path = self._paths(ticker, source)
+        with open(meta_path, 'r', encoding='utf-8') as f:
+            meta = json.load(f)
+        meta.update(changes)
+        with open(meta_path, 'w', encoding='utf-8') as f:
+            json.dump(meta, f)
+
+    def mark_checked(self, ticker, source):
+        """Record that the tail of a cached entry was just requested and had no new bars"""
+        self._update_meta(ticker, source, checked_at=datetime.now().isoformat(timespec='seconds'))
+
+    def is_stale(self, meta, end):
+        """Check whether the tail up to ``end`` has to be fetched again"""
+        covered_end = pd.Timestamp(meta['end'])
+        if pd.Timestamp(end) <= covered_end:
+            return False
+        # The tail was requested recently and there was nothing new
+        checked_at = meta.get('checked_at')
+        if checked_at and datetime.now() - pd.Timestamp(checked_at).to_pydatetime() <= self.max_age:
+            return False
+        # The cached range already reached the day it was fetched on, so there
+        # cannot be newer bars until it ages out
+        fetched_at = pd.Timestamp(meta['fetched_at'])
+        if covered_end >= fetched_at.normalize():
+            return datetime.now() - fetched_at.to_pydatetime() > self.max_age
+        return True
+
+    def get(self, ticker, source, date_range, fetch):
+        """
+        Return data for ``date_range``, fetching only what is not cached
+
+        Args:
+            ticker (str): Ticker symbol
+            source (str): Name of the data source, part of the cache key
+            date_range (tuple): (start_date, end_date) as strings
+            fetch (callable): ``fetch(ticker, date_range)`` returning a DataFrame,
+                a Series or None
+
+        Returns:
+            pandas.DataFrame or pandas.Series: Data for the range, or None if
+            nothing is cached and the download fails
+        """
+        start, end = pd.Timestamp(date_range[0]), pd.Timestamp(date_range[1])
+        # Days after today cannot be covered yet, whatever range was requested
+        covers_to = min(end, pd.Timestamp.today().normalize())
+        cached, meta = self.load(ticker, source)
+
+        if cached is None or cached.empty:
+            data = fetch(ticker, date_range)
+            if data is None or data.empty:
+                return None
+            self.save(ticker, source, data, start, covers_to)
+            return data
+
+        covered_start, covered_end = pd.Timestamp(meta['start']), pd.Timestamp(meta['end'])
+        parts = [cached]
+        checked = False
+        head_missing = False
+
+        if start < covered_start:
+            print(f"Fetching {ticker} history before {covered_start.date()} ({source})...")
+            head = fetch(ticker, (date_range[0], covered_start.strftime('%Y-%m-%d')))
+            if head is not None and not head.empty:
+                parts.insert(0, head)
+            else:
+                # Nothing before the cached history (e.g. before the listing):
+                # remember that, instead of asking again on every call
+                head_missing = True
+            covered_start = start
+
+        if self.is_stale(meta, end):
+            # Re-fetch from the last cached bar, which may have been incomplete
+            tail_start = _naive(cached.index[-1])
+            print(f"Topping up {ticker} data from {tail_start.date()} ({source})...")
+            tail = fetch(ticker, (tail_start.strftime('%Y-%m-%d'), date_range[1]))
+            if tail is not None and not tail.empty:
+                parts.append(tail)
+                covered_end = max(covered_end, covers_to)
+            else:
+                checked = True
+        else:
+            print(f"Using cached {ticker} data ({source})")
+
+        if len(parts) > 1:
+            merged = pd.concat(parts)
+            merged = merged[~merged.index.duplicated(keep='last')].sort_index()
+            self.save(ticker, source, merged, covered_start, covered_end)
+        else:
+            merged = cached
+            if head_missing:
+                self._update_meta(ticker, source, start=covered_start.strftime('%Y-%m-%d'))
+        if checked:
+            self.mark_checked(ticker, source)
+
+        return _slice(merged, start, end)
+
+
+class LocalDataProvider:
+    """
+    Stand-in data source that serves slices of a local DataFrame or CSV file.
+
+    It has the same signature as the download functions in ``utils`` and counts
+    the requests it receives, so cache behaviour can be checked offline.
+    """
+
+    def __init__(self, data):
+        if isinstance(data, str):
+            data = pd.read_csv(data, index_col=0, parse_dates=True)
+        self.data = data
+        self.requests = []
+
+    def __call__(self, ticker, date_range=None):
+        self.requests.append((ticker, date_range))
+        if date_range is None:
+            return self.data
+        result = _slice(self.data, pd.Timestamp(date_range[0]), pd.Timestamp(date_range[1]))
+        return result if not result.empty else None
+
+
+def _naive(timestamp):
+    timestamp = pd.Timestamp(timestamp)
+    return timestamp.tz_localize(None) if timestamp.tzinfo is not None else timestamp
+
+
+def _slice(data, start, end):
+    """Select the rows between start and end (inclusive), ignoring index time zones"""
+    index = data.index.tz_localize(None) if getattr(data.index, 'tz', None) is not None else data.index
+    return data[(index >= start) & (index <= end)]
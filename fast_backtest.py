@@ -0,0 +1,332 @@
+"""
+Vectorized backtest engine for band-crossing strategies
+
+Replays the trading rule of ``ARIMAStrategy`` on precomputed bands with the
+execution model of ``backtesting.Backtest(..., hedging=True,
+exclusive_orders=True)``: market orders placed on a bar's close are filled at
+the next bar's open, entries use all available cash in whole units, the
+relative commission is charged on entry and exit, and trades still open at the
+end stay open (they count in the equity curve but not in the trade
+statistics). The result has the same statistics keys as ``Backtest.run()``.
+"""
+
+import sys
+
+import numpy as np
+import pandas as pd
+
+# Default order size of backtesting's Strategy.buy()/sell(): all available equity
+FULL_EQUITY = 1 - sys.float_info.epsilon
+
+TRADE_COLUMNS = ['Size', 'EntryBar', 'ExitBar', 'EntryPrice', 'ExitPrice', 'SL', 'TP', 'PnL',
+                 'Commission', 'ReturnPct', 'EntryTime', 'ExitTime', 'Duration', 'Tag']
+
+
+def first_trading_bar(lo):
+    """Index of the first bar with a band (backtesting's indicator warm-up)"""
+    valid = ~np.isnan(lo)
+    return int(valid.argmax()) if valid.any() else len(lo)
+
+
+def band_positions(close, lo, hi, start=None):
+    """
+    Target position after each bar's orders: 1 long, -1 short, 0 flat
+
+    Flat: a close below ``lo`` goes long and above ``hi`` goes short. In a
+    position: a close inside the band goes flat, otherwise the position is
+    held. So every run of consecutive out-of-band bars holds the side of its
+    first bar. Bars before ``start`` or without a band leave the target unchanged.
+
+    Args:
+        close, lo, hi (numpy.ndarray): Close prices and band bounds
+        start (int): First bar the strategy acts on (default: one bar after
+            the first band, like ``Backtest``)
+
+    Returns:
+        numpy.ndarray: Target position per bar; the order is filled at the next bar's open
+    """
+    close = np.asarray(close, dtype=float)
+    lo = np.asarray(lo, dtype=float)
+    hi = np.asarray(hi, dtype=float)
+    n = len(close)
+    if start is None:
+        start = 1 + first_trading_bar(lo)
+
+    active = ~np.isnan(lo)
+    active[:start] = False
+    with np.errstate(invalid='ignore'):
+        side = np.where(close < lo, 1, np.where(close > hi, -1, 0))[active]
+
+    run_start = (side != 0) & (np.r_[0, side[:-1]] == 0)
+    run_id = np.cumsum(run_start)
+    run_side = np.r_[0, side[run_start]][run_id]
+    target_active = np.where(side != 0, run_side, 0)
+
+    # Carry the target across bars where the strategy does nothing
+    slot = np.cumsum(active) - 1
+    values = np.r_[0, target_active]
+    return values[slot + 1] * (slot >= 0)
+
+
+def simulate(open_, close, lo, hi, start=None, cash=10000, commission=.001):
+    """
+    Fill the band-crossing orders at the next open and track the account
+
+    The work per bar is vectorized; only the trades are looped over, as each
+    trade's size depends on the cash left by the previous one.
+
+    Args:
+        open_, close (numpy.ndarray): Open and close prices
+        lo, hi (numpy.ndarray): Band bounds per bar
+        start (int): First bar the strategy acts on, see ``band_positions``
+        cash (float): Initial capital
+        commission (float): Commission per trade as a fraction
+
+    Returns:
+        tuple: (equity, trades) - equity per bar and a dict of per-trade lists
+        ('Size', 'EntryBar', 'ExitBar', 'EntryPrice', 'ExitPrice', 'Commission')
+        for closed trades; ``trades['Open']`` lists the (size, entry bar,
+        entry price) of the trade still open at the end, if any
+    """
+    open_ = np.asarray(open_, dtype=float)
+    close = np.asarray(close, dtype=float)
+    n = len(close)
+    target = band_positions(close, lo, hi, start=start)
+    # Orders placed on bar i are filled on bar i + 1; the last bar's orders never fill
+    held = np.r_[0, target[:-1]]
+    change = np.flatnonzero(np.diff(np.r_[0, held]) != 0)
+
+    equity = np.empty(n)
+    trades = {key: [] for key in ('Size', 'EntryBar', 'ExitBar', 'EntryPrice', 'ExitPrice', 'Commission',
+                                  'Open')}
+    cursor = 0
+    k = 0
+    while k < len(change):
+        entry_bar = change[k]
+        direction = held[entry_bar]
+        exit_bar = change[k + 1] if k + 1 < len(change) else n
+        equity[cursor:entry_bar] = cash
+
+        price = open_[entry_bar]
+        # Same arithmetic as the broker, so sizes match to the unit
+        price_plus_commission = price + (FULL_EQUITY * price * commission) / FULL_EQUITY
+        units = int((max(0.0, cash) * FULL_EQUITY) // price_plus_commission)
+        if not units:
+            # The broker cancels the order, so the strategy is still flat on
+            # this bar and re-evaluates the band from here on
+            retry = band_positions(close, lo, hi, start=entry_bar)
+            held[entry_bar + 1:] = retry[entry_bar:-1]
+            held[entry_bar] = 0
+            change = np.flatnonzero(np.diff(np.r_[0, held]) != 0)
+            k = np.searchsorted(change, entry_bar)
+            cursor = entry_bar
+            continue
+        k += 2
+        size = direction * units
+        entry_commission = abs(size) * price * commission
+        cash -= entry_commission
+
+        segment = cash + (close[entry_bar:exit_bar] * size - size * price)
+        broke = np.flatnonzero(segment <= 0)
+        if len(broke):
+            # Out of money: the broker closes everything at the close and stops
+            stop = entry_bar + broke[0]
+            equity[entry_bar:stop] = segment[:broke[0]]
+            equity[stop:] = 0
+            _record(trades, size, entry_bar, stop, price, close[stop], entry_commission,
+                    abs(size) * close[stop] * commission)
+            return equity, trades
+        equity[entry_bar:exit_bar] = segment
+
+        if exit_bar < n:
+            exit_price = open_[exit_bar]
+            exit_commission = abs(size) * exit_price * commission
+            cash += size * (exit_price - price) - exit_commission
+            _record(trades, size, entry_bar, exit_bar, price, exit_price, entry_commission, exit_commission)
+        else:
+            trades['Open'].append((size, entry_bar, price))
+        cursor = exit_bar
+
+    equity[cursor:] = cash
+    return equity, trades
+
+
+def _record(trades, size, entry_bar, exit_bar, entry_price, exit_price, entry_commission, exit_commission):
+    trades['Size'].append(size)
+    trades['EntryBar'].append(entry_bar)
+    trades['ExitBar'].append(exit_bar)
+    trades['EntryPrice'].append(entry_price)
+    trades['ExitPrice'].append(exit_price)
+    trades['Commission'].append(exit_commission + entry_commission)
+
+
+def _drawdown_durations(dd, index):
+    """Duration and depth of every drawdown, set on the bar where it ends (NaN elsewhere)"""
+    ends = np.unique(np.r_[np.flatnonzero(dd == 0), len(dd) - 1])
+    gaps = np.flatnonzero(ends[1:] > ends[:-1] + 1)
+    if not len(gaps):
+        no_drawdown = pd.Series(dd, index=index).replace(0, np.nan)
+        return no_drawdown, no_drawdown
+    prev, end = ends[gaps], ends[gaps + 1]
+    duration = pd.Series(index[end] - index[prev], index=index[end]).reindex(index)
+    # Deepest point between the previous peak and the end of each drawdown
+    peaks = pd.Series(np.maximum.reduceat(dd, prev), index=index[end]).reindex(index)
+    return duration, peaks
+
+
+def _geometric_mean(returns):
+    returns = np.nan_to_num(np.asarray(returns, dtype=float)) + 1
+    if np.any(returns <= 0):
+        return 0
+    return np.exp(np.log(returns).sum() / (len(returns) or np.nan)) - 1
+
+
+def compute_stats(equity, trades, data, first_bar=0):
+    """
+    Backtest statistics with the keys and formulas of ``backtesting.Backtest.run()``
+
+    Args:
+        equity (numpy.ndarray): Equity per bar
+        trades (dict): Closed trades as returned by ``simulate``
+        data (pandas.DataFrame): OHLC data the backtest ran on
+        first_bar (int): First bar with a band, used for the buy & hold return
+
+    Returns:
+        pandas.Series: Statistics including ``_equity_curve``, ``_trades`` and
+        ``_open_trades`` (size, entry bar and price of a trade still open)
+    """
+    index = data.index
+    close = data['Close'].to_numpy(dtype=float)
+    dd = 1 - equity / np.maximum.accumulate(equity)
+    dd_dur, dd_peaks = _drawdown_durations(dd, index)
+    equity_df = pd.DataFrame({'Equity': equity, 'DrawdownPct': dd, 'DrawdownDuration': dd_dur}, index=index)
+
+    size = np.asarray(trades['Size'], dtype=float)
+    entry_price = np.asarray(trades['EntryPrice'], dtype=float)
+    exit_price = np.asarray(trades['ExitPrice'], dtype=float)
+    commissions = np.asarray(trades['Commission'], dtype=float)
+    entry_bar = np.asarray(trades['EntryBar'], dtype=int)
+    exit_bar = np.asarray(trades['ExitBar'], dtype=int)
+    pnl = size * (exit_price - entry_price) - commissions
+    returns = np.sign(size) * (exit_price / entry_price - 1) - commissions / (np.abs(size) * entry_price)
+    trades_df = pd.DataFrame({
+        'Size': size.astype(int), 'EntryBar': entry_bar, 'ExitBar': exit_bar,
+        'EntryPrice': entry_price, 'ExitPrice': exit_price, 'SL': None, 'TP': None,
+        'PnL': pnl, 'Commission': commissions, 'ReturnPct': returns,
+        'EntryTime': index[entry_bar], 'ExitTime': index[exit_bar],
+    }, columns=TRADE_COLUMNS[:-2])
+    trades_df['Duration'] = trades_df['ExitTime'] - trades_df['EntryTime']
+    trades_df['Tag'] = None
+    durations = trades_df['Duration']
+
+    period = pd.Series(index[-100:]).diff().dropna().median()
+
+    def round_timedelta(value):
+        if not isinstance(value, pd.Timedelta):
+            return value
+        resolution = getattr(period, 'resolution_string', None) or period.resolution
+        return value.ceil(resolution)
+
+    s = {}
+    s['Start'] = index[0]
+    s['End'] = index[-1]
+    s['Duration'] = s['End'] - s['Start']
+    # Bars inside [EntryBar, ExitBar] of any closed trade
+    coverage = np.zeros(len(index) + 1, dtype=int)
+    np.add.at(coverage, entry_bar, 1)
+    np.add.at(coverage, exit_bar + 1, -1)
+    s['Exposure Time [%]'] = (np.cumsum(coverage)[:-1] > 0).mean() * 100
+    s['Equity Final [$]'] = equity[-1]
+    s['Equity Peak [$]'] = equity.max()
+    if commissions.sum():
+        s['Commissions [$]'] = commissions.sum()
+    s['Return [%]'] = (equity[-1] - equity[0]) / equity[0] * 100
+    s['Buy & Hold Return [%]'] = (close[-1] - close[first_bar]) / close[first_bar] * 100
+
+    gmean_day_return = 0
+    day_returns = np.array(np.nan)
+    annual_trading_days = np.nan
+    is_datetime_index = isinstance(index, pd.DatetimeIndex)
+    if is_datetime_index:
+        freq_days = period.days
+        have_weekends = index.dayofweek.to_series().between(5, 6).mean() > 2 / 7 * .6
+        annual_trading_days = (52 if freq_days == 7 else 12 if freq_days == 31 else
+                               1 if freq_days == 365 else (365 if have_weekends else 252))
+        freq = {7: 'W', 31: 'ME', 365: 'YE'}.get(freq_days, 'D')
+        day_returns = equity_df['Equity'].resample(freq).last().dropna().pct_change().dropna()
+        gmean_day_return = _geometric_mean(day_returns)
+
+    annualized_return = (1 + gmean_day_return) ** annual_trading_days - 1
+    s['Return (Ann.) [%]'] = annualized_return * 100
+    s['Volatility (Ann.) [%]'] = np.sqrt(
+        (day_returns.var(ddof=int(bool(day_returns.shape))) + (1 + gmean_day_return) ** 2) ** annual_trading_days
+        - (1 + gmean_day_return) ** (2 * annual_trading_days)) * 100
+    if is_datetime_index:
+        years = (s['Duration'].days + s['Duration'].seconds / 86400) / 365.25
+        s['CAGR [%]'] = ((s['Equity Final [$]'] / equity[0]) ** (1 / years) - 1) * 100 if years else np.nan
+    s['Sharpe Ratio'] = s['Return (Ann.) [%]'] / (s['Volatility (Ann.) [%]'] or np.nan)
+    # No losing days (0 / 0) or no variation give NaN or inf, as in backtesting.py
+    with np.errstate(divide='ignore', invalid='ignore'):
+        s['Sortino Ratio'] = annualized_return / (np.sqrt(np.mean(day_returns.clip(-np.inf, 0) ** 2))
+                                                  * np.sqrt(annual_trading_days))
+    max_dd = -np.nan_to_num(dd.max())
+    s['Calmar Ratio'] = annualized_return / (-max_dd or np.nan)
+    with np.errstate(divide='ignore'):
+        equity_log_returns = np.log(equity[1:] / equity[:-1])
+    market_log_returns = np.log(close[1:] / close[:-1])
+    beta = np.nan
+    if len(equity_log_returns) > 1:
+        cov_matrix = np.cov(equity_log_returns, market_log_returns)
+        beta = cov_matrix[0, 1] / cov_matrix[1, 1]
+    s['Alpha [%]'] = s['Return [%]'] - beta * s['Buy & Hold Return [%]']
+    s['Beta'] = beta
+    s['Max. Drawdown [%]'] = max_dd * 100
+    s['Avg. Drawdown [%]'] = -dd_peaks.mean() * 100
+    s['Max. Drawdown Duration'] = round_timedelta(dd_dur.max())
+    s['Avg. Drawdown Duration'] = round_timedelta(dd_dur.mean())
+    s['# Trades'] = n_trades = len(trades_df)
+    win_rate = np.nan if not n_trades else (pnl > 0).mean()
+    s['Win Rate [%]'] = win_rate * 100
+    s['Best Trade [%]'] = trades_df['ReturnPct'].max() * 100
+    s['Worst Trade [%]'] = trades_df['ReturnPct'].min() * 100
+    s['Avg. Trade [%]'] = _geometric_mean(returns) * 100
+    s['Max. Trade Duration'] = round_timedelta(durations.max())
+    s['Avg. Trade Duration'] = round_timedelta(durations.mean())
+    s['Profit Factor'] = returns[returns > 0].sum() / (abs(returns[returns < 0].sum()) or np.nan)
+    s['Expectancy [%]'] = trades_df['ReturnPct'].mean() * 100
+    s['SQN'] = np.sqrt(n_trades) * trades_df['PnL'].mean() / (trades_df['PnL'].std() or np.nan)
+    # pandas means, so all-winning or all-losing trades give NaN or inf without a warning
+    trade_pnl = trades_df['PnL']
+    with np.errstate(divide='ignore', invalid='ignore'):
+        s['Kelly Criterion'] = win_rate - (1 - win_rate) / (trade_pnl[trade_pnl > 0].mean()
+                                                            / -trade_pnl[trade_pnl < 0].mean()) \
+            if n_trades else np.nan
+
+    s['_strategy'] = 'ARIMAStrategy (fast engine)'
+    s['_equity_curve'] = equity_df
+    s['_trades'] = trades_df
+    # Not part of Backtest.run()'s statistics; a Backtest keeps open trades in _strategy.trades
+    s['_open_trades'] = pd.DataFrame(trades.get('Open', []), columns=['Size', 'EntryBar', 'EntryPrice'])
+    return pd.Series(s, dtype=object)
+
+
+def run_band_backtest(data, lo, hi, cash=10000, commission=.001):
+    """
+    Backtest the band-crossing rule on OHLC data and precomputed bands
+
+    Args:
+        data (pandas.DataFrame): OHLCV data
+        lo, hi (array-like): Band bounds per bar, NaN where the strategy does not trade
+        cash (float): Initial capital
+        commission (float): Commission per trade as a fraction
+
+    Returns:
+        pandas.Series: Statistics in the format of ``Backtest.run()``
+    """
+    lo = np.asarray(lo, dtype=float)
+    hi = np.asarray(hi, dtype=float)
+    close = data['Close'].to_numpy(dtype=float)
+    first_bar = first_trading_bar(lo)
+    equity, trades = simulate(data['Open'].to_numpy(dtype=float), close, lo, hi, start=1 + first_bar,
+                              cash=cash, commission=commission)
+    return compute_stats(equity, trades, data, first_bar=min(first_bar, len(close) - 1))
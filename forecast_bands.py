@@ -0,0 +1,220 @@
+"""
+Batched ARIMA forecast bands computed from a single state-space filter pass
+"""
+
+import numpy as np
+
+from model_cache import cached_auto_arima
+
+
+def _time_invariant(matrix):
+    """Drop the time axis of a state-space system matrix that does not vary over time"""
+    return matrix[..., 0] if matrix.ndim == 3 else matrix
+
+
+def forecast_moments(results, endog, n_periods=5):
+    """
+    Forecast mean and variance from every origin of a series in one filter pass
+
+    The fitted coefficients in ``results`` are kept fixed and the Kalman filter
+    is run once over ``endog``. The h-step forecasts from every origin are then
+    propagated from the one-step predicted states with array operations, so no
+    per-origin ``predict`` calls are needed.
+
+    Args:
+        results: Fitted statsmodels state-space results (e.g. ``model.arima_res_``)
+        endog (array-like): Series to filter, of length n
+        n_periods (int): Forecast horizon
+
+    Returns:
+        tuple: (mean, var) arrays of shape (n, n_periods); row t holds the
+        forecasts for t+1 .. t+n_periods made with data up to and including t
+    """
+    endog = np.asarray(endog, dtype=float)
+    filtered = results.apply(endog)
+    ssm = filtered.model.ssm
+    state = filtered.filter_results.predicted_state[:, 1:]
+    state_cov = np.moveaxis(filtered.filter_results.predicted_state_cov[:, :, 1:], -1, 0)
+
+    design = _time_invariant(ssm['design'])
+    transition = _time_invariant(ssm['transition'])
+    selection = _time_invariant(ssm['selection'])
+    state_noise = selection @ _time_invariant(ssm['state_cov']) @ selection.T
+    obs_cov = _time_invariant(ssm['obs_cov'])[0, 0]
+    obs_intercept = np.asarray(ssm['obs_intercept'], dtype=float).reshape(-1)
+    obs_intercept = obs_intercept[np.minimum(np.arange(len(endog)), len(obs_intercept) - 1)]
+    state_intercept = np.asarray(ssm['state_intercept'], dtype=float)
+    if state_intercept.ndim == 1:
+        state_intercept = state_intercept[:, None]
+
+    n = len(endog)
+    origins = np.arange(n)
+    mean = np.empty((n, n_periods))
+    var = np.empty((n, n_periods))
+    for h in range(n_periods):
+        mean[:, h] = design[0] @ state + obs_intercept
+        var[:, h] = np.einsum('i,tij,j->t', design[0], state_cov, design[0]) + obs_cov
+        # Propagate the state from time t+h+1 to t+h+2
+        columns = np.minimum(origins + h + 1, state_intercept.shape[1] - 1)
+        state = transition @ state + state_intercept[:, columns]
+        state_cov = transition @ state_cov @ transition.T + state_noise
+
+    return mean, var
+
+
+def model_moments(model, n_periods=5):
+    """
+    Forecast mean and variance of a fitted model from one forecast call
+
+    Args:
+        model: Fitted pmdarima model (or anything with an ``arima_res_``)
+        n_periods (int): Forecast horizon
+
+    Returns:
+        tuple: (mean, var) arrays of length n_periods
+    """
+    prediction = model.arima_res_.get_forecast(n_periods)
+    return np.asarray(prediction.predicted_mean, dtype=float), np.asarray(prediction.var_pred_mean, dtype=float)
+
+
+def level_bands(mean, var, levels=(0.8, 0.95), horizons=None):
+    """
+    Forecast bands for several confidence levels and horizons at once
+
+    The standard deviation is computed once from ``var`` and every level only
+    scales it, so adding a level costs one multiply instead of another
+    forecast call.
+
+    Args:
+        mean, var (numpy.ndarray): Forecast moments of shape (..., n_periods),
+            e.g. from ``forecast_moments`` or ``model_moments``
+        levels (iterable): Confidence levels, e.g. (0.5, 0.8, 0.95)
+        horizons (iterable): 1-based horizons to keep (default: all)
+
+    Returns:
+        dict: level -> (lo, hi) arrays of shape (..., len(horizons))
+    """
+    from scipy.stats import norm
+
+    mean = np.asarray(mean, dtype=float)
+    var = np.asarray(var, dtype=float)
+    if horizons is not None:
+        columns = np.asarray(horizons) - 1
+        mean, var = mean[..., columns], var[..., columns]
+    levels = [float(level) for level in levels]
+    if any(not 0 < level < 1 for level in levels):
+        raise ValueError(f"Confidence levels must be between 0 and 1: {levels}")
+    std = np.sqrt(var)
+    z = norm.ppf(0.5 + np.asarray(levels) / 2)
+    return {level: (mean - k * std, mean + k * std) for level, k in zip(levels, z)}
+
+
+def bands_from_moments(mean, var, alpha=0.05):
+    """Return (lo, hi) forecast bands with confidence level 1 - alpha"""
+    from scipy.stats import norm
+
+    z = norm.ppf(1 - alpha / 2)
+    std = np.sqrt(var)
+    return mean - z * std, mean + z * std
+
+
+def aggregate_bands(lo, hi, how='envelope'):
+    """
+    Collapse (n, n_periods) forecast bands into one (lo, hi) value per row
+
+    Args:
+        lo, hi (numpy.ndarray): Lower and upper bands of shape (n, n_periods)
+        how (str): 'envelope' (widest bounds over the horizon), 'mean',
+            'first' (one step ahead) or 'last' (end of the horizon)
+    """
+    if how == 'envelope':
+        return lo.min(axis=1), hi.max(axis=1)
+    if how == 'mean':
+        return lo.mean(axis=1), hi.mean(axis=1)
+    if how == 'first':
+        return lo[:, 0], hi[:, 0]
+    if how == 'last':
+        return lo[:, -1], hi[:, -1]
+    raise ValueError(f"Unknown band aggregation: {how}")
+
+
+def walk_forward_moments(close, train_window=252, reselect_every=63, n_periods=5, cache=True, orders=None,
+                         **arima_kwargs):
+    """
+    Walk-forward forecast mean and variance for every bar of a price series
+
+    The order is selected on the ``train_window`` bars before each segment of
+    ``reselect_every`` bars, and row i holds the forecasts made from bar i-1
+    (the bar before the one they are traded on). Each segment needs one order
+    selection and one filter pass; bands for any confidence level can then be
+    derived with ``level_bands`` without forecasting again.
+
+    Args:
+        close (array-like): Close prices
+        train_window (int): Bars used for order selection
+        reselect_every (int): Bars between re-selections (None or 0: select once)
+        n_periods (int): Forecast horizon
+        cache (ModelCache or bool): Model selection cache
+        orders (list): If given, (bar, order) is appended for every selection
+        **arima_kwargs: Search parameters passed on to ``auto_arima``
+
+    Returns:
+        tuple: (mean, var) arrays of shape (len(close), n_periods), NaN for the
+        first ``train_window`` bars and where a fit failed
+    """
+    close = np.asarray(close, dtype=float)
+    n = len(close)
+    mean = np.full((n, n_periods), np.nan)
+    var = np.full((n, n_periods), np.nan)
+    kwargs = dict(seasonal=False, stepwise=True, max_p=3, max_q=3, suppress_warnings=True)
+    kwargs.update(arima_kwargs)
+    step = reselect_every or n
+
+    for start in range(train_window, n, step):
+        end = min(start + step, n)
+        window_start = start - train_window
+        try:
+            model = cached_auto_arima(close[window_start:start], cache=cache, **kwargs)
+            # Filter up to bar end-2, the last origin needed for this segment
+            seg_mean, seg_var = forecast_moments(model.arima_res_, close[window_start:end - 1], n_periods)
+        except Exception as e:
+            print(f"Forecast bands failed for bars {start}-{end - 1}: {e}")
+            continue
+        if orders is not None:
+            orders.append((start, model.order))
+        mean[start:end] = seg_mean[start - 1 - window_start:]
+        var[start:end] = seg_var[start - 1 - window_start:]
+
+    return mean, var
+
+
+def walk_forward_bands(close, train_window=252, reselect_every=63, n_periods=5, alpha=0.05,
+                       band_agg='envelope', cache=True, orders=None, **arima_kwargs):
+    """
+    Walk-forward forecast bands for every bar of a price series
+
+    Produces the same bands as ``WalkForwardARIMA`` used bar-by-bar in
+    ``ARIMAStrategy``: the order is selected on the ``train_window`` bars before
+    each segment of ``reselect_every`` bars, and the band for bar i is forecast
+    from bar i-1. Each segment needs one order selection and one filter pass
+    (see ``walk_forward_moments``).
+
+    Args:
+        close (array-like): Close prices
+        train_window (int): Bars used for order selection
+        reselect_every (int): Bars between re-selections (None or 0: select once)
+        n_periods (int): Forecast horizon
+        alpha (float): 1 - confidence level of the bands
+        band_agg (str): How the per-period bands are collapsed, see ``aggregate_bands``
+        cache (ModelCache or bool): Model selection cache
+        orders (list): If given, (bar, order) is appended for every selection
+        **arima_kwargs: Search parameters passed on to ``auto_arima``
+
+    Returns:
+        tuple: (lo, hi) arrays of the same length as ``close``, NaN for the
+        first ``train_window`` bars and where a fit failed
+    """
+    mean, var = walk_forward_moments(close, train_window=train_window, reselect_every=reselect_every,
+                                     n_periods=n_periods, cache=cache, orders=orders, **arima_kwargs)
+    lo, hi = bands_from_moments(mean, var, alpha)
+    return aggregate_bands(lo, hi, band_agg)
@@ -0,0 +1,328 @@
+"""
+Rolling-origin evaluation of ARIMA forecasts and their confidence bands
+"""
+
+import argparse
+import contextlib
+import io
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+import pandas as pd
+
+from forecast_bands import bands_from_moments, forecast_moments
+from instrumentation import collect, increment, merge, span
+from model_cache import cached_auto_arima
+
+METRICS = ['MAE', 'RMSE', 'MAPE [%]', 'Coverage [%]', 'Band Width']
+
+# Close prices of every ticker, set once per worker process
+_eval_series = None
+
+
+def _init_worker(series):
+    global _eval_series
+    _eval_series = series
+
+
+def fold_origins(n_obs, initial=252, n_periods=5, refit_every=21, step=1):
+    """
+    Split the forecast origins of a series into folds
+
+    Origins run from bar ``initial - 1`` (the first bar with ``initial`` bars
+    of history) to the last bar with ``n_periods`` bars after it. Each fold
+    holds up to ``refit_every`` consecutive origins that share one model fit.
+
+    Args:
+        n_obs (int): Length of the series
+        initial (int): Bars of history before the first origin
+        n_periods (int): Forecast horizon
+        refit_every (int): Origins per fold
+        step (int): Bars between origins
+
+    Returns:
+        list: One array of origin positions per fold
+    """
+    origins = np.arange(initial - 1, n_obs - n_periods, step)
+    per_fold = max(1, refit_every // step)
+    return [origins[i:i + per_fold] for i in range(0, len(origins), per_fold)]
+
+
+def evaluate_fold(close, origins, n_periods=5, window='expanding', train_window=252,
+                  cache=True, previous=None, **arima_kwargs):
+    """
+    Forecast from every origin of one fold with a single model fit
+
+    The order and coefficients are selected on the training window ending at
+    the fold's first origin. One Kalman filter pass over the rest of the fold
+    then carries the model state from origin to origin, so the later origins
+    are forecast incrementally without refitting and without looking ahead.
+
+    Args:
+        close (array-like): Close prices
+        origins (array-like): Consecutive origin positions of the fold
+        n_periods (int): Forecast horizon
+        window (str): 'expanding' trains on all bars up to the first origin,
+            'sliding' on the last ``train_window`` bars
+        train_window (int): Length of the sliding training window
+        cache (ModelCache or bool): Model selection cache
+        previous (pmdarima.arima.ARIMA): Model of the preceding fold; with an
+            expanding window its order is kept and its coefficients start the
+            refit instead of a new order search
+        **arima_kwargs: Search parameters passed on to ``auto_arima``
+
+    Returns:
+        tuple: (mean, var, model) - arrays of shape (len(origins), n_periods)
+        and the model fitted for the fold
+    """
+    close = np.asarray(close, dtype=float)
+    origins = np.asarray(origins)
+    first, last = origins[0], origins[-1]
+    if window == 'expanding':
+        window_start = 0
+    elif window == 'sliding':
+        window_start = max(0, first + 1 - train_window)
+    else:
+        raise ValueError(f"Unknown training window: {window!r}")
+
+    kwargs = dict(seasonal=False, stepwise=True, max_p=3, max_q=3, suppress_warnings=True)
+    kwargs.update(arima_kwargs)
+    with span('evaluate.fold', n_origins=len(origins), window=window):
+        model = None
+        if previous is not None and window == 'expanding':
+            model = _refit(previous, close[:first + 1])
+        if model is None:
+            model = cached_auto_arima(close[window_start:first + 1], cache=cache, **kwargs)
+        mean, var = forecast_moments(model.arima_res_, close[window_start:last + 1], n_periods)
+    rows = origins - window_start
+    return mean[rows], var[rows], model
+
+
+def _refit(previous, y):
+    """Refit the order of ``previous`` on ``y`` starting from its coefficients; None on failure"""
+    from pmdarima import ARIMA
+
+    try:
+        with span('model.refit', n_obs=len(y), order=tuple(previous.order)):
+            model = ARIMA(order=previous.order, with_intercept=previous.with_intercept,
+                          start_params=np.asarray(previous.params()), suppress_warnings=True).fit(y)
+    except Exception:
+        return None
+    increment('evaluate.fold_reuse')
+    return model
+
+
+def _run_folds(ticker, folds, fold_kwargs):
+    """Evaluate consecutive folds of one ticker in order, each starting from the previous fit"""
+    results = []
+    previous = None
+    with contextlib.redirect_stdout(io.StringIO()):
+        for origins in folds:
+            try:
+                mean, var, previous = evaluate_fold(_eval_series[ticker], origins, previous=previous,
+                                                    **fold_kwargs)
+            except Exception as e:
+                results.append((origins, None, None, str(e)))
+                previous = None
+                continue
+            results.append((origins, mean, var, None))
+    return results
+
+
+def rolling_origin_forecasts(prices, initial=252, n_periods=5, refit_every=21, step=1,
+                             window='expanding', train_window=252, alpha=0.05, reselect_every=252,
+                             max_workers=None, cache=True, **arima_kwargs):
+    """
+    Rolling-origin forecasts for one or many price series, folds in parallel
+
+    The folds of each ticker are grouped into blocks of ``reselect_every``
+    bars, and the blocks of all tickers are evaluated in one process pool.
+    Within a fold the model state is filtered forward from origin to origin.
+    Within a block the folds run in order, and with an expanding window each
+    fold keeps the previous fold's order and refits only its coefficients,
+    starting from the previous ones; the order search runs at the start of
+    every block. The block boundaries do not depend on the number of workers,
+    so the forecasts are the same on every machine.
+
+    Args:
+        prices (pandas.Series or pandas.DataFrame): Close prices, one column per
+            ticker for a DataFrame
+        initial (int): Bars of history before the first origin
+        n_periods (int): Forecast horizon
+        refit_every (int): Bars between model fits
+        step (int): Bars between origins
+        window (str): 'expanding' or 'sliding' training window
+        train_window (int): Length of the sliding training window
+        alpha (float): 1 - confidence level of the bands
+        reselect_every (int): Bars between order searches, rounded down to a
+            whole number of folds (expanding window only; a sliding window
+            searches on every fold)
+        max_workers (int): Upper bound on worker processes (default: number of CPUs)
+        cache (ModelCache or bool): Model selection cache
+        **arima_kwargs: Search parameters passed on to ``auto_arima``
+
+    Returns:
+        pandas.DataFrame: One row per ticker, origin and horizon with the
+        forecast, its band and the realised price
+    """
+    if isinstance(prices, pd.Series):
+        prices = prices.to_frame(prices.name or 'Close')
+    series = {ticker: prices[ticker].dropna() for ticker in prices.columns}
+    fold_kwargs = dict(n_periods=n_periods, window=window, train_window=train_window,
+                       cache=cache, **arima_kwargs)
+    folds = {ticker: fold_origins(len(close), initial, n_periods, refit_every, step)
+             for ticker, close in series.items()}
+    n_folds = sum(len(ticker_folds) for ticker_folds in folds.values())
+    if not n_folds:
+        raise ValueError(f"Not enough data for rolling-origin evaluation: need more than "
+                         f"{initial + n_periods} bars")
+    # Every block starts with a fresh order search
+    size = max(1, reselect_every // refit_every)
+    blocks = [(ticker, ticker_folds[i:i + size]) for ticker, ticker_folds in folds.items()
+              for i in range(0, len(ticker_folds), size)]
+    if max_workers is None:
+        max_workers = os.cpu_count() or 1
+    max_workers = max(1, min(max_workers, len(blocks)))
+
+    print(f"Evaluating {n_folds} folds for {len(series)} series in {len(blocks)} blocks "
+          f"with {max_workers} worker processes...")
+    frames = []
+    arrays = {ticker: close.to_numpy(dtype=float) for ticker, close in series.items()}
+    horizons = np.arange(1, n_periods + 1)
+    done = 0
+    with ProcessPoolExecutor(max_workers=max_workers, initializer=_init_worker,
+                             initargs=(arrays,)) as executor:
+        futures = {executor.submit(collect, _run_folds, ticker, block, fold_kwargs): (ticker, block)
+                   for ticker, block in blocks}
+        for future in as_completed(futures):
+            ticker, block = futures[future]
+            close = series[ticker]
+            try:
+                results, metrics = future.result()
+                merge(metrics)
+            except Exception as e:
+                merge(getattr(e, 'metrics', None))
+                results = [(origins, None, None, str(e)) for origins in block]
+            for origins, mean, var, error in results:
+                done += 1
+                if error is not None:
+                    print(f"[{done}/{n_folds}] {ticker} fold at {close.index[origins[0]]}: failed ({error})")
+                    continue
+                lo, hi = bands_from_moments(mean, var, alpha)
+                targets = origins[:, None] + horizons
+                frames.append(pd.DataFrame({
+                    'Ticker': ticker,
+                    'Origin': np.repeat(close.index[origins], n_periods),
+                    'Horizon': np.tile(horizons, len(origins)),
+                    'Forecast': mean.ravel(),
+                    'Lower': lo.ravel(),
+                    'Upper': hi.ravel(),
+                    'Actual': close.to_numpy(dtype=float)[targets].ravel(),
+                }))
+            print(f"[{done}/{n_folds}] folds done")
+
+    if not frames:
+        raise RuntimeError("All folds failed")
+    forecasts = pd.concat(frames, ignore_index=True)
+    return forecasts.sort_values(['Ticker', 'Origin', 'Horizon'], ignore_index=True)
+
+
+def forecast_metrics(forecasts, by=('Ticker', 'Horizon')):
+    """
+    Accuracy and band coverage of rolling-origin forecasts
+
+    Args:
+        forecasts (pandas.DataFrame): Output of ``rolling_origin_forecasts``
+        by (tuple): Columns to group by; ('Horizon',) pools all tickers
+
+    Returns:
+        pandas.DataFrame: MAE, RMSE, MAPE, band coverage, mean band width and
+        the number of origins per group
+    """
+    errors = forecasts['Actual'] - forecasts['Forecast']
+    scored = pd.DataFrame({
+        'AbsError': errors.abs(),
+        'SqError': errors ** 2,
+        'PctError': (errors / forecasts['Actual']).abs() * 100,
+        'Covered': (forecasts['Actual'] >= forecasts['Lower']) & (forecasts['Actual'] <= forecasts['Upper']),
+        'Width': forecasts['Upper'] - forecasts['Lower'],
+    })
+    grouped = scored.groupby([forecasts[column] for column in by])
+    metrics = pd.DataFrame({
+        'MAE': grouped['AbsError'].mean(),
+        'RMSE': np.sqrt(grouped['SqError'].mean()),
+        'MAPE [%]': grouped['PctError'].mean(),
+        'Coverage [%]': grouped['Covered'].mean() * 100,
+        'Band Width': grouped['Width'].mean(),
+        'Origins': grouped.size(),
+    })
+    return metrics
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Rolling-origin evaluation of ARIMA forecasts")
+    parser.add_argument('tickers', nargs='*', default=['SPY'], help="Ticker symbols (default: SPY)")
+    parser.add_argument('--start', default="2020-01-01", help="Start date (YYYY-MM-DD)")
+    parser.add_argument('--end', default="2025-06-24", help="End date (YYYY-MM-DD)")
+    parser.add_argument('--window', default="expanding", choices=['expanding', 'sliding'],
+                        help="Training window (default: expanding)")
+    parser.add_argument('--initial', type=int, default=252, help="Bars before the first origin (default: 252)")
+    parser.add_argument('--train-window', type=int, default=252, help="Sliding window length (default: 252)")
+    parser.add_argument('--refit-every', type=int, default=21, help="Bars between model fits (default: 21)")
+    parser.add_argument('--reselect-every', type=int, default=252,
+                        help="Bars between order searches (default: 252)")
+    parser.add_argument('--step', type=int, default=1, help="Bars between origins (default: 1)")
+    parser.add_argument('--periods', type=int, default=5, help="Forecast horizon (default: 5)")
+    parser.add_argument('--alpha', type=float, default=0.05, help="1 - band confidence level (default: 0.05)")
+    parser.add_argument('--backend', default="pmdarima", choices=['pmdarima', 'fast'],
+                        help="Order search backend (default: pmdarima)")
+    parser.add_argument('--workers', type=int, default=None, help="Worker processes (default: number of CPUs)")
+    parser.add_argument('--store', default=None, help="Price store directory (see price_store.py) to read prices from")
+    parser.add_argument('--allow-synthetic', action='store_true',
+                        help="Use synthetic data for tickers whose download fails")
+    parser.add_argument('--output', default=None, help="Save the per-origin forecasts to this CSV file")
+    parser.add_argument('--results', default=None, help="Results store directory (e.g. results) for the forecasts")
+    args = parser.parse_args(argv)
+
+    closes = {}
+    for ticker in dict.fromkeys(t.upper() for t in args.tickers):
+        if args.store:
+            from price_store import open_store
+            close = open_store(args.store).close(ticker, args.start, args.end)
+        else:
+            from utils import get_ticker_data
+            with contextlib.redirect_stdout(io.StringIO()):
+                close = get_ticker_data(ticker, for_backtesting=False, date_range=(args.start, args.end),
+                                        allow_synthetic=args.allow_synthetic)
+        if close is None or len(close) == 0:
+            print(f"No data for {ticker}, skipped")
+            continue
+        closes[ticker] = close
+    if not closes:
+        print("Failed to obtain data. Exiting.")
+        exit(1)
+
+    forecasts = rolling_origin_forecasts(pd.DataFrame(closes), initial=args.initial, n_periods=args.periods,
+                                         refit_every=args.refit_every, step=args.step, window=args.window,
+                                         train_window=args.train_window, alpha=args.alpha,
+                                         reselect_every=args.reselect_every,
+                                         max_workers=args.workers, backend=args.backend)
+    metrics = forecast_metrics(forecasts)
+
+    print(f"\n=== Rolling-Origin Forecast Evaluation ({args.window} window, "
+          f"{(1 - args.alpha) * 100:.0f}% bands) ===")
+    with pd.option_context('display.float_format', '{:.3f}'.format, 'display.width', 120):
+        print(metrics)
+    if args.output:
+        forecasts.to_csv(args.output, index=False)
+        print(f"\nForecasts saved to: {args.output}")
+    if args.results:
+        from results_store import ResultsStore, new_run_id
+        run = new_run_id()
+        ResultsStore(args.results).write_forecasts(run, forecasts)
+        print(f"Forecasts recorded in {args.results} (run {run})")
+
+
+if __name__ == "__main__":
+    main()
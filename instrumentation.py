@@ -0,0 +1,222 @@
+"""
+Timing spans, counters and profiling hooks for the pipeline stages
+
+Spans and counters are always recorded in memory (the overhead is a couple of
+``perf_counter`` calls per span). For aggregation across many runs:
+
+- ``configure(events_file=...)`` (or the ``ARIMA_EVENTS_FILE`` environment
+  variable) appends every finished span as one JSON line tagged with the run
+  id and process id. Worker processes of the process pools append to the same
+  file, so it covers the whole run.
+- ``write_metrics(path)`` writes the totals (span count, total, mean and max
+  duration, counters) as a JSON file. Process pools run their tasks through
+  ``collect()`` and pass the returned metrics to ``merge()``, so the parent's
+  totals include the spans and counters of its workers.
+- ``profile(path)`` runs a block under cProfile.
+
+Events are also sent to the ``arima_trading`` logger at DEBUG level.
+"""
+
+import contextlib
+import contextvars
+import functools
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from datetime import datetime
+
+logger = logging.getLogger('arima_trading')
+
+# Shared by the parent process and its workers so the events of one run can be grouped
+RUN_ID = os.environ.setdefault('ARIMA_RUN_ID', uuid.uuid4().hex[:12])
+
+_lock = threading.Lock()
+_spans = {}
+_counters = {}
+# Metrics dicts of the ``collect()`` calls active in the current context; a
+# context variable, so spans recorded by other threads do not end up in them
+_sinks = contextvars.ContextVar('instrumentation_sinks', default=())
+_events_file = os.environ.get('ARIMA_EVENTS_FILE') or None
+
+
+def configure(events_file=None):
+    """
+    Set the JSON-lines file that receives one event per finished span
+
+    The path is also exported as ``ARIMA_EVENTS_FILE`` so that worker processes
+    started afterwards log to the same file. ``None`` disables the file.
+    """
+    global _events_file
+    _events_file = events_file
+    if events_file:
+        os.environ['ARIMA_EVENTS_FILE'] = events_file
+    else:
+        os.environ.pop('ARIMA_EVENTS_FILE', None)
+
+
+def _emit(event):
+    event = {'ts': datetime.now().isoformat(timespec='milliseconds'), 'run_id': RUN_ID,
+             'pid': os.getpid(), **event}
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug(json.dumps(event, default=str))
+    if _events_file:
+        line = json.dumps(event, default=str) + '\n'
+        with _lock, open(_events_file, 'a', encoding='utf-8') as f:
+            f.write(line)
+
+
+@contextlib.contextmanager
+def span(name, **fields):
+    """
+    Time a block of code
+
+    Args:
+        name (str): Stage name, e.g. 'data.fetch' or 'backtest.run'
+        **fields: Extra values stored with the event (ticker, bar count, ...)
+    """
+    status = 'ok'
+    start = time.perf_counter()
+    try:
+        yield
+    except BaseException as e:
+        status = type(e).__name__
+        raise
+    finally:
+        duration = time.perf_counter() - start
+        with _lock:
+            for spans in (_spans, *(sink['spans'] for sink in _sinks.get())):
+                stats = spans.setdefault(name, [0, 0.0, 0.0, 0])
+                stats[0] += 1
+                stats[1] += duration
+                stats[2] = max(stats[2], duration)
+                stats[3] += status != 'ok'
+        _emit({'event': 'span', 'name': name, 'duration_s': round(duration, 6), 'status': status,
+               **fields})
+
+
+def timed(name):
+    """Decorator form of ``span``"""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with span(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def increment(name, value=1):
+    """Add ``value`` to a counter"""
+    with _lock:
+        for counters in (_counters, *(sink['counters'] for sink in _sinks.get())):
+            counters[name] = counters.get(name, 0) + value
+
+
+def snapshot():
+    """
+    Totals of all spans and counters recorded in this process
+
+    Returns:
+        dict: {'run_id', 'pid', 'spans': {name: {count, errors, total_s, mean_s, max_s}},
+        'counters': {name: value}}
+    """
+    with _lock:
+        spans = {
+            name: {'count': count, 'errors': errors, 'total_s': round(total, 6),
+                   'mean_s': round(total / count, 6), 'max_s': round(longest, 6)}
+            for name, (count, total, longest, errors) in _spans.items()
+        }
+        counters = dict(_counters)
+    return {'run_id': RUN_ID, 'pid': os.getpid(), 'spans': spans, 'counters': counters}
+
+
+def collect(func, *args, **kwargs):
+    """
+    Call ``func`` and return its result with the spans and counters it recorded
+
+    Used as the task function of process pools: the worker's metrics travel
+    back with the result and the parent adds them with ``merge()``. If ``func``
+    raises, the metrics are attached to the exception as ``metrics``. Only
+    spans recorded in the calling context are collected (threads started by
+    ``func`` take part if they run in a copy of it, see ``async_fetch``); they
+    also count in this process's own totals.
+
+    Returns:
+        tuple: (result, metrics)
+    """
+    sink = {'spans': {}, 'counters': {}}
+    token = _sinks.set(_sinks.get() + (sink,))
+    try:
+        result = func(*args, **kwargs)
+    except BaseException as e:
+        e.metrics = _copy(sink)
+        raise
+    finally:
+        _sinks.reset(token)
+    return result, _copy(sink)
+
+
+def _copy(sink):
+    # Threads of the task that are still running may add to the sink while it is pickled
+    with _lock:
+        return {'spans': {name: list(stats) for name, stats in sink['spans'].items()},
+                'counters': dict(sink['counters'])}
+
+
+def merge(metrics):
+    """Add metrics returned by ``collect()`` (in another process) to this process's totals"""
+    if not metrics:
+        return
+    with _lock:
+        for name, (count, total, longest, errors) in metrics['spans'].items():
+            stats = _spans.setdefault(name, [0, 0.0, 0.0, 0])
+            stats[0] += count
+            stats[1] += total
+            stats[2] = max(stats[2], longest)
+            stats[3] += errors
+        for name, value in metrics['counters'].items():
+            _counters[name] = _counters.get(name, 0) + value
+
+
+def reset():
+    """Clear all recorded spans and counters"""
+    with _lock:
+        _spans.clear()
+        _counters.clear()
+
+
+def write_metrics(path):
+    """Write ``snapshot()`` to a JSON file and return the path"""
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(snapshot(), f, indent=2)
+    return path
+
+
+@contextlib.contextmanager
+def profile(output=None, sort='cumulative', limit=25):
+    """
+    Run a block under cProfile
+
+    Args:
+        output (str): File for the raw profile (readable with ``pstats`` or
+            snakeviz); if None the top ``limit`` functions are printed instead
+        sort (str): Sort key for the printed table
+        limit (int): Number of functions to print
+    """
+    import cProfile
+    import pstats
+
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        yield profiler
+    finally:
+        profiler.disable()
+        if output:
+            profiler.dump_stats(output)
+            print(f"Profile saved to: {output}")
+        else:
+            pstats.Stats(profiler).sort_stats(sort).print_stats(limit)
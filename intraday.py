@@ -0,0 +1,368 @@
+"""
+Intraday bars: chunked ingestion, streaming resampling and loading for backtests
+"""
+
+import argparse
+import contextlib
+import functools
+import io
+
+import numpy as np
+import pandas as pd
+
+from instrumentation import increment, span
+
+COLUMNS = ['Open', 'High', 'Low', 'Close', 'Volume']
+
+AGGREGATIONS = {'Open': 'first', 'High': 'max', 'Low': 'min', 'Close': 'last', 'Volume': 'sum'}
+
+# yfinance interval -> (bar length, days per request, days of history served)
+YFINANCE_INTERVALS = {
+    '1m': ('1min', 7, 30),
+    '2m': ('2min', 60, 60),
+    '5m': ('5min', 60, 60),
+    '15m': ('15min', 60, 60),
+    '30m': ('30min', 60, 60),
+    '60m': ('60min', 730, 730),
+    '90m': ('90min', 60, 60),
+}
+
+SESSION_OPEN = '09:30'
+SESSION_CLOSE = '16:00'
+
+# Weekly and longer bars count whole weeks from this Monday
+WEEK_ANCHOR = pd.Timestamp('1970-01-05')
+
+
+def bars_per_session(bar_size):
+    """Number of bars of ``bar_size`` in one regular trading session"""
+    session = pd.Timestamp(SESSION_CLOSE) - pd.Timestamp(SESSION_OPEN)
+    return int(np.ceil(session / pd.Timedelta(bar_size)))
+
+
+def session_index(start, end, bar_size='5min'):
+    """Bar start times of the regular sessions on business days between start and end (inclusive)"""
+    days = pd.bdate_range(pd.Timestamp(start).normalize(), pd.Timestamp(end).normalize())
+    first_bar = pd.Timestamp(SESSION_OPEN) - pd.Timestamp(SESSION_OPEN).normalize()
+    offsets = first_bar + pd.to_timedelta(np.arange(bars_per_session(bar_size)) * pd.Timedelta(bar_size).value)
+    return pd.DatetimeIndex((days.values[:, None] + offsets.values[None, :]).ravel())
+
+
+def _normalize(data):
+    """OHLCV columns with a tz-naive, sorted, unique index in exchange time"""
+    data = data.rename(columns=str.title)[COLUMNS]
+    if getattr(data.index, 'tz', None) is not None:
+        data = data.tz_localize(None)
+    data = data.sort_index()
+    return data[~data.index.duplicated(keep='last')].astype(float)
+
+
+def _month_windows(start, end):
+    """Calendar-month (first day, last day) pairs covering the days start to end, clipped to the range"""
+    start, end = pd.Timestamp(start), pd.Timestamp(end)
+    edges = pd.date_range(start.normalize().replace(day=1), end, freq='MS')
+    for month_start in edges:
+        month_end = month_start + pd.offsets.MonthEnd(1)
+        yield max(start, month_start), min(end, month_end)
+
+
+def download_intraday_yfinance(ticker, date_range, interval='5m'):
+    """
+    Download intraday bars from Yahoo Finance
+
+    Requests are split into the longest spans Yahoo serves per call. Yahoo
+    only keeps the most recent 30 (1-minute) or 60 days of intraday history.
+    The end date is exclusive.
+
+    Returns:
+        pandas.DataFrame: OHLCV bars with a tz-naive index in exchange time, or None
+    """
+    _, days_per_request, _ = YFINANCE_INTERVALS[interval]
+    try:
+        import yfinance as yf
+    except ImportError:
+        print("yfinance not installed. Please install it with: pip install yfinance")
+        return None
+
+    start, end = pd.Timestamp(date_range[0]), pd.Timestamp(date_range[1])
+    parts = []
+    try:
+        stock = yf.Ticker(ticker)
+        while start < end:
+            stop = min(end, start + pd.Timedelta(days=days_per_request))
+            part = stock.history(start=start, end=stop, interval=interval)
+            if part is not None and not part.empty:
+                parts.append(part)
+            start = stop
+    except Exception as e:
+        print(f"Error downloading intraday data from Yahoo Finance: {e}")
+        return None
+    if not parts:
+        return None
+    return _normalize(pd.concat(parts))
+
+
+def iter_synthetic_intraday(date_range, bar_size='5min', seed=42, base_price=450, sigma=0.015):
+    """
+    Yield synthetic intraday OHLCV bars one calendar month at a time
+
+    Returns have a daily volatility of ``sigma`` spread over the session's bars;
+    the price carries over from one month to the next.
+    """
+    from utils import generate_synthetic_paths
+
+    rng = np.random.default_rng(seed)
+    per_bar = sigma / np.sqrt(bars_per_session(bar_size))
+    price = base_price
+    for start, end in _month_windows(*date_range):
+        index = session_index(start, end, bar_size)
+        if not len(index):
+            continue
+        close = generate_synthetic_paths(len(index) + 1, base_price=price, mu=0, sigma=per_bar, trend=0,
+                                         rng=rng)[0]
+        open_, close = close[:-1], close[1:]
+        high = np.maximum(open_, close) * (1 + np.abs(rng.normal(0, per_bar / 2, len(index))))
+        low = np.minimum(open_, close) * (1 - np.abs(rng.normal(0, per_bar / 2, len(index))))
+        volume = rng.integers(100000, 1000000, len(index)).astype(float)
+        price = close[-1]
+        yield pd.DataFrame({'Open': open_, 'High': high, 'Low': low, 'Close': close, 'Volume': volume},
+                           index=index)
+
+
+def iter_csv(path, chunksize=500000):
+    """
+    Yield OHLCV chunks from a time-sorted CSV file of bars
+
+    The first column is the timestamp; column names are matched case-insensitively.
+    """
+    for chunk in pd.read_csv(path, index_col=0, parse_dates=True, chunksize=chunksize):
+        yield _normalize(chunk)
+
+
+def iter_intraday(ticker, date_range, interval='5m', cache=True, allow_synthetic=True):
+    """
+    Yield intraday OHLCV bars for a ticker one calendar month at a time
+
+    Each month is downloaded (and cached in ``data_cache/`` under its own key)
+    separately, so a long minute history never has to sit in one DataFrame.
+    Months older than the history Yahoo serves are read from the cache only
+    and never requested, so they are not asked for again on every run; if no
+    month has data and ``allow_synthetic`` is set, synthetic bars are
+    generated instead.
+
+    Args:
+        ticker (str): Ticker symbol
+        date_range (tuple): (start_date, end_date) as strings
+        interval (str): Bar interval, a key of ``YFINANCE_INTERVALS``
+        cache (bool or OHLCVCache): On-disk cache for the monthly downloads
+        allow_synthetic (bool): Fall back to synthetic bars
+
+    Yields:
+        pandas.DataFrame: OHLCV bars in time order
+    """
+    from utils import _download, _resolve_cache
+
+    if interval not in YFINANCE_INTERVALS:
+        raise ValueError(f"Unknown intraday interval: {interval} (choose from {', '.join(YFINANCE_INTERVALS)})")
+    cache = _resolve_cache(cache)
+    fetch = functools.partial(download_intraday_yfinance, interval=interval)
+    served_from = pd.Timestamp.today().normalize() - pd.Timedelta(days=YFINANCE_INTERVALS[interval][2])
+
+    received = False
+    for start, end in _month_windows(*date_range):
+        # Exclusive end, so the intraday bars of the last day are included
+        stop = end + pd.Timedelta(days=1)
+        window = (start.strftime('%Y-%m-%d'), stop.strftime('%Y-%m-%d'))
+        source = f"yfinance_{interval}_{start:%Y%m}"
+        if stop <= served_from:
+            # Yahoo no longer serves this month: only a copy cached while it
+            # did can have data, a request would be a certain miss
+            chunk = cache.load(ticker, source)[0] if cache is not None else None
+            if chunk is None:
+                increment('data.intraday_expired')
+        else:
+            output = io.StringIO()
+            with contextlib.redirect_stdout(output):
+                chunk = _download(ticker, source, fetch, window, cache)
+            if chunk is None or chunk.empty:
+                # The cache's progress lines stay quiet, but not why a download failed
+                print(output.getvalue(), end='')
+        if chunk is None or chunk.empty:
+            continue
+        chunk = _normalize(chunk)
+        chunk = chunk[(chunk.index >= start) & (chunk.index < stop)]
+        if chunk.empty:
+            continue
+        received = True
+        yield chunk
+
+    if not received:
+        if not allow_synthetic:
+            print(f"No intraday data for {ticker}.")
+            return
+        print(f"No intraday data for {ticker}. Using synthetic bars...")
+        increment('data.synthetic_fallback')
+        yield from iter_synthetic_intraday(date_range, bar_size=YFINANCE_INTERVALS[interval][0])
+
+
+class OHLCVResampler:
+    """
+    Streaming OHLCV resampler
+
+    Bars are fed in time-ordered chunks; each ``update()`` returns the bars of
+    ``bar_size`` that are complete, and the last (possibly partial) bar is held
+    back until the next chunk shows it has ended. Intraday bars start at the
+    session open of their day (09:30, 10:30, ... for '1h'), daily bars at
+    midnight and weekly or longer bars at midnight on Mondays. Bars are labelled with their start time; periods
+    without input bars (nights, weekends) produce no bar.
+
+    Parameters:
+    -----------
+    bar_size : str
+        Target bar length as a pandas frequency, e.g. '15min', '1h' or '1D'
+    """
+
+    def __init__(self, bar_size):
+        self.bar_size = pd.Timedelta(bar_size)
+        self._carry = None
+
+    def labels(self, index):
+        """Start time of the resampled bar each timestamp falls into"""
+        if self.bar_size >= pd.Timedelta(weeks=1):
+            # A plain floor would count weeks from the epoch, a Thursday
+            return WEEK_ANCHOR + (index - WEEK_ANCHOR).floor(self.bar_size)
+        if self.bar_size >= pd.Timedelta(days=1):
+            return index.floor(self.bar_size)
+        anchor = index.normalize() + (pd.Timestamp(SESSION_OPEN) - pd.Timestamp(SESSION_OPEN).normalize())
+        return anchor + (index - anchor).floor(self.bar_size)
+
+    @staticmethod
+    def _aggregate(data, labels):
+        if data.empty:
+            return pd.DataFrame(columns=COLUMNS, dtype=float)
+        # Labels are sorted, so every bar is a contiguous run of rows
+        values = data[COLUMNS].to_numpy(dtype=float)
+        starts = np.flatnonzero(np.r_[True, labels[1:] != labels[:-1]])
+        ends = np.r_[starts[1:], len(values)] - 1
+        return pd.DataFrame({
+            'Open': values[starts, 0],
+            'High': np.maximum.reduceat(values[:, 1], starts),
+            'Low': np.minimum.reduceat(values[:, 2], starts),
+            'Close': values[ends, 3],
+            'Volume': np.add.reduceat(values[:, 4], starts),
+        }, index=labels[starts].rename(data.index.name))
+
+    def update(self, chunk):
+        """Add a chunk of bars and return the completed resampled bars"""
+        chunk = chunk.dropna(subset=['Close'])
+        if self._carry is not None:
+            chunk = pd.concat([self._carry, chunk])
+        if chunk.empty:
+            return pd.DataFrame(columns=COLUMNS, dtype=float)
+        labels = self.labels(chunk.index)
+        done = labels < labels[-1]
+        self._carry = chunk[~done]
+        return self._aggregate(chunk[done], labels[done])
+
+    def flush(self):
+        """Return the held-back last bar"""
+        carry, self._carry = self._carry, None
+        if carry is None or carry.empty:
+            return pd.DataFrame(columns=COLUMNS, dtype=float)
+        return self._aggregate(carry, self.labels(carry.index))
+
+
+def resample_ohlcv(data, bar_size):
+    """Resample OHLCV bars to ``bar_size`` (see ``OHLCVResampler``)"""
+    resampler = OHLCVResampler(bar_size)
+    return pd.concat([resampler.update(data), resampler.flush()])
+
+
+def load_intraday(ticker, date_range, interval='5m', bar_size=None, csv=None, cache=True,
+                  allow_synthetic=True):
+    """
+    Load intraday bars, resampling each chunk as it arrives
+
+    Only the resampled bars are collected, so loading a multi-year minute
+    history into, say, 15-minute bars holds one month of minute bars at a time.
+
+    Args:
+        ticker (str): Ticker symbol
+        date_range (tuple): (start_date, end_date) as strings
+        interval (str): Source bar interval, a key of ``YFINANCE_INTERVALS``
+        bar_size (str): Target bar size, e.g. '15min' (default: keep ``interval``)
+        csv (str): Read bars from this CSV file instead of downloading them
+        cache (bool or OHLCVCache): On-disk cache for the monthly downloads
+        allow_synthetic (bool): Fall back to synthetic bars
+
+    Returns:
+        pandas.DataFrame: OHLCV bars, or None if there is no data
+    """
+    if csv is not None:
+        chunks = iter_csv(csv)
+    else:
+        chunks = iter_intraday(ticker, date_range, interval=interval, cache=cache,
+                               allow_synthetic=allow_synthetic)
+    resampler = OHLCVResampler(bar_size) if bar_size else None
+
+    parts = []
+    with span('data.load_intraday', ticker=ticker, interval=interval, bar_size=bar_size):
+        for chunk in chunks:
+            if csv is not None:
+                chunk = chunk[(chunk.index >= pd.Timestamp(date_range[0]))
+                              & (chunk.index < pd.Timestamp(date_range[1]) + pd.Timedelta(days=1))]
+            parts.append(resampler.update(chunk) if resampler else chunk)
+        if resampler:
+            parts.append(resampler.flush())
+    parts = [part for part in parts if not part.empty]
+    if not parts:
+        return None
+    data = pd.concat(parts)
+    print(f"Loaded {len(data)} {bar_size or interval} bars for {ticker} "
+          f"from {data.index[0]:%Y-%m-%d %H:%M} to {data.index[-1]:%Y-%m-%d %H:%M}")
+    return data
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Download and resample intraday bars")
+    parser.add_argument('tickers', nargs='*', default=['SPY'], help="Ticker symbols (default: SPY)")
+    parser.add_argument('--interval', default='5m', choices=list(YFINANCE_INTERVALS),
+                        help="Source bar interval (default: 5m)")
+    parser.add_argument('--bar-size', default=None, help="Resample to this bar size, e.g. 15min or 1h")
+    parser.add_argument('--start', default=None, help="Start date (default: 55 days ago)")
+    parser.add_argument('--end', default=None, help="End date (default: today)")
+    parser.add_argument('--csv', default=None, help="Read bars from this CSV file instead of downloading")
+    parser.add_argument('--allow-synthetic', action='store_true',
+                        help="Use synthetic bars for tickers whose download fails")
+    parser.add_argument('--store', default=None, help="Write the bars into a price store (see price_store.py)")
+    parser.add_argument('--output', default=None, help="Write the bars to CSV (one file per ticker: <output>_<ticker>.csv)")
+    args = parser.parse_args(argv)
+
+    end = pd.Timestamp(args.end) if args.end else pd.Timestamp.today().normalize()
+    start = pd.Timestamp(args.start) if args.start else end - pd.Timedelta(days=55)
+    date_range = (start.strftime('%Y-%m-%d'), end.strftime('%Y-%m-%d'))
+
+    def loaded():
+        for ticker in args.tickers:
+            data = load_intraday(ticker.upper(), date_range, interval=args.interval, bar_size=args.bar_size,
+                                 csv=args.csv, allow_synthetic=args.allow_synthetic)
+            if data is None:
+                print(f"No data for {ticker}, skipped")
+                continue
+            if args.output:
+                filename = f"{args.output}_{ticker.upper()}.csv"
+                data.to_csv(filename)
+                print(f"Bars saved to: {filename}")
+            yield ticker.upper(), data
+
+    if args.store:
+        from price_store import PriceStore
+        store = PriceStore.write(args.store, loaded())
+        print(f"Price store written to: {args.store} ({len(store)} tickers)")
+    else:
+        for _ in loaded():
+            pass
+
+
+if __name__ == "__main__":
+    main()
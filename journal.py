@@ -0,0 +1,231 @@
+"""
+Append-only SQLite journal of completed batch work, for resuming interrupted runs
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import pickle
+import sqlite3
+import time
+
+import pandas as pd
+
+DEFAULT_PATH = 'run_journal.sqlite'
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    job TEXT NOT NULL,
+    kind TEXT NOT NULL,
+    unit TEXT NOT NULL,
+    status TEXT NOT NULL,
+    orders TEXT,
+    summary TEXT,
+    result BLOB,
+    error TEXT,
+    started REAL,
+    elapsed REAL,
+    recorded REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS entries_job_unit ON entries (job, unit);
+CREATE TABLE IF NOT EXISTS jobs (
+    job TEXT PRIMARY KEY,
+    kind TEXT NOT NULL,
+    config TEXT NOT NULL,
+    created REAL NOT NULL
+);
+"""
+
+
+def _json_default(value):
+    if hasattr(value, 'item'):
+        return value.item()
+    return str(value)
+
+
+def job_key(kind, config):
+    """
+    Stable identifier of a batch job
+
+    Args:
+        kind (str): Job type, e.g. 'universe' or 'sweep'
+        config (dict): Settings shared by all units of the job; units are not
+            part of the key, so adding tickers or grid points resumes the job
+
+    Returns:
+        str: 16 hex digits
+    """
+    payload = json.dumps({'kind': kind, 'config': config}, sort_keys=True, default=_json_default)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()[:16]
+
+
+def unit_key(unit):
+    """String key of a unit of work (a ticker, or a parameter dict as sorted JSON)"""
+    if isinstance(unit, str):
+        return unit
+    return json.dumps(unit, sort_keys=True, default=_json_default)
+
+
+def timed_call(func, *args, **kwargs):
+    """
+    Call ``func`` and time it; used as the worker function of journaled pools
+
+    Returns:
+        tuple: (result, started, elapsed) - the result, the wall clock start
+        time and the elapsed seconds
+    """
+    started = time.time()
+    t0 = time.perf_counter()
+    result = func(*args, **kwargs)
+    return result, started, time.perf_counter() - t0
+
+
+class RunJournal:
+    """
+    Append-only record of the units of work finished by batch jobs
+
+    Every finished unit (one ticker of a universe run, one grid point of a
+    sweep) is written as one row and committed immediately, so a run that
+    crashes or is killed keeps everything completed up to that point. Rows are
+    never updated: the latest row of a unit decides its status, and only units
+    whose latest row is 'done' are skipped when the job is run again. Failed
+    units are retried.
+
+    Results are stored pickled, so resumed runs get back exactly the statistics
+    they would have computed, together with a JSON summary of the scalar
+    values for inspection with any SQLite client.
+
+    Only the parent process of a pool writes to the journal.
+
+    Parameters:
+    -----------
+    path : str
+        SQLite database file (default: run_journal.sqlite)
+    """
+
+    def __init__(self, path=DEFAULT_PATH):
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.executescript(SCHEMA)
+        self._conn.commit()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __repr__(self):
+        return f"RunJournal({self.path!r})"
+
+    def close(self):
+        self._conn.close()
+
+    def start_job(self, kind, config):
+        """Register a job (once) and return its key"""
+        job = job_key(kind, config)
+        self._conn.execute('INSERT OR IGNORE INTO jobs (job, kind, config, created) VALUES (?, ?, ?, ?)',
+                           (job, kind, json.dumps(config, sort_keys=True, default=_json_default), time.time()))
+        self._conn.commit()
+        return job
+
+    def completed(self, job):
+        """
+        Results of the units of a job whose latest entry is 'done'
+
+        Returns:
+            dict: unit key -> unpickled result
+        """
+        rows = self._conn.execute(
+            'SELECT unit, status, result FROM entries WHERE id IN '
+            '(SELECT MAX(id) FROM entries WHERE job = ? GROUP BY unit)', (job,))
+        return {unit: pickle.loads(result) for unit, status, result in rows if status == 'done'}
+
+    def record(self, job, kind, unit, result=None, orders=None, error=None, started=None, elapsed=None):
+        """
+        Append the outcome of one unit and commit it
+
+        Args:
+            job (str): Job key from ``start_job``
+            kind (str): Job type
+            unit (str or dict): Unit of work, see ``unit_key``
+            result: Picklable result (a stats Series or dict); None for failures
+            orders (str): Fitted ARIMA orders, see ``arima_backtesting.describe_orders``
+            error (str): Error message of a failed unit
+            started (float): Wall clock start time
+            elapsed (float): Seconds spent on the unit
+        """
+        summary = None
+        if result is not None:
+            values = result.to_dict() if isinstance(result, pd.Series) else dict(result)
+            summary = json.dumps(values, default=_json_default)
+        self._conn.execute(
+            'INSERT INTO entries (job, kind, unit, status, orders, summary, result, error, started, elapsed, '
+            'recorded) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+            (job, kind, unit_key(unit), 'failed' if error is not None else 'done', orders, summary,
+             None if result is None else pickle.dumps(result), error, started, elapsed, time.time()))
+        self._conn.commit()
+
+    def entries(self, job=None):
+        """
+        Journal entries without the pickled results
+
+        Args:
+            job (str): Only entries of this job
+
+        Returns:
+            pandas.DataFrame: One row per entry in the order they were written
+        """
+        query = ('SELECT id, job, kind, unit, status, orders, elapsed, error, '
+                 "datetime(recorded, 'unixepoch') AS recorded FROM entries")
+        params = ()
+        if job is not None:
+            query += ' WHERE job = ?'
+            params = (job,)
+        return pd.read_sql_query(query + ' ORDER BY id', self._conn, params=params)
+
+    def jobs(self):
+        """
+        Jobs in the journal with their number of done and failed units
+
+        Returns:
+            pandas.DataFrame: One row per job
+        """
+        return pd.read_sql_query(
+            "SELECT j.job, j.kind, datetime(j.created, 'unixepoch') AS created, "
+            "SUM(e.status = 'done') AS done, SUM(e.status = 'failed') AS failed, "
+            'SUM(e.elapsed) AS elapsed, j.config FROM jobs j LEFT JOIN entries e ON e.job = j.job '
+            'AND e.id IN (SELECT MAX(id) FROM entries GROUP BY job, unit) '
+            'GROUP BY j.job ORDER BY j.created', self._conn)
+
+
+def open_journal(journal):
+    """Return ``journal`` if it is a RunJournal, otherwise open the journal at that path"""
+    return journal if isinstance(journal, RunJournal) else RunJournal(journal)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Inspect a batch run journal")
+    parser.add_argument('--path', default=DEFAULT_PATH, help=f"Journal file (default: {DEFAULT_PATH})")
+    parser.add_argument('--job', default=None, help="List the entries of this job")
+    args = parser.parse_args(argv)
+
+    if not os.path.exists(args.path):
+        print(f"No journal at {args.path}")
+        exit(1)
+    with RunJournal(args.path) as journal:
+        with pd.option_context('display.width', 160, 'display.max_colwidth', 60):
+            if args.job:
+                print(journal.entries(args.job).to_string(index=False))
+            else:
+                print(journal.jobs().to_string(index=False))
+
+
+if __name__ == "__main__":
+    main()
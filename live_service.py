@@ -0,0 +1,340 @@
+"""
+Long-running forecast service that keeps one walk-forward ARIMA model per symbol in memory
+"""
+
+import argparse
+import queue
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from forecast_bands import aggregate_bands
+from instrumentation import increment, span
+from walk_forward import WalkForwardARIMA
+
+
+class ReplayFeed:
+    """
+    Replays stored close prices as a live bar feed
+
+    Bars are yielded as ``(symbol, timestamp, close)`` tuples in time order; bars
+    with the same timestamp are yielded together before the optional pause.
+
+    Parameters:
+    -----------
+    prices : pandas.DataFrame, pandas.Series, dict or str
+        Close prices with a DatetimeIndex: a DataFrame with one column per
+        symbol, a named Series, a dict symbol -> Series or the path of a CSV
+        file in the DataFrame layout
+    delay : float, optional
+        Seconds to wait between timestamps to simulate a live pace (default: 0)
+    """
+
+    def __init__(self, prices, delay=0.0):
+        if isinstance(prices, str):
+            prices = pd.read_csv(prices, index_col=0, parse_dates=True)
+        elif isinstance(prices, pd.Series):
+            prices = prices.to_frame(prices.name or 'PRICE')
+        elif isinstance(prices, dict):
+            prices = pd.DataFrame(prices)
+        self.prices = prices.sort_index()
+        self.delay = delay
+
+    def __iter__(self):
+        for timestamp, row in self.prices.iterrows():
+            for symbol, close in row.dropna().items():
+                yield symbol, timestamp, float(close)
+            if self.delay:
+                time.sleep(self.delay)
+
+
+class QueueFeed:
+    """
+    Feed for push-based sources
+
+    A producer thread (websocket client, broker callback, ...) calls ``put()``
+    for each new bar and ``close()`` when it is done; the service iterates the feed.
+    """
+
+    _CLOSED = object()
+
+    def __init__(self, maxsize=0):
+        self._queue = queue.Queue(maxsize=maxsize)
+
+    def put(self, symbol, timestamp, close):
+        self._queue.put((symbol, timestamp, float(close)))
+
+    def close(self):
+        self._queue.put(self._CLOSED)
+
+    def __iter__(self):
+        while True:
+            bar = self._queue.get()
+            if bar is self._CLOSED:
+                return
+            yield bar
+
+
+class ForecastService:
+    """
+    Keeps fitted models in memory and publishes a forecast band for every new bar
+
+    Each bar advances the symbol's model by one Kalman filter step instead of a
+    refit. The close is first compared with the band forecast from the previous
+    bar (the same rule as ``ARIMAStrategy``): below the band is a 'long' signal,
+    above it 'short', inside it 'flat'. Then the model is updated and the next
+    band is published to every subscriber.
+
+    The order is re-selected every ``reselect_every`` bars. With
+    ``background_reselect`` the search runs in a worker thread while the
+    current model keeps serving; bars that arrive meanwhile are replayed onto
+    the new model before it is swapped in.
+
+    Parameters:
+    -----------
+    n_periods : int, optional
+        Forecast horizon (default: 5)
+    alpha : float, optional
+        Significance level of the confidence bands (default: 0.05)
+    band_agg : str, optional
+        How the per-period bands are collapsed into one band, see
+        ``forecast_bands.aggregate_bands`` (default: 'envelope')
+    train_window : int, optional
+        Bars used for order selection; symbols without a model are warmed up
+        until this many bars have been received (default: 252)
+    reselect_every : int or None, optional
+        Bars between order re-selections; ``None`` or 0 disables them (default: 63)
+    cache : ModelCache or bool, optional
+        Model selection cache passed to ``cached_auto_arima`` (default: True)
+    background_reselect : bool, optional
+        Run re-selections in a worker thread (default: True)
+    **arima_kwargs
+        Keyword arguments passed on to ``auto_arima``
+    """
+
+    def __init__(self, n_periods=5, alpha=0.05, band_agg='envelope', train_window=252,
+                 reselect_every=63, cache=True, background_reselect=True, **arima_kwargs):
+        self.n_periods = n_periods
+        self.alpha = alpha
+        self.band_agg = band_agg
+        self.train_window = train_window
+        self.reselect_every = reselect_every
+        self.cache = cache
+        self.arima_kwargs = arima_kwargs
+        self.latest = {}
+        self._states = {}
+        self._warmup = {}
+        self._subscribers = []
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='reselect') \
+            if background_reselect else None
+
+    @property
+    def symbols(self):
+        return list(self._states)
+
+    def subscribe(self, callback):
+        """Register ``callback(update)``, called with every published update dict"""
+        self._subscribers.append(callback)
+        return callback
+
+    def unsubscribe(self, callback):
+        self._subscribers.remove(callback)
+
+    def _new_model(self):
+        # Re-selection is scheduled by the service, not by the model itself
+        return WalkForwardARIMA(train_window=self.train_window, reselect_every=None,
+                                cache=self.cache, **self.arima_kwargs)
+
+    def _band(self, model):
+        forecast, conf_int = model.forecast(n_periods=self.n_periods, alpha=self.alpha)
+        lo, hi = aggregate_bands(conf_int[None, :, 0], conf_int[None, :, 1], self.band_agg)
+        return forecast, conf_int, lo[0], hi[0]
+
+    def add_symbol(self, symbol, history):
+        """
+        Fit a model for ``symbol`` on its price history and publish the first band
+
+        Returns:
+            dict: The published update
+        """
+        start = time.perf_counter()
+        history = np.asarray(history, dtype=float)
+        with span('live.fit', symbol=symbol, n_obs=len(history)):
+            model = self._new_model().fit(history)
+        state = {
+            'model': model,
+            'history': deque(history[-self.train_window:], maxlen=self.train_window),
+            'updates': 0,
+            'pending': None,
+            'since': [],
+        }
+        state['forecast'], state['conf_int'], state['lo'], state['hi'] = self._band(model)
+        self._states[symbol] = state
+        self._warmup.pop(symbol, None)
+        return self._publish(symbol, None, float(history[-1]), None, state, start)
+
+    def _reselect(self, state):
+        snapshot = np.asarray(state['history'])
+        if self._executor is None:
+            state['model'] = self._new_model().fit(snapshot)
+            return
+        state['pending'] = self._executor.submit(self._new_model().fit, snapshot)
+        state['since'] = []
+
+    def _swap_if_ready(self, symbol, state):
+        pending = state['pending']
+        if pending is None or not pending.done():
+            return
+        state['pending'] = None
+        try:
+            model = pending.result()
+            if state['since']:
+                model.update(state['since'])
+        except Exception as e:
+            increment('live.reselect_errors')
+            print(f"Re-selection failed for {symbol}, keeping the current model: {e}")
+        else:
+            state['model'] = model
+        state['since'] = []
+
+    def on_bar(self, symbol, timestamp, close):
+        """
+        Ingest one new bar
+
+        Returns:
+            dict or None: The published update, or None while the symbol is warming up
+        """
+        start = time.perf_counter()
+        state = self._states.get(symbol)
+        if state is None:
+            buffer = self._warmup.setdefault(symbol, [])
+            buffer.append(close)
+            if len(buffer) < self.train_window:
+                return None
+            return self.add_symbol(symbol, buffer)
+
+        with span('live.update', symbol=symbol):
+            self._swap_if_ready(symbol, state)
+            lo, hi = state['lo'], state['hi']
+            signal = 'long' if close < lo else 'short' if close > hi else 'flat'
+
+            state['model'].update(close)
+            state['history'].append(close)
+            state['updates'] += 1
+            if state['pending'] is not None:
+                state['since'].append(close)
+            elif self.reselect_every and state['updates'] >= self.reselect_every:
+                # Counted from the last scheduled selection, so a slow
+                # background search delays the next one instead of skipping it
+                state['updates'] = 0
+                self._reselect(state)
+
+            state['forecast'], state['conf_int'], state['lo'], state['hi'] = self._band(state['model'])
+        increment('live.updates')
+        return self._publish(symbol, timestamp, close, signal, state, start)
+
+    def _publish(self, symbol, timestamp, close, signal, state, start):
+        update = {
+            'symbol': symbol,
+            'timestamp': timestamp,
+            'close': close,
+            'signal': signal,
+            'order': state['model'].order,
+            'forecast': state['forecast'],
+            'conf_int': state['conf_int'],
+            'lo': state['lo'],
+            'hi': state['hi'],
+            'latency_s': time.perf_counter() - start,
+        }
+        self.latest[symbol] = update
+        for callback in self._subscribers:
+            try:
+                callback(update)
+            except Exception as e:
+                increment('live.subscriber_errors')
+                print(f"Subscriber {callback!r} failed: {e}")
+        return update
+
+    def run(self, feed, max_bars=None):
+        """
+        Consume a feed of ``(symbol, timestamp, close)`` bars until it ends
+
+        Returns:
+            int: Number of bars processed
+        """
+        processed = 0
+        for symbol, timestamp, close in feed:
+            self.on_bar(symbol, timestamp, close)
+            processed += 1
+            if max_bars is not None and processed >= max_bars:
+                break
+        return processed
+
+    def close(self):
+        """Stop the re-selection worker"""
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Replay price history through the live ARIMA forecast service")
+    parser.add_argument('tickers', nargs='*', default=['SPY'], help="Ticker symbols (default: SPY)")
+    parser.add_argument('--start', default="2023-01-01", help="Start date (YYYY-MM-DD)")
+    parser.add_argument('--end', default="2025-06-24", help="End date (YYYY-MM-DD)")
+    parser.add_argument('--replay', default=None,
+                        help="CSV of close prices (one column per symbol) to replay instead of downloading")
+    parser.add_argument('--warmup', type=int, default=252, help="Bars used to fit the initial models")
+    parser.add_argument('--periods', type=int, default=5, help="Forecast horizon (default: 5)")
+    parser.add_argument('--delay', type=float, default=0.0, help="Seconds between replayed bars")
+    parser.add_argument('--quiet', action='store_true', help="Only print signal changes")
+    args = parser.parse_args(argv)
+
+    if args.replay:
+        prices = pd.read_csv(args.replay, index_col=0, parse_dates=True)
+    else:
+        from utils import get_ticker_data
+        prices = pd.DataFrame({
+            ticker: get_ticker_data(ticker, for_backtesting=False, date_range=(args.start, args.end))
+            for ticker in args.tickers
+        })
+    prices = prices.dropna(how='all')
+    if len(prices) <= args.warmup:
+        print(f"Need more than {args.warmup} bars to replay, got {len(prices)}. Exiting.")
+        exit(1)
+
+    service = ForecastService(n_periods=args.periods, train_window=args.warmup)
+    last_signal = {}
+
+    def report(update):
+        changed = last_signal.get(update['symbol']) != update['signal']
+        last_signal[update['symbol']] = update['signal']
+        if update['signal'] is None or (args.quiet and not changed):
+            return
+        print(f"{update['timestamp']:%Y-%m-%d} {update['symbol']:<6} close ${update['close']:.2f} "
+              f"band ${update['lo']:.2f} - ${update['hi']:.2f} -> {update['signal']:<5} "
+              f"({update['latency_s'] * 1000:.1f} ms)")
+
+    print(f"Fitting initial models on {args.warmup} bars...")
+    for symbol in prices.columns:
+        service.add_symbol(symbol, prices[symbol].iloc[:args.warmup].dropna())
+    service.subscribe(report)
+
+    latencies = []
+    service.subscribe(lambda update: latencies.append(update['latency_s']))
+    print(f"Replaying {len(prices) - args.warmup} bars for {', '.join(prices.columns)}...")
+    try:
+        service.run(ReplayFeed(prices.iloc[args.warmup:], delay=args.delay))
+    finally:
+        service.close()
+
+    if latencies:
+        latencies = np.array(latencies) * 1000
+        print(f"\nUpdate latency: mean {latencies.mean():.1f} ms, "
+              f"p95 {np.percentile(latencies, 95):.1f} ms, max {latencies.max():.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
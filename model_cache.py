@@ -0,0 +1,227 @@
+"""
+On-disk cache for auto_arima model selection keyed by a fingerprint of the data
+"""
+
+import contextlib
+import hashlib
+import json
+import os
+import pickle
+import time
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+import numpy as np
+
+from arima_backends import get_backend
+from instrumentation import increment, span
+
+
+def _hash_values(values):
+    return hashlib.sha256(np.ascontiguousarray(values, dtype=np.float64).tobytes()).hexdigest()
+
+
+def _index_bounds(y):
+    index = getattr(y, 'index', None)
+    if index is None or len(index) == 0:
+        return None, None
+    return str(index[0]), str(index[-1])
+
+
+class ModelCache:
+    """
+    LRU cache of fitted ``auto_arima`` models stored in ``cache_dir``.
+
+    Entries are keyed by a hash of the series values, the index range and the
+    search parameters. Updates of the index file are serialized with a file
+    lock, so worker processes sharing the cache do not drop each other's
+    entries. A series that extends a cached series (same search
+    parameters, same start and identical leading values) reuses the cached
+    order and only refits the coefficients, starting from the cached ones.
+
+    Parameters:
+    -----------
+    cache_dir : str, optional
+        Directory for the pickled models and the index file (default: "model_cache")
+    max_entries : int, optional
+        Least recently used entries beyond this number are evicted (default: 1024)
+    """
+
+    def __init__(self, cache_dir="model_cache", max_entries=1024):
+        self.cache_dir = cache_dir
+        self.max_entries = max_entries
+        self._index_path = os.path.join(cache_dir, "index.json")
+        self._lock_path = os.path.join(cache_dir, "index.lock")
+
+    @contextlib.contextmanager
+    def _locked(self):
+        """Hold an exclusive lock on the index across processes"""
+        os.makedirs(self.cache_dir, exist_ok=True)
+        with open(self._lock_path, 'a+b') as lock_file:
+            if fcntl is not None:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+            else:
+                import msvcrt
+                lock_file.seek(0)
+                while True:
+                    try:
+                        msvcrt.locking(lock_file.fileno(), msvcrt.LK_LOCK, 1)
+                        break
+                    except OSError:
+                        pass
+            try:
+                yield
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+                else:
+                    lock_file.seek(0)
+                    msvcrt.locking(lock_file.fileno(), msvcrt.LK_UNLCK, 1)
+
+    def _load_index(self):
+        try:
+            with open(self._index_path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _save_index(self, index):
+        os.makedirs(self.cache_dir, exist_ok=True)
+        tmp_path = f"{self._index_path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(index, f)
+        os.replace(tmp_path, self._index_path)
+
+    def _model_path(self, key):
+        return os.path.join(self.cache_dir, f"{key}.pkl")
+
+    def _load_model(self, key):
+        try:
+            with open(self._model_path(key), 'rb') as f:
+                return pickle.load(f)
+        except (OSError, pickle.UnpicklingError, EOFError):
+            return None
+
+    def _touch(self, key):
+        with self._locked():
+            index = self._load_index()
+            if key in index:
+                index[key]['last_access'] = time.time()
+                self._save_index(index)
+
+    def _store(self, key, entry, model):
+        os.makedirs(self.cache_dir, exist_ok=True)
+        tmp_path = f"{self._model_path(key)}.{os.getpid()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            pickle.dump(model, f)
+        os.replace(tmp_path, self._model_path(key))
+        entry['last_access'] = time.time()
+
+        # Re-read the index under the lock so entries added by other processes
+        # since it was loaded are kept
+        with self._locked():
+            index = self._load_index()
+            index[key] = entry
+
+            # Evict least recently used entries
+            if len(index) > self.max_entries:
+                by_age = sorted(index, key=lambda k: index[k]['last_access'])
+                for old_key in by_age[:len(index) - self.max_entries]:
+                    index.pop(old_key)
+                    try:
+                        os.remove(self._model_path(old_key))
+                    except OSError:
+                        pass
+            self._save_index(index)
+
+    def auto_arima(self, y, **kwargs):
+        """
+        Drop-in replacement for ``pmdarima.auto_arima`` that reuses cached selections
+
+        ``backend`` selects the order search, see ``arima_backends``; it is part
+        of the cache key unless it is the default 'pmdarima'.
+
+        Returns:
+            pmdarima.arima.ARIMA: Fitted model
+        """
+        backend = kwargs.pop('backend', None) or 'pmdarima'
+        values = np.asarray(y, dtype=float)
+        start, end = _index_bounds(y)
+        search = kwargs if backend == 'pmdarima' else dict(kwargs, backend=backend)
+        search_hash = hashlib.sha256(json.dumps(search, sort_keys=True, default=str).encode()).hexdigest()
+        values_hash = _hash_values(values)
+        key = hashlib.sha256(f"{values_hash}|{start}|{end}|{search_hash}".encode()).hexdigest()[:32]
+
+        index = self._load_index()
+        entry = index.get(key)
+        if entry is not None:
+            model = self._load_model(key)
+            if model is not None:
+                self._touch(key)
+                increment('model_cache.hit')
+                return model
+
+        from pmdarima import ARIMA
+
+        new_entry = {'search_hash': search_hash, 'values_hash': values_hash, 'start': start,
+                     'n_obs': len(values)}
+        base = self._find_prefix(index, values, start, search_hash)
+        model = None
+        if base is not None:
+            try:
+                with span('model.refit', n_obs=len(values), order=tuple(base['order'])):
+                    model = ARIMA(order=tuple(base['order']), with_intercept=base['with_intercept'],
+                                  start_params=np.asarray(base['params']),
+                                  suppress_warnings=True).fit(y)
+                increment('model_cache.prefix_hit')
+            except Exception:
+                model = None
+        if model is None:
+            with span('model.auto_arima', n_obs=len(values), backend=backend):
+                model = get_backend(backend)(y, **kwargs)
+            increment('model_cache.miss')
+
+        new_entry.update(order=list(model.order), with_intercept=bool(model.with_intercept),
+                         params=[float(p) for p in np.asarray(model.params())])
+        self._store(key, new_entry, model)
+        return model
+
+    def _find_prefix(self, index, values, start, search_hash):
+        """Find the longest cached series that the new values extend"""
+        best = None
+        for entry in index.values():
+            n_obs = entry.get('n_obs', 0)
+            if (entry.get('search_hash') != search_hash or entry.get('start') != start
+                    or not 0 < n_obs < len(values) or 'order' not in entry):
+                continue
+            if best is not None and n_obs <= best['n_obs']:
+                continue
+            if _hash_values(values[:n_obs]) == entry['values_hash']:
+                best = entry
+        return best
+
+
+def cached_auto_arima(y, cache=None, **kwargs):
+    """
+    Run ``auto_arima`` through a model cache
+
+    Args:
+        y (array-like): Time series
+        cache (ModelCache or bool): Cache to use; True uses the default
+            ``model_cache/`` directory, None/False calls ``auto_arima`` directly
+        **kwargs: Search parameters passed on to ``auto_arima``; ``backend``
+            selects the order search (see ``arima_backends``, default 'pmdarima')
+
+    Returns:
+        pmdarima.arima.ARIMA: Fitted model
+    """
+    if cache is True:
+        cache = ModelCache()
+    if not cache:
+        backend = kwargs.pop('backend', None) or 'pmdarima'
+        with span('model.auto_arima', n_obs=len(y), backend=backend):
+            return get_backend(backend)(y, **kwargs)
+    return cache.auto_arima(y, **kwargs)
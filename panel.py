@@ -0,0 +1,279 @@
+"""
+Batched ARIMA fitting and forecasting for a panel of tickers
+"""
+
+import argparse
+import contextlib
+import io
+import itertools
+import os
+import warnings
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from arima_backends import hannan_rissanen_ic, kpss_ndiffs
+from instrumentation import collect, merge, span
+
+# Shorter series are reported as errors instead of being fitted
+MIN_OBSERVATIONS = 30
+
+
+def load_panel(tickers, date_range=("2024-01-01", "2025-06-24"), cache=True, allow_synthetic=False,
+               max_workers=8):
+    """
+    Download close prices for several tickers and align them on their dates
+
+    Returns:
+        pandas.DataFrame: Close prices, one column per ticker (tickers without
+        data are left out)
+    """
+    from utils import get_ticker_data
+
+    def load(ticker):
+        with contextlib.redirect_stdout(io.StringIO()):
+            return get_ticker_data(ticker, for_backtesting=False, date_range=date_range, cache=cache,
+                                   allow_synthetic=allow_synthetic)
+
+    tickers = list(dict.fromkeys(t.upper() for t in tickers))
+    with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(tickers)))) as executor:
+        series = dict(zip(tickers, executor.map(load, tickers)))
+
+    missing = [t for t, s in series.items() if s is None or len(s) == 0]
+    if missing:
+        print(f"No data for: {', '.join(missing)}")
+    prices = pd.DataFrame({t: s for t, s in series.items() if t not in missing})
+    return prices.dropna(how='all')
+
+
+def _select(values, d, max_p, max_q, information_criterion):
+    """Pick the order of every series in a group with equal length and d"""
+    # Same rule as fast_auto_arima: no intercept once the series is differenced twice
+    intercepts = (True, False) if d < 2 else (False,)
+    candidates, scores, estimates = [], [], []
+    for intercept in intercepts:
+        result = hannan_rissanen_ic(values, max_p=max_p, max_q=max_q, with_intercept=intercept)
+        candidates += [(p, q, intercept) for p, q in result['orders']]
+        scores.append(result[information_criterion])
+        estimates.append(result)
+    best = np.argmin(np.concatenate(scores, axis=1), axis=1)
+
+    n_candidates = len(estimates[0]['orders'])
+    rows = np.arange(len(values))
+    selected = {'candidate': [candidates[c] for c in best], 'criterion': np.concatenate(scores, axis=1)[rows, best]}
+    for key in ('phi', 'theta', 'resid_tail', 'sigma2'):
+        stacked = np.concatenate([e[key] for e in estimates], axis=1)
+        selected[key] = stacked[rows, best]
+    means = np.stack([e['mean'] for e in estimates], axis=1)
+    selected['mean'] = means[rows, best // n_candidates]
+    return selected
+
+
+def _css_forecast(levels, x, selected, d, n_periods, alpha):
+    """
+    Forecast a group of series from their conditional-sum-of-squares estimates
+
+    Args:
+        levels (numpy.ndarray): Last value of the series differenced 0..d-1 times, shape (n_series, d)
+        x (numpy.ndarray): Demeaned differenced series, shape (n_series, n_obs)
+        selected (dict): Output of ``_select``
+    """
+    from scipy.stats import norm
+
+    phi, theta, tail = selected['phi'], selected['theta'], selected['resid_tail']
+    n_series, max_p = phi.shape
+    max_q = theta.shape[1]
+
+    # Point forecasts of the differenced series; future innovations are zero
+    ext = np.concatenate([x[:, x.shape[1] - max_p:], np.zeros((n_series, n_periods))], axis=1)
+    shocks = np.concatenate([tail[:, ::-1], np.zeros((n_series, n_periods))], axis=1)
+    for k in range(n_periods):
+        t = max_p + k
+        for i in range(1, max_p + 1):
+            ext[:, t] += phi[:, i - 1] * ext[:, t - i]
+        for j in range(1, max_q + 1):
+            ext[:, t] += theta[:, j - 1] * shocks[:, max_q + k - j]
+    forecast = ext[:, max_p:] + selected['mean'][:, None]
+    for level in range(d - 1, -1, -1):
+        forecast = levels[:, level][:, None] + np.cumsum(forecast, axis=1)
+
+    # psi weights of the ARIMA process (AR polynomial times (1 - B)^d)
+    ar_poly = np.concatenate([np.ones((n_series, 1)), -phi], axis=1)
+    for _ in range(d):
+        ar_poly = np.concatenate([ar_poly, np.zeros((n_series, 1))], axis=1)
+        ar_poly[:, 1:] -= ar_poly[:, :-1].copy()
+    ar_star = -ar_poly[:, 1:]
+    psi = np.zeros((n_series, n_periods))
+    psi[:, 0] = 1.0
+    for j in range(1, n_periods):
+        psi[:, j] = theta[:, j - 1] if j <= max_q else 0.0
+        for i in range(1, min(j, ar_star.shape[1]) + 1):
+            psi[:, j] += ar_star[:, i - 1] * psi[:, j - i]
+    std = np.sqrt(selected['sigma2'][:, None] * np.cumsum(psi ** 2, axis=1))
+    z = norm.ppf(1 - alpha / 2)
+    return forecast, forecast - z * std, forecast + z * std
+
+
+def _css_params(selected, index):
+    p, q, intercept = selected['candidate'][index]
+    params = {}
+    if intercept:
+        params['mean'] = float(selected['mean'][index])
+    params.update({f"ar.L{i}": float(selected['phi'][index, i - 1]) for i in range(1, p + 1)})
+    params.update({f"ma.L{j}": float(selected['theta'][index, j - 1]) for j in range(1, q + 1)})
+    params['sigma2'] = float(selected['sigma2'][index])
+    return params
+
+
+def _fit_exact(task):
+    ticker, values, order, intercept, n_periods, alpha, information_criterion = task
+    from pmdarima import ARIMA
+
+    try:
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore')
+            model = ARIMA(order=order, with_intercept=intercept, suppress_warnings=True).fit(values)
+            forecast, conf_int = model.predict(n_periods=n_periods, return_conf_int=True, alpha=alpha)
+    except Exception as e:
+        return ticker, None, str(e)
+    params = dict(zip(model.arima_res_.model.param_names, (float(v) for v in model.params())))
+    return ticker, (getattr(model, information_criterion)(), params, np.asarray(forecast), conf_int[:, 0], conf_int[:, 1]), None
+
+
+def fit_panel(prices, n_periods=5, alpha=0.05, max_p=3, max_q=3, information_criterion='aic',
+              refine=True, max_workers=None, max_d=2):
+    """
+    Select, fit and forecast an ARIMA model for every column of a price panel
+
+    Series are grouped by length and differencing order. Each group is scored
+    in one batched pass over all series and all (p, q) candidates (see
+    ``arima_backends.hannan_rissanen_ic``). With ``refine`` the selected orders
+    are then fitted by exact maximum likelihood in a process pool; otherwise
+    the batched conditional-sum-of-squares estimates are used directly and
+    the forecasts of the whole group are computed together.
+
+    Args:
+        prices (pandas.DataFrame): Close prices, dates x tickers; missing
+            values are dropped per ticker
+        n_periods (int): Forecast horizon
+        alpha (float): 1 - confidence level of the bands
+        max_p (int): Maximum AR order
+        max_q (int): Maximum MA order
+        information_criterion (str): 'aic', 'bic', 'hqic' or 'aicc'
+        refine (bool): Fit the selected orders exactly (slower, pmdarima models)
+        max_workers (int): Worker processes for the exact fits (default: number of CPUs)
+        max_d (int): Maximum differencing order (chosen by KPSS tests as in ``auto_arima``)
+
+    Returns:
+        tuple: (models, forecasts) - ``models`` has one row per ticker with the
+        order, intercept flag, information criterion, parameters and an
+        ``Error`` column; ``forecasts`` is indexed by (Ticker, Step) with
+        Forecast, Lower and Upper columns
+    """
+    series = {ticker: prices[ticker].dropna().to_numpy(dtype=float) for ticker in prices.columns}
+    rows = {}
+    bands = {}
+    by_length = {}
+    for ticker, values in series.items():
+        if len(values) < MIN_OBSERVATIONS:
+            rows[ticker] = {'Error': f"Only {len(values)} observations"}
+            continue
+        by_length.setdefault(len(values), []).append(ticker)
+    groups = {}
+    for n_obs, tickers in by_length.items():
+        for ticker, d in zip(tickers, kpss_ndiffs(np.stack([series[t] for t in tickers]), max_d=max_d)):
+            groups.setdefault((n_obs, int(d)), []).append(ticker)
+
+    exact_tasks = []
+    with span('panel.select', n_series=len(series)):
+        for (n_obs, d), tickers in groups.items():
+            values = np.stack([series[t] for t in tickers])
+            z = np.diff(values, n=d, axis=1)
+            try:
+                selected = _select(z, d, max_p, max_q, information_criterion)
+            except ValueError as e:
+                rows.update({t: {'Error': str(e)} for t in tickers})
+                continue
+
+            if refine:
+                exact_tasks += [(t, series[t], (p, d, q), intercept, n_periods, alpha,
+                                 information_criterion)
+                                for t, (p, q, intercept) in zip(tickers, selected['candidate'])]
+                continue
+
+            levels = np.stack([np.diff(values, n=k, axis=1)[:, -1] for k in range(d)], axis=1) \
+                if d else np.empty((len(tickers), 0))
+            forecast, lo, hi = _css_forecast(levels, z - selected['mean'][:, None], selected, d,
+                                             n_periods, alpha)
+            for i, ticker in enumerate(tickers):
+                p, q, intercept = selected['candidate'][i]
+                rows[ticker] = {'Order': (p, d, q), 'With Intercept': intercept,
+                                information_criterion.upper(): float(selected['criterion'][i]),
+                                'Params': _css_params(selected, i), 'Error': None}
+                bands[ticker] = (forecast[i], lo[i], hi[i])
+
+    if exact_tasks:
+        if max_workers is None:
+            max_workers = os.cpu_count() or 1
+        max_workers = max(1, min(max_workers, len(exact_tasks)))
+        print(f"Fitting {len(exact_tasks)} selected models with {max_workers} worker processes...")
+        chunksize = max(1, len(exact_tasks) // (max_workers * 4))
+        with span('panel.refine', n_series=len(exact_tasks)), \
+                ProcessPoolExecutor(max_workers=max_workers) as executor:
+            results = executor.map(collect, itertools.repeat(_fit_exact), exact_tasks, chunksize=chunksize)
+            for task, ((ticker, fitted, error), metrics) in zip(exact_tasks, results):
+                merge(metrics)
+                if fitted is None:
+                    rows[ticker] = {'Order': task[2], 'Error': error}
+                    continue
+                criterion, params, forecast, lo, hi = fitted
+                rows[ticker] = {'Order': task[2], 'With Intercept': task[3],
+                                information_criterion.upper(): criterion,
+                                'Params': params, 'Error': None}
+                bands[ticker] = (forecast, lo, hi)
+
+    models = pd.DataFrame.from_dict(rows, orient='index').reindex(list(series))
+    models.index.name = 'Ticker'
+    forecasts = pd.concat({
+        ticker: pd.DataFrame({'Forecast': f, 'Lower': lo, 'Upper': hi},
+                             index=pd.RangeIndex(1, n_periods + 1, name='Step'))
+        for ticker, (f, lo, hi) in bands.items()
+    }, names=['Ticker']) if bands else pd.DataFrame(columns=['Forecast', 'Lower', 'Upper'])
+    return models, forecasts
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Fit and forecast ARIMA models for a universe of tickers")
+    parser.add_argument('tickers', nargs='+', help="Ticker symbols, e.g. SPY QQQ IWM")
+    parser.add_argument('--start', default="2024-01-01", help="Start date (YYYY-MM-DD)")
+    parser.add_argument('--end', default="2025-06-24", help="End date (YYYY-MM-DD)")
+    parser.add_argument('--periods', type=int, default=5, help="Forecast horizon (default: 5)")
+    parser.add_argument('--no-refine', action='store_true',
+                        help="Use the batched estimates without exact refits")
+    parser.add_argument('--workers', type=int, default=None, help="Maximum number of worker processes")
+    parser.add_argument('--allow-synthetic', action='store_true',
+                        help="Use synthetic data for tickers whose download fails")
+    parser.add_argument('--output', default=None, help="Optional CSV file for the forecast bands")
+    args = parser.parse_args(argv)
+
+    prices = load_panel(args.tickers, date_range=(args.start, args.end),
+                        allow_synthetic=args.allow_synthetic)
+    if prices.empty:
+        print("Failed to obtain data. Exiting.")
+        exit(1)
+
+    models, forecasts = fit_panel(prices, n_periods=args.periods, refine=not args.no_refine,
+                                  max_workers=args.workers)
+    print("\n=== Selected Models ===")
+    print(models.drop(columns='Params', errors='ignore').to_string())
+    print(f"\n=== {args.periods}-step Forecasts ===")
+    print(forecasts.to_string(float_format=lambda v: f"{v:.2f}"))
+
+    if args.output:
+        forecasts.to_csv(args.output)
+        print(f"Forecasts saved to: {args.output}")
+
+
+if __name__ == "__main__":
+    main()
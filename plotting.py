@@ -1,81 +1,282 @@
-import matplotlib.pyplot as plt
-import matplotlib.dates as mdates
 import pandas as pd
 import numpy as np
 import os
+import warnings
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime
 
+from instrumentation import collect, merge, span, timed
 
-def create_backtest_visualization(data, stats, bt):
+# matplotlib is imported inside the plot functions, so importing this module
+# does not load it
+
+# Rendering options shared by all plot functions, see configure_rendering()
+RENDER_OPTIONS = {
+    'dpi': 300,
+    'format': 'png',
+    'show': True,
+    'plots_dir': 'plots',
+    'results_dir': 'results',
+}
+
+
+def configure_rendering(headless=None, dpi=None, fmt=None, plots_dir=None, results_dir=None):
+    """
+    Configure how plots are rendered and saved
+    
+    Parameters:
+    -----------
+    headless : bool, optional
+        If True, switch to the non-interactive Agg backend and never open
+        windows; if False, show plots after saving them
+    dpi : int, optional
+        Resolution of saved figures
+    fmt : str, optional
+        File format of saved figures, e.g. 'png', 'svg' or 'pdf'
+    plots_dir : str, optional
+        Output directory
+    results_dir : str, optional
+        Results store that summary reports record runs in (see results_store.py)
+    """
+    import matplotlib.pyplot as plt
+    
+    if headless is not None:
+        if headless:
+            plt.switch_backend('Agg')
+        RENDER_OPTIONS['show'] = not headless
+    if dpi is not None:
+        RENDER_OPTIONS['dpi'] = dpi
+    if fmt is not None:
+        RENDER_OPTIONS['format'] = fmt
+    if plots_dir is not None:
+        RENDER_OPTIONS['plots_dir'] = plots_dir
+    if results_dir is not None:
+        RENDER_OPTIONS['results_dir'] = results_dir
+
+
+def _save_figure(fig, name, description):
+    """Save a figure to the plots directory, show it if configured and close it"""
+    import matplotlib.pyplot as plt
+    
+    filename = f"{RENDER_OPTIONS['plots_dir']}/{name}.{RENDER_OPTIONS['format']}"
+    with span('plot.save', plot=name, format=RENDER_OPTIONS['format']):
+        fig.savefig(filename, dpi=RENDER_OPTIONS['dpi'], bbox_inches='tight')
+    print(f"{description} saved to: {filename}")
+    
+    if RENDER_OPTIONS['show']:
+        plt.show()
+    # Close explicitly so figures do not accumulate in long-running processes
+    plt.close(fig)
+    return filename
+
+
+def backtest_analytics(data, stats, window=63, periods_per_year=252):
+    """
+    Per-bar analytics of a backtest, computed from its equity curve and trades
+    
+    Parameters:
+    -----------
+    data : pandas.DataFrame
+        OHLC data the backtest ran on
+    stats : pandas.Series
+        Backtesting statistics with '_equity_curve' and '_trades'
+    window : int, optional
+        Bars in the rolling Sharpe ratio window (default: 63, about a quarter)
+    periods_per_year : int, optional
+        Bars per year used to annualize the rolling Sharpe ratio (default: 252)
+    
+    Returns:
+    --------
+    pandas.DataFrame
+        Indexed like ``data`` with the columns 'Equity', 'Return' (bar-to-bar
+        equity return), 'DrawdownPct', 'RollingSharpe', 'Position' (units held
+        at the close) and 'Exposure [%]' (signed position value as a percentage
+        of equity). Positions come from the closed trades plus the trade
+        still open at the end of the backtest, see ``_open_trades``.
+    """
+    close = data['Close'].to_numpy(dtype=float)
+    equity = stats['_equity_curve']['Equity'].to_numpy(dtype=float)
+    n = len(equity)
+    
+    with np.errstate(divide='ignore', invalid='ignore'):
+        returns = np.r_[0.0, equity[1:] / equity[:-1] - 1]
+    returns[~np.isfinite(returns)] = 0.0
+    drawdown = 1 - equity / np.maximum.accumulate(equity)
+    
+    # Sample mean and standard deviation over every full window at once
+    rolling_sharpe = np.full(n, np.nan)
+    if n > window:
+        windows = np.lib.stride_tricks.sliding_window_view(returns[1:], window)
+        mean = windows.mean(axis=1)
+        std = windows.std(axis=1, ddof=1)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            rolling_sharpe[window:] = np.where(std > 0, mean / std * np.sqrt(periods_per_year), np.nan)
+    
+    # A trade holds its size from the open of the entry bar to the open of the exit bar
+    trades = stats['_trades']
+    position = np.zeros(n + 1)
+    if len(trades):
+        size = trades['Size'].to_numpy(dtype=float)
+        np.add.at(position, trades['EntryBar'].to_numpy(dtype=int), size)
+        np.add.at(position, trades['ExitBar'].to_numpy(dtype=int), -size)
+    for size, entry_bar in _open_trades(stats):
+        position[entry_bar] += size
+    position = np.cumsum(position)[:n]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        exposure = np.where(equity > 0, position * close / equity * 100, 0.0)
+    
+    return pd.DataFrame({
+        'Equity': equity,
+        'Return': returns,
+        'DrawdownPct': drawdown,
+        'RollingSharpe': rolling_sharpe,
+        'Position': position,
+        'Exposure [%]': exposure,
+    }, index=data.index)
+
+
+def _open_trades(stats):
+    """
+    (size, entry bar) of the trades still open at the end of a backtest
+
+    They are not in ``stats['_trades']``: the fast engine lists them in
+    ``stats['_open_trades']``, a ``backtesting.Strategy`` keeps them in its
+    ``trades``.
+    """
+    open_trades = stats.get('_open_trades')
+    if isinstance(open_trades, pd.DataFrame):
+        return list(zip(open_trades['Size'], open_trades['EntryBar']))
+    strategy = stats.get('_strategy')
+    if hasattr(strategy, 'trades'):
+        return [(trade.size, trade.entry_bar) for trade in strategy.trades]
+    return []
+
+@timed('plot.backtest_visualization')
+def create_backtest_visualization(data, stats, bt=None, filename_suffix="", sharpe_window=63, ticker=None,
+                                  commission=None):
     """
     Create comprehensive visualizations of the backtesting results
+    
+    Parameters:
+    -----------
+    data : pandas.DataFrame
+        OHLC data with DatetimeIndex
+    stats : pandas.Series
+        Backtesting statistics; the equity curve and trades are read from
+        stats['_equity_curve'] and stats['_trades']
+    bt : backtesting.Backtest, optional
+        Deprecated and ignored; everything is read from ``stats``
+    filename_suffix : str, optional
+        Additional suffix for filenames
+    sharpe_window : int, optional
+        Bars in the rolling Sharpe ratio window (default: 63)
+    ticker : str, optional
+        Ticker the run is recorded under in the results store
+    commission : float, optional
+        Commission per trade as a fraction, shown in the summary
     """
+    import matplotlib.pyplot as plt
+    import matplotlib.dates as mdates
+    
+    if bt is not None:
+        warnings.warn("create_backtest_visualization() ignores bt, pass only data and stats",
+                      DeprecationWarning, stacklevel=3)
+    
     # Create plots directory if it doesn't exist
-    plots_dir = "plots"
+    plots_dir = RENDER_OPTIONS['plots_dir']
     if not os.path.exists(plots_dir):
         os.makedirs(plots_dir)
     
     # Generate timestamp for unique filenames
     timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
     
-    # Create figure with subplots
-    fig, ((ax1, ax2), (ax3, ax4)) = plt.subplots(2, 2, figsize=(16, 12))
+    analytics = backtest_analytics(data, stats, window=sharpe_window)
+    trades = stats['_trades']
+    initial_capital = analytics['Equity'].iloc[0]
+    
+    # Create figure with subplots; the summary spans the bottom row
+    fig = plt.figure(figsize=(16, 20))
+    grid = fig.add_gridspec(4, 2, height_ratios=[1, 1, 1, 0.7])
+    ax1, ax2 = fig.add_subplot(grid[0, 0]), fig.add_subplot(grid[0, 1])
+    ax3, ax4 = fig.add_subplot(grid[1, 0]), fig.add_subplot(grid[1, 1])
+    ax5, ax6 = fig.add_subplot(grid[2, 0]), fig.add_subplot(grid[2, 1])
+    ax7 = fig.add_subplot(grid[3, :])
     
     # 1. Price chart with buy/sell signals
     ax1.plot(data.index, data['Close'], 'b-', linewidth=1, label='SPY Close Price', alpha=0.7)
-    
-    # Get trades from backtest
-    if hasattr(bt, '_results') and hasattr(bt._results, '_trades'):
-        trades = bt._results._trades
-        if not trades.empty:
-            # Plot buy signals
-            buy_trades = trades[trades['Size'] > 0]
-            if not buy_trades.empty:
-                ax1.scatter(buy_trades['EntryTime'], buy_trades['EntryPrice'], 
-                           color='green', marker='^', s=100, label='Buy Signals', zorder=5)
-            
-            # Plot sell signals
-            sell_trades = trades[trades['Size'] < 0]
-            if not sell_trades.empty:
-                ax1.scatter(sell_trades['EntryTime'], sell_trades['EntryPrice'], 
-                           color='red', marker='v', s=100, label='Sell Signals', zorder=5)
+    if not trades.empty:
+        # Plot buy signals
+        buy_trades = trades[trades['Size'] > 0]
+        if not buy_trades.empty:
+            ax1.scatter(buy_trades['EntryTime'], buy_trades['EntryPrice'], 
+                       color='green', marker='^', s=100, label='Buy Signals', zorder=5)
+        
+        # Plot sell signals
+        sell_trades = trades[trades['Size'] < 0]
+        if not sell_trades.empty:
+            ax1.scatter(sell_trades['EntryTime'], sell_trades['EntryPrice'], 
+                       color='red', marker='v', s=100, label='Sell Signals', zorder=5)
     
     ax1.set_title('SPY Price with ARIMA Trading Signals', fontsize=14, fontweight='bold')
     ax1.set_ylabel('Price ($)')
     ax1.legend()
     ax1.grid(True, alpha=0.3)
-    ax1.xaxis.set_major_formatter(mdates.DateFormatter('%Y'))
-    
-    # 2. Portfolio equity curve
-    equity_curve = pd.Series(index=data.index, dtype=float)
-    equity_curve.iloc[0] = 10000  # Starting cash
     
-    # Simple equity curve calculation
-    returns = data['Close'].pct_change().fillna(0)
-    cumulative_returns = (1 + returns).cumprod()
-    equity_curve = 10000 * cumulative_returns / cumulative_returns.iloc[0]
-    
-    ax2.plot(equity_curve.index, equity_curve.values, 'g-', linewidth=2, label='Portfolio Value')
-    ax2.axhline(y=10000, color='gray', linestyle='--', alpha=0.7, label='Initial Capital')
+    # 2. Strategy equity curve against buy & hold of the same capital
+    buy_hold = initial_capital * data['Close'] / data['Close'].iloc[0]
+    ax2.plot(analytics.index, analytics['Equity'], 'g-', linewidth=2, label='Strategy Equity')
+    ax2.plot(buy_hold.index, buy_hold.values, color='gray', linewidth=1, alpha=0.7, label='Buy & Hold')
+    ax2.axhline(y=initial_capital, color='gray', linestyle='--', alpha=0.7, label='Initial Capital')
     ax2.set_title('Portfolio Equity Curve', fontsize=14, fontweight='bold')
     ax2.set_ylabel('Portfolio Value ($)')
     ax2.legend()
     ax2.grid(True, alpha=0.3)
-    ax2.xaxis.set_major_formatter(mdates.DateFormatter('%Y'))
-    
-    # 3. Returns distribution
-    returns_pct = data['Close'].pct_change().dropna() * 100
-    ax3.hist(returns_pct, bins=50, alpha=0.7, color='skyblue', edgecolor='black')
-    ax3.axvline(returns_pct.mean(), color='red', linestyle='--', linewidth=2, 
-                label=f'Mean: {returns_pct.mean():.3f}%')
-    ax3.set_title('Daily Returns Distribution', fontsize=14, fontweight='bold')
-    ax3.set_xlabel('Daily Return (%)')
-    ax3.set_ylabel('Frequency')
-    ax3.legend()
+    
+    # 3. Drawdown (underwater curve)
+    drawdown_pct = -analytics['DrawdownPct'] * 100
+    ax3.fill_between(analytics.index, drawdown_pct, 0, color='red', alpha=0.3)
+    ax3.plot(analytics.index, drawdown_pct, 'r-', linewidth=1)
+    ax3.set_title(f"Drawdown (max {stats.get('Max. Drawdown [%]', drawdown_pct.min()):.2f}%)",
+                  fontsize=14, fontweight='bold')
+    ax3.set_ylabel('Drawdown (%)')
     ax3.grid(True, alpha=0.3)
     
-    # 4. Performance metrics summary
-    ax4.axis('off')
+    # 4. Rolling Sharpe ratio
+    ax4.plot(analytics.index, analytics['RollingSharpe'], color='purple', linewidth=1.5)
+    ax4.axhline(y=0, color='gray', linestyle='--', alpha=0.7)
+    ax4.set_title(f'Rolling Sharpe Ratio ({sharpe_window} bars, annualized)', fontsize=14, fontweight='bold')
+    ax4.set_ylabel('Sharpe Ratio')
+    ax4.grid(True, alpha=0.3)
+    
+    # 5. Exposure: long above zero, short below
+    exposure = analytics['Exposure [%]']
+    ax5.fill_between(analytics.index, exposure, 0, where=exposure > 0, color='green', alpha=0.4,
+                     step='post', label='Long')
+    ax5.fill_between(analytics.index, exposure, 0, where=exposure < 0, color='red', alpha=0.4,
+                     step='post', label='Short')
+    ax5.set_title(f"Exposure (in market {stats.get('Exposure Time [%]', (exposure != 0).mean() * 100):.1f}% "
+                  f"of the time)", fontsize=14, fontweight='bold')
+    ax5.set_ylabel('Position Value (% of Equity)')
+    ax5.legend()
+    ax5.grid(True, alpha=0.3)
+    
+    for ax in (ax1, ax2, ax3, ax4, ax5):
+        ax.xaxis.set_major_formatter(mdates.DateFormatter('%Y'))
+    
+    # 6. Distribution of the strategy's returns on bars with a position
+    returns_pct = analytics['Return'][analytics['Position'].shift(fill_value=0) != 0] * 100
+    if len(returns_pct):
+        ax6.hist(returns_pct, bins=50, alpha=0.7, color='skyblue', edgecolor='black')
+        ax6.axvline(returns_pct.mean(), color='red', linestyle='--', linewidth=2, 
+                    label=f'Mean: {returns_pct.mean():.3f}%')
+        ax6.legend()
+    ax6.set_title('Strategy Returns Distribution (bars in market)', fontsize=14, fontweight='bold')
+    ax6.set_xlabel('Return per Bar (%)')
+    ax6.set_ylabel('Frequency')
+    ax6.grid(True, alpha=0.3)
+    
+    # 7. Performance metrics summary
+    ax7.axis('off')
     
     # Create performance summary text
     perf_text = f"""
@@ -83,50 +284,42 @@ def create_backtest_visualization(data, stats, bt):
     
     Key Metrics:
     • Total Return: {stats['Return [%]']:.2f}%
-    • Sharpe Ratio: {stats.get('Sharpe Ratio', 'N/A'):.3f}
-    • Max Drawdown: {stats.get('Max. Drawdown [%]', 'N/A'):.2f}%
+    • Sharpe Ratio: {stats.get('Sharpe Ratio', np.nan):.3f}
+    • Max Drawdown: {stats.get('Max. Drawdown [%]', np.nan):.2f}%
     • Number of Trades: {stats.get('# Trades', 'N/A')}
-    • Win Rate: {stats.get('Win Rate [%]', 'N/A'):.2f}%
+    • Win Rate: {stats.get('Win Rate [%]', np.nan):.2f}%
     
     Strategy Details:
     • Period: {data.index[0].strftime('%Y-%m-%d')} to {data.index[-1].strftime('%Y-%m-%d')}
     • Data Points: {len(data)}
-    • Initial Capital: $10,000
-    • Commission: 0.1%
-    
-    ARIMA Model:
-    • Uses confidence intervals for signals
-    • Long when price < lower bound
-    • Short when price > upper bound
-    • Close position when in range
+    • Initial Capital: ${initial_capital:,.0f}
+    • Commission: {'n/a' if commission is None else f'{commission * 100:g}%'}
     """
     
-    ax4.text(0.05, 0.95, perf_text, transform=ax4.transAxes, fontsize=11,
+    ax7.text(0.02, 0.95, perf_text, transform=ax7.transAxes, fontsize=11,
              verticalalignment='top', fontfamily='monospace',
              bbox=dict(boxstyle='round,pad=0.5', facecolor='lightgray', alpha=0.8))
     
-    # Adjust layout and show
+    # Adjust layout
     plt.tight_layout()
-    plt.suptitle('ARIMA Trading Strategy - Backtesting Results', fontsize=16, fontweight='bold', y=0.98)
-    plt.subplots_adjust(top=0.93)
+    plt.suptitle('ARIMA Trading Strategy - Backtesting Results', fontsize=16, fontweight='bold', y=0.99)
+    plt.subplots_adjust(top=0.95)
     
     # Save the plot
-    filename = f"{plots_dir}/arima_backtest_results_{timestamp}.png"
-    plt.savefig(filename, dpi=300, bbox_inches='tight')
-    print(f"Backtest results saved to: {filename}")
-    
-    plt.show()
+    filename = _save_figure(fig, f"arima_backtest_results_{timestamp}{filename_suffix}", "Backtest results")
     
     # Create a separate detailed price chart for recent period
-    create_recent_price_chart(data)
+    create_recent_price_chart(data, filename_suffix=filename_suffix)
     
     # Create a summary report
-    create_summary_report(data, stats)
+    create_summary_report(data, stats, filename_suffix=filename_suffix, ticker=ticker)
     
     print("Visualizations created successfully!")
+    return filename
 
 
-def create_recent_price_chart(data, months=6):
+@timed('plot.recent_price_chart')
+def create_recent_price_chart(data, months=6, filename_suffix=""):
     """
     Create a detailed price chart for the recent period with moving averages
     
@@ -136,9 +329,14 @@ def create_recent_price_chart(data, months=6):
         OHLC data with DatetimeIndex
     months : int, optional
         Number of months to show (default: 6)
+    filename_suffix : str, optional
+        Additional suffix for filename
     """
+    import matplotlib.pyplot as plt
+    import matplotlib.dates as mdates
+    
     # Create plots directory if it doesn't exist
-    plots_dir = "plots"
+    plots_dir = RENDER_OPTIONS['plots_dir']
     if not os.path.exists(plots_dir):
         os.makedirs(plots_dir)
     
@@ -170,14 +368,12 @@ def create_recent_price_chart(data, months=6):
     plt.tight_layout()
     
     # Save the plot
-    filename = f"{plots_dir}/spy_recent_price_{timestamp}.png"
-    plt.savefig(filename, dpi=300, bbox_inches='tight')
-    print(f"Recent price chart saved to: {filename}")
-    
-    plt.show()
+    filename = _save_figure(fig, f"spy_recent_price_{timestamp}{filename_suffix}", "Recent price chart")
+    return filename
 
 
-def create_dual_plot(data, forecast, lo, hi):
+@timed('plot.dual_plot')
+def create_dual_plot(data, forecast, lo, hi, filename_suffix="", bands=None):
     """
     Create a visualization with two subplots:
     - Upper plot: Complete price history
@@ -193,11 +389,19 @@ def create_dual_plot(data, forecast, lo, hi):
         Lower confidence interval boundary
     hi : array-like
         Upper confidence interval boundary
+    filename_suffix : str, optional
+        Additional suffix for filename
+    bands : dict, optional
+        Confidence level -> (lo, hi) bands (see forecast_bands.level_bands);
+        drawn as a fan chart instead of the single lo/hi band
     """
+    import matplotlib.pyplot as plt
+    import matplotlib.dates as mdates
+    
     print("\nCreating price data visualization...")
     
     # Create plots directory if it doesn't exist
-    plots_dir = "plots"
+    plots_dir = RENDER_OPTIONS['plots_dir']
     if not os.path.exists(plots_dir):
         os.makedirs(plots_dir)
     
@@ -226,8 +430,15 @@ def create_dual_plot(data, forecast, lo, hi):
     # Plot forecast
     ax2.plot(forecast_dates, forecast, 'r--', linewidth=2, label='ARIMA Forecast', marker='o')
     
-    # Confidence interval
-    ax2.fill_between(forecast_dates, lo, hi, alpha=0.3, color='red', label='95% Confidence Interval')
+    # Confidence interval, or a fan of nested bands with the narrowest drawn darkest
+    if bands:
+        levels = sorted(bands, reverse=True)
+        for i, level in enumerate(levels):
+            band_lo, band_hi = bands[level]
+            ax2.fill_between(forecast_dates, band_lo, band_hi, alpha=0.15 + 0.45 * i / max(len(levels), 2),
+                             color='red', linewidth=0, label=f'{level:.0%} Confidence Interval')
+    else:
+        ax2.fill_between(forecast_dates, lo, hi, alpha=0.3, color='red', label='95% Confidence Interval')
     
     # Explicitly limit x-axis to 30 days + forecast
     start_date = last_30_days.index[0]
@@ -248,14 +459,11 @@ def create_dual_plot(data, forecast, lo, hi):
     plt.tight_layout()
     
     # Save the plot
-    filename = f"{plots_dir}/arima_forecast_dual_{timestamp}.png"
-    plt.savefig(filename, dpi=300, bbox_inches='tight')
-    print(f"Dual forecast plot saved to: {filename}")
-    
-    # Show plot
-    plt.show()
+    filename = _save_figure(fig, f"arima_forecast_dual_{timestamp}{filename_suffix}", "Dual forecast plot")
+    return filename
     
-def create_single_forecast_plot(data, forecast, lo, hi, days_history=30):
+@timed('plot.single_forecast_plot')
+def create_single_forecast_plot(data, forecast, lo, hi, days_history=30, filename_suffix=""):
     """
     Create a simple visualization with historical data and forecast
     
@@ -271,16 +479,21 @@ def create_single_forecast_plot(data, forecast, lo, hi, days_history=30):
         Upper confidence interval boundary
     days_history : int, optional
         Number of historical days to display (default: 30)
+    filename_suffix : str, optional
+        Additional suffix for filename
     """
+    import matplotlib.pyplot as plt
+    import matplotlib.dates as mdates
+    
     # Create plots directory if it doesn't exist
-    plots_dir = "plots"
+    plots_dir = RENDER_OPTIONS['plots_dir']
     if not os.path.exists(plots_dir):
         os.makedirs(plots_dir)
     
     # Generate timestamp for unique filenames
     timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
     
-    plt.figure(figsize=(12, 6))
+    fig = plt.figure(figsize=(12, 6))
     
     # Historical data
     historical_data = data.tail(days_history)
@@ -312,74 +525,169 @@ def create_single_forecast_plot(data, forecast, lo, hi, days_history=30):
     plt.tight_layout()
     
     # Save the plot
-    filename = f"{plots_dir}/arima_forecast_single_{timestamp}.png"
-    plt.savefig(filename, dpi=300, bbox_inches='tight')
-    print(f"Single forecast plot saved to: {filename}")
-    
-    # Show plot
-    plt.show()
+    filename = _save_figure(fig, f"arima_forecast_single_{timestamp}{filename_suffix}", "Single forecast plot")
+    return filename
 
 
-def create_summary_report(data, stats, filename_suffix=""):
+@timed('plot.summary_report')
+def create_summary_report(data, stats, filename_suffix="", ticker=None, run=None):
     """
-    Create a comprehensive summary report with all key metrics and save to file
+    Record a backtest in the results store and save its Markdown report
+    
+    The statistics, trades and equity curve are written to the Parquet
+    results store (RENDER_OPTIONS['results_dir']), and the report is generated
+    from the store, so it can be compared with other runs using
+    ``results_store.build_report``.
     
     Parameters:
     -----------
     data : pandas.DataFrame
         OHLC data
-    stats : dict
+    stats : pandas.Series
         Backtesting statistics
     filename_suffix : str, optional
         Additional suffix for filename
+    ticker : str, optional
+        Ticker the run is recorded under (default: 'UNKNOWN')
+    run : str, optional
+        Run identifier (default: a new one, see results_store.new_run_id)
+    
+    Returns:
+    --------
+    str
+        Path of the report
     """
+    from results_store import ResultsStore, build_report, new_run_id
+    
+    run = run or new_run_id()
+    store = ResultsStore(RENDER_OPTIONS['results_dir'])
+    store.write_backtest(run, ticker or 'UNKNOWN', stats)
+    print(f"Results recorded in {store.root} (run {run})")
+    
+    filename = f"{RENDER_OPTIONS['plots_dir']}/arima_backtest_report_{run}{filename_suffix}.md"
+    build_report(store, runs=[run], path=filename)
+    return filename
+
+
+@timed('plot.sweep_heatmap')
+def create_sweep_heatmap(results, x_param, y_param, metric='Sharpe Ratio', filename_suffix=""):
+    """
+    Create a heatmap of a sweep metric over two parameters
+    
+    Parameters:
+    -----------
+    results : pandas.DataFrame
+        Sweep results with one row per parameter set (see sweep.run_sweep)
+    x_param : str
+        Parameter shown on the x-axis
+    y_param : str
+        Parameter shown on the y-axis
+    metric : str, optional
+        Statistic to display; if other parameters vary, the best value is
+        shown (default: 'Sharpe Ratio')
+    filename_suffix : str, optional
+        Additional suffix for filename
+    """
+    import matplotlib.pyplot as plt
+    
     # Create plots directory if it doesn't exist
-    plots_dir = "plots"
+    plots_dir = RENDER_OPTIONS['plots_dir']
     if not os.path.exists(plots_dir):
         os.makedirs(plots_dir)
     
     # Generate timestamp for unique filenames
     timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
     
-    # Create summary text
-    summary_text = f"""
-ARIMA Trading Strategy - Backtesting Report
-Generated: {datetime.now().strftime("%Y-%m-%d %H:%M:%S")}
-==================================================
+    table = results.pivot_table(index=y_param, columns=x_param, values=metric, aggfunc='max')
+    values = table.values.astype(float)
+    
+    fig, ax = plt.subplots(1, 1, figsize=(1.2 * len(table.columns) + 4, 0.8 * len(table.index) + 3))
+    image = ax.imshow(values, cmap='RdYlGn', aspect='auto')
+    fig.colorbar(image, ax=ax, label=metric)
+    
+    ax.set_xticks(range(len(table.columns)))
+    ax.set_xticklabels(table.columns)
+    ax.set_yticks(range(len(table.index)))
+    ax.set_yticklabels(table.index)
+    ax.set_xlabel(x_param)
+    ax.set_ylabel(y_param)
+    ax.set_title(f'Parameter Sweep - {metric}', fontsize=14, fontweight='bold')
+    
+    # Annotate each cell with its value
+    for i in range(values.shape[0]):
+        for j in range(values.shape[1]):
+            if not np.isnan(values[i, j]):
+                ax.text(j, i, f"{values[i, j]:.2f}", ha='center', va='center', fontsize=9)
+    
+    plt.tight_layout()
+    
+    # Save the plot
+    filename = _save_figure(fig, f"arima_sweep_heatmap_{timestamp}{filename_suffix}", "Sweep heatmap")
+    return filename
+
+
+def _init_render_worker(options):
+    configure_rendering(headless=True)
+    RENDER_OPTIONS.update(options, show=False)
 
-STRATEGY PERFORMANCE METRICS:
-• Total Return: {stats.get('Return [%]', 'N/A'):.2f}%
-• Sharpe Ratio: {stats.get('Sharpe Ratio', 'N/A'):.3f}
-• Max Drawdown: {stats.get('Max. Drawdown [%]', 'N/A'):.2f}%
-• Volatility (Ann.): {stats.get('Volatility (Ann.) [%]', 'N/A'):.2f}%
-• Number of Trades: {stats.get('# Trades', 'N/A')}
-• Win Rate: {stats.get('Win Rate [%]', 'N/A'):.2f}%
-• Best Trade: {stats.get('Best Trade [%]', 'N/A'):.2f}%
-• Worst Trade: {stats.get('Worst Trade [%]', 'N/A'):.2f}%
 
-DATA INFORMATION:
-• Period: {data.index[0].strftime('%Y-%m-%d')} to {data.index[-1].strftime('%Y-%m-%d')}
-• Total Data Points: {len(data)}
-• Initial Capital: $10,000
-• Commission: 0.1%
+def _render_job(job):
+    name, args, kwargs = job
+    return globals()[name](*args, **kwargs)
 
-STRATEGY DESCRIPTION:
-The ARIMA trading strategy uses autoregressive integrated moving average models
-to generate price forecasts with confidence intervals. Trading signals are generated
-based on current price position relative to forecast confidence bands:
-- BUY signal when price < lower confidence bound
-- SELL signal when price > upper confidence bound  
-- CLOSE position when price within confidence range
 
-RISK DISCLAIMER:
-This backtesting analysis is for educational purposes only and does not constitute
-investment advice. Past performance does not guarantee future results.
+def render_batch(jobs, max_workers=None, dpi=None, fmt=None, plots_dir=None):
     """
+    Render many charts headlessly in a pool of worker processes
     
-    # Save to text file
-    filename = f"{plots_dir}/arima_backtest_report_{timestamp}{filename_suffix}.txt"
-    with open(filename, 'w', encoding='utf-8') as f:
-        f.write(summary_text)
-    
-    print(f"Summary report saved to: {filename}")
-    return filename
+    Parameters:
+    -----------
+    jobs : list
+        (function_name, args, kwargs) tuples naming plot functions of this
+        module, e.g. ("create_backtest_visualization", (data, stats),
+        {"filename_suffix": "_QQQ"}). Backtest statistics should be passed
+        without the '_strategy' entry, which cannot be sent to other processes.
+        Use distinct filename suffixes, as jobs run in the same second.
+    max_workers : int, optional
+        Upper bound on worker processes (default: number of CPUs)
+    dpi : int, optional
+        Resolution of saved figures (default: current RENDER_OPTIONS)
+    fmt : str, optional
+        File format of saved figures (default: current RENDER_OPTIONS)
+    plots_dir : str, optional
+        Output directory (default: current RENDER_OPTIONS)
+    
+    Returns:
+    --------
+    list
+        Return value of each job (the saved filename) or the exception it raised
+    """
+    jobs = [(name, tuple(args), dict(kwargs)) for name, args, kwargs in jobs]
+    unknown = [name for name, _, _ in jobs if not name.startswith('create_') or name not in globals()]
+    if unknown:
+        raise ValueError(f"Unknown plot functions: {', '.join(sorted(set(unknown)))}")
+    
+    # Workers start from a snapshot of every option set in this process
+    options = dict(RENDER_OPTIONS)
+    if dpi is not None:
+        options['dpi'] = dpi
+    if fmt is not None:
+        options['format'] = fmt
+    if plots_dir is not None:
+        options['plots_dir'] = plots_dir
+    os.makedirs(options['plots_dir'], exist_ok=True)
+    
+    results = []
+    with ProcessPoolExecutor(max_workers=max_workers, initializer=_init_render_worker,
+                             initargs=(options,)) as executor:
+        futures = [executor.submit(collect, _render_job, job) for job in jobs]
+        for (name, _, _), future in zip(jobs, futures):
+            try:
+                result, metrics = future.result()
+                merge(metrics)
+                results.append(result)
+            except Exception as e:
+                merge(getattr(e, 'metrics', None))
+                print(f"Rendering {name} failed: {e}")
+                results.append(e)
+    return results
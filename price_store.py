@@ -0,0 +1,264 @@
+"""
+Memory-mapped OHLCV store shared by worker processes without copies
+"""
+
+import argparse
+import contextlib
+import hashlib
+import io
+import json
+import os
+import time
+
+import numpy as np
+import pandas as pd
+
+COLUMNS = ['Open', 'High', 'Low', 'Close', 'Volume']
+
+INDEX_FILE = 'index.json'
+VALUES_FILE = 'ohlcv-{version}.f64'
+DATES_FILE = 'dates-{version}.i8'
+
+
+class PriceStore:
+    """
+    Read-only OHLCV panel backed by memory-mapped files
+
+    A store is a directory with an ``index.json`` and the two data files it
+    names: ``ohlcv-<version>.f64`` holds the float64 rows (Open, High, Low,
+    Close, Volume) of all tickers back to back, ``dates-<version>.i8`` the
+    matching dates as int64 nanoseconds, and the index maps each ticker to its
+    (offset, length). Every ticker's rows are contiguous, so its prices are a
+    zero-copy slice of the mapping.
+
+    All processes that open the same store share the operating system's page
+    cache, so a pool of workers holds one copy of the panel in RAM however
+    many workers there are. A pickled store only carries its path, so it can
+    be passed to ``ProcessPoolExecutor`` tasks for free.
+
+    Parameters:
+    -----------
+    path : str
+        Store directory, created with ``PriceStore.write()`` or ``build_store()``
+    """
+
+    def __init__(self, path):
+        self.path = path
+        with open(os.path.join(path, INDEX_FILE), 'r', encoding='utf-8') as f:
+            meta = json.load(f)
+        self.columns = meta['columns']
+        self.index = {ticker: tuple(span) for ticker, span in meta['tickers'].items()}
+        n_rows = meta['n_rows']
+        # Only the data files named by the index that was loaded are opened,
+        # so a store rewritten meanwhile cannot be mixed with this index
+        if n_rows:
+            self._values = np.memmap(os.path.join(path, meta['values']), dtype=np.float64, mode='r',
+                                     shape=(n_rows, len(self.columns)))
+            self._dates = np.memmap(os.path.join(path, meta['dates']), dtype=np.int64, mode='r',
+                                    shape=(n_rows,))
+        else:
+            self._values = np.empty((0, len(self.columns)))
+            self._dates = np.empty(0, dtype=np.int64)
+
+    def __getstate__(self):
+        return {'path': self.path}
+
+    def __setstate__(self, state):
+        self.__init__(state['path'])
+
+    def __contains__(self, ticker):
+        return ticker in self.index
+
+    def __len__(self):
+        return len(self.index)
+
+    def __repr__(self):
+        return f"PriceStore({self.path!r}, {len(self)} tickers, {self.nbytes / 1e6:.1f} MB)"
+
+    @property
+    def tickers(self):
+        return list(self.index)
+
+    @property
+    def nbytes(self):
+        return self._values.nbytes + self._dates.nbytes
+
+    def fingerprint(self):
+        """SHA-256 of the index, dates and values, e.g. to key results computed from the store"""
+        digest = hashlib.sha256(json.dumps(sorted(self.index.items())).encode('utf-8'))
+        digest.update(np.ascontiguousarray(self._dates).tobytes())
+        digest.update(np.ascontiguousarray(self._values).tobytes())
+        return digest.hexdigest()
+
+    def _rows(self, ticker, start=None, end=None):
+        if ticker not in self.index:
+            raise KeyError(f"{ticker} is not in the price store at {self.path}")
+        offset, length = self.index[ticker]
+        dates = self._dates[offset:offset + length]
+        lo = 0 if start is None else np.searchsorted(dates, pd.Timestamp(start).value, side='left')
+        hi = length if end is None else np.searchsorted(dates, pd.Timestamp(end).value, side='right')
+        return offset + lo, offset + hi
+
+    def arrays(self, ticker, start=None, end=None):
+        """
+        Read-only views of one ticker's rows
+
+        Args:
+            ticker (str): Ticker symbol
+            start, end (str or datetime): Optional inclusive date bounds
+
+        Returns:
+            tuple: (dates, values) - datetime64[ns] dates and the (n_rows, 5)
+            float64 OHLCV array, both views into the mapping
+        """
+        lo, hi = self._rows(ticker, start, end)
+        return self._dates[lo:hi].view('datetime64[ns]'), self._values[lo:hi]
+
+    def frame(self, ticker, start=None, end=None):
+        """
+        One ticker's OHLCV data as a DataFrame whose columns view the mapping
+
+        The frame is read-only; copy it before modifying it.
+        """
+        dates, values = self.arrays(ticker, start, end)
+        return pd.DataFrame(np.asarray(values), index=pd.DatetimeIndex(dates, name='Date'),
+                            columns=self.columns, copy=False)
+
+    def close(self, ticker, start=None, end=None):
+        """One ticker's close prices as a Series"""
+        return self.frame(ticker, start, end)['Close']
+
+    @classmethod
+    def write(cls, path, frames):
+        """
+        Write OHLCV data for many tickers into a new store
+
+        Tickers are streamed to disk one at a time, so only one frame needs to
+        be in memory while a large panel is written.
+
+        Args:
+            path (str): Store directory; existing store files are replaced
+                once the new ones are complete
+            frames (dict or iterable): ticker -> DataFrame with Open, High,
+                Low, Close and Volume columns and a DatetimeIndex, or an
+                iterable of (ticker, DataFrame) pairs
+
+        Returns:
+            PriceStore: The new store, opened read-only
+        """
+        os.makedirs(path, exist_ok=True)
+        # The data files get new versioned names and are published by one
+        # atomic replace of the index that names them. An interrupted write
+        # leaves the previous store intact, and readers keep the files of the
+        # index they loaded.
+        version = f"{time.time_ns()}-{os.getpid()}"
+        files = {'values': VALUES_FILE.format(version=version),
+                 'dates': DATES_FILE.format(version=version)}
+        temp = [os.path.join(path, name) for name in files.values()]
+        temp.append(os.path.join(path, f"{INDEX_FILE}.tmp-{version}"))
+        items = frames.items() if isinstance(frames, dict) else frames
+        index = {}
+        n_rows = 0
+        try:
+            with open(temp[0], 'wb') as values_file, open(temp[1], 'wb') as dates_file:
+                for ticker, data in items:
+                    if ticker in index:
+                        raise ValueError(f"Duplicate ticker in price store: {ticker}")
+                    data = data[COLUMNS].sort_index()
+                    data = data[~data.index.duplicated(keep='last')]
+                    dates = pd.DatetimeIndex(data.index)
+                    if dates.tz is not None:
+                        dates = dates.tz_localize(None)
+                    values_file.write(np.ascontiguousarray(data.to_numpy(dtype=np.float64)).tobytes())
+                    dates_file.write(dates.as_unit('ns').asi8.astype(np.int64).tobytes())
+                    index[ticker] = (n_rows, len(data))
+                    n_rows += len(data)
+
+            meta = {'columns': COLUMNS, 'n_rows': n_rows, 'tickers': index, **files}
+            with open(temp[2], 'w', encoding='utf-8') as f:
+                json.dump(meta, f)
+        except BaseException:
+            for name in temp:
+                with contextlib.suppress(OSError):
+                    os.remove(name)
+            raise
+
+        previous = _data_files(path)
+        os.replace(temp[2], os.path.join(path, INDEX_FILE))
+        # Files of the replaced index stay for readers that loaded it but have
+        # not mapped its files yet; older versions are removed
+        keep = set(files.values()) | previous
+        for name in os.listdir(path):
+            if name.startswith(('ohlcv-', 'dates-')) and name not in keep:
+                with contextlib.suppress(OSError):
+                    os.remove(os.path.join(path, name))
+        return cls(path)
+
+
+def _data_files(path):
+    """Names of the data files the current index of a store refers to"""
+    try:
+        with open(os.path.join(path, INDEX_FILE), 'r', encoding='utf-8') as f:
+            meta = json.load(f)
+    except (FileNotFoundError, ValueError):
+        return set()
+    return {meta[key] for key in ('values', 'dates') if key in meta}
+
+
+def open_store(store):
+    """Return ``store`` if it is a PriceStore, otherwise open the store at that path"""
+    return store if isinstance(store, PriceStore) else PriceStore(store)
+
+
+def build_store(path, tickers, date_range=("2020-01-01", "2025-06-24"), allow_synthetic=False):
+    """
+    Download and clean OHLCV data for many tickers and write it into a store
+
+    Args:
+        path (str): Store directory
+        tickers (list): Ticker symbols
+        date_range (tuple): (start_date, end_date) as strings
+        allow_synthetic (bool): Store synthetic data for tickers whose
+            download fails (default: False)
+
+    Returns:
+        PriceStore: The new store
+    """
+    from arima_backtesting import clean_backtest_data
+    from utils import get_ticker_data
+
+    def cleaned():
+        for ticker in dict.fromkeys(t.upper() for t in tickers):
+            with contextlib.redirect_stdout(io.StringIO()):
+                data = get_ticker_data(ticker, for_backtesting=True, date_range=date_range,
+                                       allow_synthetic=allow_synthetic)
+            if data is None or data.empty:
+                print(f"No data for {ticker}, skipped")
+                continue
+            yield ticker, clean_backtest_data(data)
+
+    store = PriceStore.write(path, cleaned())
+    print(f"Price store written to: {path} ({len(store)} tickers, {store.nbytes / 1e6:.1f} MB)")
+    return store
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Build a memory-mapped OHLCV store for parallel backtests")
+    parser.add_argument('tickers', nargs='+', help="Ticker symbols, e.g. SPY QQQ IWM")
+    parser.add_argument('--path', default="price_store", help="Store directory (default: price_store)")
+    parser.add_argument('--start', default="2020-01-01", help="Start date (YYYY-MM-DD)")
+    parser.add_argument('--end', default="2025-06-24", help="End date (YYYY-MM-DD)")
+    parser.add_argument('--allow-synthetic', action='store_true',
+                        help="Use synthetic data for tickers whose download fails")
+    args = parser.parse_args(argv)
+
+    store = build_store(args.path, args.tickers, date_range=(args.start, args.end),
+                        allow_synthetic=args.allow_synthetic)
+    for ticker in store.tickers:
+        dates = store.frame(ticker).index
+        print(f"{ticker:<6} {len(dates):>6} bars  {dates[0]:%Y-%m-%d} to {dates[-1]:%Y-%m-%d}"
+              if len(dates) else f"{ticker:<6} no bars")
+
+
+if __name__ == "__main__":
+    main()
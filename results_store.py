@@ -0,0 +1,382 @@
+"""
+Columnar store of backtest and forecast results with a query API and reports
+"""
+
+import argparse
+import os
+import shutil
+import uuid
+from urllib.parse import unquote
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+DEFAULT_ROOT = 'results'
+
+# Table -> partition columns; every table is a Hive-partitioned Parquet
+# dataset under <root>/<table>/run=.../ticker=.../[year=...]
+TABLES = {
+    'stats': ['run', 'ticker'],
+    'trades': ['run', 'ticker', 'year'],
+    'equity': ['run', 'ticker', 'year'],
+    'forecasts': ['run', 'ticker', 'year'],
+}
+
+# Column whose year partitions each time-indexed table
+DATE_COLUMNS = {'trades': 'EntryTime', 'equity': 'Date', 'forecasts': 'Origin'}
+
+# Statistics shown in reports
+REPORT_METRICS = ['Return [%]', 'Buy & Hold Return [%]', 'Sharpe Ratio', 'Max. Drawdown [%]',
+                  '# Trades', 'Win Rate [%]', 'Exposure Time [%]']
+
+
+def new_run_id():
+    """Unique, sortable run identifier, e.g. 20250624_153012_a1b2c3"""
+    return f"{datetime.now():%Y%m%d_%H%M%S}_{uuid.uuid4().hex[:6]}"
+
+
+def _scalar(value):
+    # Durations are stored as float days and timestamps without time zone,
+    # so the schema is the same in every file
+    if isinstance(value, pd.Timedelta):
+        return value / pd.Timedelta(days=1)
+    if isinstance(value, pd.Timestamp):
+        return value.tz_localize(None) if value.tz is not None else value
+    if value is None or value is pd.NaT:
+        return np.nan
+    if isinstance(value, (tuple, list)):
+        return str(value)
+    return value
+
+
+def stats_row(stats, params=None):
+    """
+    One-row DataFrame of the scalar entries of a backtest statistics Series
+
+    Args:
+        stats (pandas.Series): Statistics from ``run_backtest``; entries starting
+            with '_' (equity curve, trades, strategy) are skipped
+        params (dict): Run settings stored alongside, as ``param.<name>`` columns
+
+    Returns:
+        pandas.DataFrame
+    """
+    row = {key: _scalar(value) for key, value in stats.items() if not key.startswith('_')}
+    if '_orders' in stats and 'ARIMA Orders' not in row:
+        from arima_backtesting import describe_orders
+        row['ARIMA Orders'] = describe_orders(stats['_orders'])
+    for name, value in (params or {}).items():
+        row[f"param.{name}"] = str(value)
+    return pd.DataFrame([row])
+
+
+class ResultsStore:
+    """
+    Append-only Parquet store of backtest statistics, trades, equity curves and forecasts
+
+    Each table is partitioned by run, ticker and (for time-indexed tables)
+    year, so queries for some runs, tickers or dates only open the matching
+    files. Every write adds new uniquely named files and never rewrites
+    existing ones, so worker processes can write their results concurrently.
+    ``write_backtest`` first drops what an earlier attempt stored for the same
+    run and ticker, so a resumed run holds each ticker once.
+
+    Parameters:
+    -----------
+    root : str
+        Store directory (default: results)
+    """
+
+    def __init__(self, root=DEFAULT_ROOT):
+        self.root = root
+
+    def __repr__(self):
+        return f"ResultsStore({self.root!r})"
+
+    def __getstate__(self):
+        return {'root': self.root}
+
+    def __setstate__(self, state):
+        self.__init__(state['root'])
+
+    def _path(self, table):
+        if table not in TABLES:
+            raise ValueError(f"Unknown results table: {table!r} (expected one of {', '.join(TABLES)})")
+        return os.path.join(self.root, table)
+
+    def write(self, table, frame, run, ticker):
+        """
+        Append rows to a table
+
+        Args:
+            table (str): 'stats', 'trades', 'equity' or 'forecasts'
+            frame (pandas.DataFrame): Rows to write; for time-indexed tables the
+                date column (see ``DATE_COLUMNS``) decides the year partition
+            run (str): Run identifier, see ``new_run_id``
+            ticker (str): Ticker symbol
+        """
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        if frame is None or frame.empty:
+            return
+        path = self._path(table)
+        frame = frame.reset_index(drop=True).assign(run=str(run), ticker=str(ticker))
+        if table in DATE_COLUMNS:
+            frame['year'] = pd.DatetimeIndex(frame[DATE_COLUMNS[table]]).year
+        pq.write_to_dataset(pa.Table.from_pandas(frame, preserve_index=False), path,
+                            partition_cols=TABLES[table],
+                            basename_template=f"{uuid.uuid4().hex}-{{i}}.parquet",
+                            existing_data_behavior='overwrite_or_ignore')
+
+    def drop(self, run, ticker):
+        """Remove the rows of one run and ticker from every table"""
+        for table in TABLES:
+            run_path = os.path.join(self._path(table), f"run={run}")
+            if not os.path.isdir(run_path):
+                continue
+            # Partition values are URI-encoded in the directory names
+            for name in os.listdir(run_path):
+                if unquote(name) == f"ticker={ticker}":
+                    shutil.rmtree(os.path.join(run_path, name), ignore_errors=True)
+
+    def write_backtest(self, run, ticker, stats, params=None):
+        """
+        Store the statistics, trades and equity curve of one backtest
+
+        Results stored earlier for the same run and ticker (e.g. by a run that
+        was interrupted before journaling the ticker) are replaced.
+
+        Args:
+            run (str): Run identifier
+            ticker (str): Ticker symbol
+            stats (pandas.Series): Statistics from ``run_backtest``
+            params (dict): Run settings stored with the statistics
+        """
+        self.drop(run, ticker)
+        self.write('stats', stats_row(stats, params), run, ticker)
+        trades = stats.get('_trades')
+        if isinstance(trades, pd.DataFrame) and not trades.empty:
+            trades = trades.copy()
+            for column in trades.columns:
+                if pd.api.types.is_timedelta64_dtype(trades[column]):
+                    trades[column] = trades[column] / pd.Timedelta(days=1)
+            self.write('trades', trades, run, ticker)
+        equity = stats.get('_equity_curve')
+        if isinstance(equity, pd.DataFrame) and not equity.empty:
+            equity = equity.rename_axis('Date').reset_index()
+            if 'DrawdownDuration' in equity and pd.api.types.is_timedelta64_dtype(equity['DrawdownDuration']):
+                equity['DrawdownDuration'] = equity['DrawdownDuration'] / pd.Timedelta(days=1)
+            self.write('equity', equity, run, ticker)
+
+    def write_forecasts(self, run, forecasts, ticker=None):
+        """
+        Store forecasts, e.g. from ``forecast_evaluation.rolling_origin_forecasts``
+
+        Args:
+            run (str): Run identifier
+            forecasts (pandas.DataFrame): Rows with an ``Origin`` date column; a
+                ``Ticker`` column splits them by ticker
+            ticker (str): Ticker of all rows when there is no ``Ticker`` column
+        """
+        if 'Ticker' in forecasts:
+            for name, rows in forecasts.groupby('Ticker', sort=False):
+                self.write('forecasts', rows.drop(columns='Ticker'), run, name)
+        else:
+            self.write('forecasts', forecasts, run, ticker)
+
+    def _dataset(self, table):
+        import pyarrow as pa
+        import pyarrow.dataset as ds
+
+        path = self._path(table)
+        if not os.path.isdir(path):
+            return None
+        dataset = ds.dataset(path, format='parquet', partitioning='hive')
+        # Files written by different runs may differ in their columns (or have
+        # all-null columns), so read them with the union of their schemas
+        schemas = [fragment.physical_schema for fragment in dataset.get_fragments()]
+        if not schemas:
+            return None
+        schema = pa.unify_schemas(schemas + [dataset.partitioning.schema], promote_options='permissive')
+        return ds.dataset(path, schema=schema, format='parquet', partitioning='hive')
+
+    def query(self, table, runs=None, tickers=None, start=None, end=None, columns=None):
+        """
+        Read rows of a table
+
+        Filters on runs, tickers and years are resolved from the partition
+        directories, so only the files that can match are read.
+
+        Args:
+            table (str): 'stats', 'trades', 'equity' or 'forecasts'
+            runs (str or list): Only these runs
+            tickers (str or list): Only these tickers
+            start, end (str or datetime): Inclusive date bounds on the table's
+                date column (time-indexed tables only)
+            columns (list): Columns to read (default: all)
+
+        Returns:
+            pandas.DataFrame: Matching rows, empty if there are none
+        """
+        import pyarrow.dataset as ds
+
+        dataset = self._dataset(table)
+        if dataset is None:
+            return pd.DataFrame(columns=columns or TABLES[table])
+
+        expression = None
+
+        def add(condition):
+            nonlocal expression
+            expression = condition if expression is None else expression & condition
+
+        if runs is not None:
+            add(ds.field('run').isin([runs] if isinstance(runs, str) else list(runs)))
+        if tickers is not None:
+            add(ds.field('ticker').isin([tickers] if isinstance(tickers, str) else list(tickers)))
+        if (start is not None or end is not None) and table not in DATE_COLUMNS:
+            raise ValueError(f"The {table} table has no date column")
+        date_column = DATE_COLUMNS.get(table)
+        if start is not None:
+            start = pd.Timestamp(start)
+            add(ds.field('year') >= start.year)
+            add(ds.field(date_column) >= start)
+        if end is not None:
+            end = pd.Timestamp(end)
+            add(ds.field('year') <= end.year)
+            add(ds.field(date_column) <= end)
+
+        frame = dataset.to_table(columns=columns, filter=expression).to_pandas()
+        for column in ('run', 'ticker'):
+            if column in frame and isinstance(frame[column].dtype, pd.CategoricalDtype):
+                frame[column] = frame[column].astype(str)
+        return frame
+
+    def runs(self):
+        """
+        Runs in the store with their number of tickers and mean statistics
+
+        Returns:
+            pandas.DataFrame: One row per run, newest first
+        """
+        stats = self.query('stats')
+        if stats.empty:
+            return pd.DataFrame(columns=['Tickers'])
+        return _run_summary(stats).sort_index(ascending=False)
+
+
+def _run_summary(stats):
+    metrics = [metric for metric in REPORT_METRICS if metric in stats]
+    grouped = stats.groupby('run')
+    summary = grouped[metrics].mean()
+    summary.insert(0, 'Tickers', grouped['ticker'].nunique())
+    if 'Start' in stats and 'End' in stats:
+        summary['Start'] = grouped['Start'].min()
+        summary['End'] = grouped['End'].max()
+    return summary
+
+
+def _markdown_table(frame, float_format='{:.2f}'):
+    def cell(value):
+        if isinstance(value, (float, np.floating)):
+            return '' if np.isnan(value) else float_format.format(value)
+        if isinstance(value, pd.Timestamp):
+            return f"{value:%Y-%m-%d}"
+        return str(value).replace('|', '\\|')
+
+    frame = frame.reset_index()
+    lines = ['| ' + ' | '.join(str(c) for c in frame.columns) + ' |',
+             '|' + '|'.join(' --- ' for _ in frame.columns) + '|']
+    lines += ['| ' + ' | '.join(cell(v) for v in row) + ' |' for row in frame.itertuples(index=False)]
+    return '\n'.join(lines)
+
+
+def build_report(store, runs=None, tickers=None, fmt='markdown', path=None):
+    """
+    Aggregated report over runs, computed from the store in one pass per table
+
+    The report has a per-run summary (mean statistics over tickers), the
+    statistics of every run and ticker and, when forecasts were stored,
+    forecast accuracy and band coverage per run and horizon.
+
+    Args:
+        store (ResultsStore or str): Results store or its directory
+        runs (list): Only these runs (default: all)
+        tickers (list): Only these tickers (default: all)
+        fmt (str): 'markdown' or 'html'
+        path (str): Write the report to this file
+
+    Returns:
+        str: The report
+    """
+    if fmt not in ('markdown', 'html'):
+        raise ValueError(f"Unknown report format: {fmt!r}")
+    store = store if isinstance(store, ResultsStore) else ResultsStore(store)
+    stats = store.query('stats', runs=runs, tickers=tickers)
+    sections = []
+    if not stats.empty:
+        metrics = [metric for metric in REPORT_METRICS if metric in stats]
+        extra = [column for column in ('ARIMA Orders',) if column in stats]
+        sections.append(('Runs', _run_summary(stats).sort_index(ascending=False)))
+        detail = stats.set_index(['run', 'ticker'])[metrics + extra].sort_index()
+        sections.append(('Results by run and ticker', detail))
+
+    forecasts = store.query('forecasts', runs=runs, tickers=tickers)
+    if not forecasts.empty:
+        from forecast_evaluation import forecast_metrics
+        sections.append(('Forecast accuracy by run and horizon', forecast_metrics(forecasts, by=('run', 'Horizon'))))
+
+    title = 'ARIMA Trading Strategy - Results Report'
+    generated = f"Generated: {datetime.now():%Y-%m-%d %H:%M:%S} from {store.root}"
+    if fmt == 'markdown':
+        parts = [f"# {title}", generated]
+        if not sections:
+            parts.append('No results stored.')
+        for heading, frame in sections:
+            parts += [f"## {heading}", _markdown_table(frame)]
+        report = '\n\n'.join(parts) + '\n'
+    else:
+        parts = [f"<h1>{title}</h1>", f"<p>{generated}</p>"]
+        if not sections:
+            parts.append('<p>No results stored.</p>')
+        for heading, frame in sections:
+            parts += [f"<h2>{heading}</h2>", frame.to_html(float_format='{:.2f}'.format, na_rep='')]
+        report = ('<!DOCTYPE html>\n<html><head><meta charset="utf-8"><title>' + title + '</title></head><body>\n'
+                  + '\n'.join(parts) + '\n</body></html>\n')
+
+    if path:
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(report)
+        print(f"Report saved to: {path}")
+    return report
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Query stored results and build reports")
+    parser.add_argument('--root', default=DEFAULT_ROOT, help=f"Results store directory (default: {DEFAULT_ROOT})")
+    parser.add_argument('--runs', nargs='+', default=None, help="Only these runs (default: all)")
+    parser.add_argument('--tickers', nargs='+', default=None, help="Only these tickers (default: all)")
+    parser.add_argument('--list', action='store_true', help="List the stored runs")
+    parser.add_argument('--format', default='markdown', choices=['markdown', 'html'],
+                        help="Report format (default: markdown)")
+    parser.add_argument('--output', default=None, help="Write the report to this file instead of printing it")
+    args = parser.parse_args(argv)
+
+    store = ResultsStore(args.root)
+    if args.list:
+        with pd.option_context('display.width', 160, 'display.float_format', '{:.2f}'.format):
+            print(store.runs())
+        return
+    report = build_report(store, runs=args.runs, tickers=[t.upper() for t in args.tickers] if args.tickers else None,
+                          fmt=args.format, path=args.output)
+    if not args.output:
+        print(report)
+
+
+if __name__ == "__main__":
+    main()
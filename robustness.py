@@ -0,0 +1,244 @@
+"""
+Monte Carlo robustness check of the ARIMA strategy over synthetic and bootstrapped price paths
+"""
+
+import argparse
+import contextlib
+import io
+import itertools
+import os
+import warnings
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+import numpy as np
+import pandas as pd
+
+from arima_backtesting import run_backtest
+from instrumentation import collect, merge
+from utils import generate_synthetic_paths, get_spy_data, synthesize_ohlcv
+
+ROBUSTNESS_METRICS = ['Return [%]', 'Sharpe Ratio', 'Max. Drawdown [%]', '# Trades']
+
+PERCENTILES = [5, 25, 50, 75, 95]
+
+# Read-only views onto the shared OHLCV paths, set once per worker process
+_paths = None
+_index = None
+_shm = None
+
+
+def block_bootstrap_paths(close, n_paths, block_size=20, seed=42, rng=None):
+    """
+    Resample a price series with the moving block bootstrap
+
+    Log returns are resampled in contiguous blocks of ``block_size`` days, which
+    keeps short-range autocorrelation and volatility clustering intact.
+
+    Returns:
+        numpy.ndarray: Prices of shape (n_paths, len(close)) starting at close[0]
+    """
+    if block_size < 1:
+        raise ValueError(f"block_size must be at least 1, got {block_size}")
+    if len(close) <= block_size:
+        raise ValueError(f"Cannot bootstrap {len(close)} prices with blocks of {block_size} returns: "
+                         f"need more than {block_size} prices")
+    if rng is None:
+        rng = np.random.default_rng(seed)
+    log_returns = np.diff(np.log(np.asarray(close, dtype=float)))
+    n_returns = len(log_returns)
+    n_blocks = -(-n_returns // block_size)
+    starts = rng.integers(0, n_returns - block_size + 1, size=(n_paths, n_blocks))
+    positions = (starts[:, :, None] + np.arange(block_size)).reshape(n_paths, -1)[:, :n_returns]
+
+    prices = np.empty((n_paths, n_returns + 1))
+    prices[:, 0] = close[0]
+    prices[:, 1:] = close[0] * np.exp(np.cumsum(log_returns[positions], axis=1))
+    return prices
+
+
+def ohlcv_from_close(close, seed=42, rng=None):
+    """
+    Build OHLCV arrays around close price paths with ``utils.synthesize_ohlcv``
+
+    Args:
+        close (numpy.ndarray): Close prices of shape (n_paths, n_bars)
+
+    Returns:
+        numpy.ndarray: Array of shape (n_paths, n_bars, 5) with Open, High, Low, Close, Volume
+    """
+    # synthesize_ohlcv runs along the first axis, one column per path
+    ohlcv = synthesize_ohlcv(np.asarray(close, dtype=float).T, seed=seed, rng=rng)
+    return np.ascontiguousarray(ohlcv.transpose(1, 0, 2))
+
+
+def _init_worker(shm_name, shape, index):
+    global _paths, _index, _shm
+    _shm = shared_memory.SharedMemory(name=shm_name)
+    _paths = np.ndarray(shape, dtype=np.float64, buffer=_shm.buf)
+    _paths.flags.writeable = False
+    _index = index
+
+
+def _run_path(task):
+    path_id, cash, commission, engine, strategy_params = task
+    data = pd.DataFrame(_paths[path_id], index=_index,
+                        columns=['Open', 'High', 'Low', 'Close', 'Volume'])
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            stats, _ = run_backtest(data, cash=cash, commission=commission, engine=engine,
+                                    **strategy_params)
+    except Exception as e:
+        return {'Path': path_id, 'Error': str(e)}
+    row = {'Path': path_id, 'Error': None}
+    row.update({metric: stats[metric] for metric in ROBUSTNESS_METRICS})
+    return row
+
+
+def run_paths(ohlcv, index, max_workers=None, cash=10000, commission=.001, engine='backtesting',
+              strategy_params=None):
+    """
+    Backtest the strategy on every OHLCV path in a process pool
+
+    The paths are copied once into a shared memory block; workers attach to it
+    and build each DataFrame from a read-only view, so only the path number is
+    sent per task.
+
+    Every path is a new series that is never backtested again, so the model
+    cache is off unless ``strategy_params`` sets ``use_model_cache``; caching
+    the fits would only fill the shared cache with write-once entries and
+    evict the useful ones.
+
+    Args:
+        ohlcv (numpy.ndarray): Array of shape (n_paths, n_bars, 5)
+        index (pandas.DatetimeIndex): Dates of the bars
+        max_workers (int): Upper bound on worker processes (default: number of CPUs)
+        cash (float): Initial capital per backtest
+        commission (float): Commission per trade as a fraction
+        engine (str): Backtest engine, see ``arima_backtesting.run_backtest``
+        strategy_params (dict): Overrides for ARIMAStrategy class parameters
+            (``use_model_cache`` defaults to False here)
+
+    Returns:
+        pandas.DataFrame: One row of metrics per path
+    """
+    ohlcv = np.ascontiguousarray(ohlcv, dtype=np.float64)
+    n_paths = ohlcv.shape[0]
+    if max_workers is None:
+        max_workers = os.cpu_count() or 1
+    max_workers = max(1, min(max_workers, n_paths))
+
+    shm = shared_memory.SharedMemory(create=True, size=ohlcv.nbytes)
+    try:
+        np.ndarray(ohlcv.shape, dtype=np.float64, buffer=shm.buf)[:] = ohlcv
+        strategy_params = dict({'use_model_cache': False}, **(strategy_params or {}))
+        tasks = [(i, cash, commission, engine, strategy_params) for i in range(n_paths)]
+        chunksize = max(1, n_paths // (max_workers * 4))
+        with ProcessPoolExecutor(max_workers=max_workers, initializer=_init_worker,
+                                 initargs=(shm.name, ohlcv.shape, index)) as executor:
+            rows = []
+            for row, metrics in executor.map(collect, itertools.repeat(_run_path), tasks, chunksize=chunksize):
+                merge(metrics)
+                rows.append(row)
+    finally:
+        shm.close()
+        shm.unlink()
+
+    return pd.DataFrame(rows).set_index('Path')
+
+
+def summarize(results, percentiles=PERCENTILES):
+    """Percentiles of each metric, per source if a 'Source' column is present"""
+    groups = results.groupby('Source') if 'Source' in results.columns else [('all', results)]
+    summaries = {}
+    for source, group in groups:
+        # Columns are missing when every run failed; those metrics count no runs
+        values = group.reindex(columns=ROBUSTNESS_METRICS).astype(float)
+        with warnings.catch_warnings():
+            # Metrics like the Sharpe ratio are NaN for runs without trades
+            warnings.simplefilter('ignore', RuntimeWarning)
+            table = pd.DataFrame({f"P{p}": np.nanpercentile(values, p, axis=0) for p in percentiles},
+                                 index=ROBUSTNESS_METRICS)
+        table['Mean'] = values.mean().values
+        table['Runs'] = values.notna().sum().values
+        summaries[source] = table
+    return pd.concat(summaries, names=['Source', 'Metric'])
+
+
+def run_robustness(data, n_synthetic=100, n_bootstrap=100, block_size=20, volatility_model=None,
+                   max_workers=None, seed=42, cash=10000, commission=.001, engine='backtesting',
+                   strategy_params=None):
+    """
+    Run the strategy over synthetic paths and block-bootstrapped resamples of ``data``
+
+    Args:
+        data (pandas.DataFrame): Cleaned OHLCV data; its close prices are
+            bootstrapped and its dates and starting price are reused for the
+            synthetic paths
+        n_synthetic (int): Number of synthetic paths
+        n_bootstrap (int): Number of bootstrapped paths
+        block_size (int): Block length for the bootstrap
+        volatility_model (str): Volatility model for the synthetic paths, see
+            ``utils.generate_synthetic_paths``
+        max_workers (int): Upper bound on worker processes
+        seed (int): Seed for path generation
+        engine (str): Backtest engine, see ``arima_backtesting.run_backtest``
+
+    Returns:
+        tuple: (results, summary) - per-path metrics and their percentiles per source
+    """
+    rng = np.random.default_rng(seed)
+    close = data['Close'].to_numpy(dtype=float)
+    paths = []
+    sources = []
+    if n_synthetic:
+        paths.append(generate_synthetic_paths(len(close), n_synthetic, base_price=close[0],
+                                              volatility_model=volatility_model, rng=rng))
+        sources += ['synthetic'] * n_synthetic
+    if n_bootstrap:
+        paths.append(block_bootstrap_paths(close, n_bootstrap, block_size=block_size, rng=rng))
+        sources += ['bootstrap'] * n_bootstrap
+    if not paths:
+        raise ValueError("n_synthetic and n_bootstrap are both zero")
+
+    ohlcv = ohlcv_from_close(np.concatenate(paths), rng=rng)
+    print(f"Running {len(sources)} Monte Carlo backtests...")
+    results = run_paths(ohlcv, data.index, max_workers=max_workers, cash=cash,
+                        commission=commission, engine=engine, strategy_params=strategy_params)
+    results['Source'] = sources
+    return results, summarize(results)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Monte Carlo robustness check of the ARIMA strategy")
+    parser.add_argument('--synthetic', type=int, default=100, help="Number of synthetic paths")
+    parser.add_argument('--bootstrap', type=int, default=100, help="Number of bootstrapped paths")
+    parser.add_argument('--block-size', type=int, default=20, help="Bootstrap block length in days")
+    parser.add_argument('--volatility-model', default=None, choices=['constant', 'regime', 'garch'],
+                        help="Volatility model for the synthetic paths")
+    parser.add_argument('--workers', type=int, default=None, help="Maximum number of worker processes")
+    parser.add_argument('--engine', default="backtesting", choices=['backtesting', 'fast'],
+                        help="Backtest engine (default: backtesting)")
+    parser.add_argument('--start', default="2020-01-01", help="Start date (YYYY-MM-DD)")
+    parser.add_argument('--end', default="2025-06-24", help="End date (YYYY-MM-DD)")
+    args = parser.parse_args(argv)
+
+    from arima_backtesting import clean_backtest_data
+    data = get_spy_data(for_backtesting=True, date_range=(args.start, args.end))
+    if data is None or data.empty:
+        print("Failed to obtain data. Exiting.")
+        exit(1)
+    data = clean_backtest_data(data)
+
+    results, summary = run_robustness(data, n_synthetic=args.synthetic, n_bootstrap=args.bootstrap,
+                                      block_size=args.block_size, volatility_model=args.volatility_model,
+                                      max_workers=args.workers, engine=args.engine)
+    print("\n=== Robustness Summary ===")
+    print(summary.to_string(float_format=lambda v: f"{v:.3f}"))
+    failed = results['Error'].notna().sum()
+    if failed:
+        print(f"\n{failed} of {len(results)} runs failed")
+
+
+if __name__ == "__main__":
+    main()
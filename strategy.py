@@ -0,0 +1,200 @@
+"""
+ARIMA trading strategy for the backtesting framework
+"""
+
+from types import SimpleNamespace
+
+import numpy as np
+from backtesting import Strategy
+
+from instrumentation import increment, span
+from forecast_bands import aggregate_bands, walk_forward_bands
+from model_cache import cached_auto_arima
+from walk_forward import WalkForwardARIMA
+
+def aggregate_band(conf_int, how='envelope'):
+    """
+    Collapse a multi-period confidence interval into a single (lo, hi) band
+    
+    Args:
+        conf_int (numpy.ndarray): Array of shape (n_periods, 2)
+        how (str): 'envelope' (widest bounds over the horizon), 'mean',
+            'first' (one step ahead) or 'last' (end of the horizon)
+    """
+    lo, hi = aggregate_bands(conf_int[None, :, 0], conf_int[None, :, 1], how)
+    return lo[0], hi[0]
+
+def _count_forecasts(lo, train_window):
+    """Count precomputed bands the way the per-bar path counts its forecasts"""
+    tradable = np.asarray(lo)[train_window:]
+    made = int(np.count_nonzero(~np.isnan(tradable)))
+    increment('strategy.forecast_calls', made)
+    increment('strategy.forecast_errors', len(tradable) - made)
+
+def _check_band_level(band_level):
+    # alpha = 1 - band_level must be a probability, otherwise every band is NaN or inverted
+    if not 0 < band_level < 1:
+        raise ValueError(f"band_level must be between 0 and 1 (exclusive), got {band_level}")
+
+# ARIMA Trading Strategy Class
+class ARIMAStrategy(Strategy):
+    # Walk-forward mode: select the order on the last `train_window` bars, then
+    # advance the model one bar at a time and re-select every `reselect_every` bars.
+    # With walk_forward = False a single model is fitted on the full dataset
+    # (this uses future data and is only kept for comparison).
+    walk_forward = True
+    train_window = 252
+    reselect_every = 63
+    # Reuse auto_arima selections from the on-disk model cache
+    use_model_cache = True
+    # Forecast horizon, confidence level of the bands and how the per-period
+    # bands are collapsed into one band
+    n_periods = 5
+    band_level = 0.95
+    band_agg = 'envelope'
+    # Order search settings; backend is 'pmdarima' (auto_arima) or 'fast', see arima_backends
+    backend = 'pmdarima'
+    max_p = 3
+    max_q = 3
+    information_criterion = 'aic'
+    # Compute all walk-forward bands up front in init(); next() then only
+    # looks up the precomputed `lo`/`hi` indicator values
+    precompute_bands = True
+
+    def _arima_kwargs(self):
+        return dict(seasonal=False, stepwise=True, max_p=self.max_p, max_q=self.max_q,
+                    information_criterion=self.information_criterion, suppress_warnings=True,
+                    backend=self.backend)
+
+    def init(self):
+        # (bar, order) of every ARIMA order selection, for run journals and reports
+        self.arima_orders = []
+        _check_band_level(self.band_level)
+        if self.walk_forward and self.precompute_bands:
+            print(f"Precomputing walk-forward ARIMA bands (training window: {self.train_window} bars, "
+                  f"re-selection every {self.reselect_every} bars)...")
+            with span('strategy.precompute_bands', n_bars=len(self.data)):
+                lo, hi = walk_forward_bands(self.data.Close, train_window=self.train_window,
+                                            reselect_every=self.reselect_every, n_periods=self.n_periods,
+                                            alpha=1 - self.band_level, band_agg=self.band_agg,
+                                            cache=self.use_model_cache, orders=self.arima_orders,
+                                            **self._arima_kwargs())
+            _count_forecasts(lo, self.train_window)
+            self.model = None
+            self.lo = self.I(lambda: lo, name='ARIMA lower band', overlay=True)
+            self.hi = self.I(lambda: hi, name='ARIMA upper band', overlay=True)
+            return
+
+        if self.walk_forward:
+            print(f"Walk-forward ARIMA (training window: {self.train_window} bars, "
+                  f"re-selection every {self.reselect_every} bars)...")
+            self.model = WalkForwardARIMA(train_window=self.train_window,
+                                          reselect_every=self.reselect_every,
+                                          cache=self.use_model_cache,
+                                          **self._arima_kwargs())
+            return
+
+        # Fit ARIMA model on the full dataset
+        print("Fitting ARIMA model for backtesting...")
+        try:
+            self.model = cached_auto_arima(self.data.Close, cache=self.use_model_cache,
+                                           **self._arima_kwargs())
+            print(f"Best ARIMA model: {self.model.order}")
+            self.arima_orders.append((0, self.model.order))
+        except Exception as e:
+            print(f"Error fitting ARIMA model: {e}")
+            self.model = None
+    
+    def next(self):
+        if self.walk_forward and self.precompute_bands:
+            lo, hi = self.lo[-1], self.hi[-1]
+            if not np.isnan(lo):
+                self._trade(self.data.Close[-1], lo, hi)
+            return
+
+        if self.model is None:
+            return
+            
+        try:
+            # Generate forecast
+            if self.walk_forward:
+                # The band is forecast from the previous bar, so the current
+                # close is compared against a forecast that has not seen it
+                if len(self.data) <= self.train_window:
+                    return
+                if not self.model.is_fitted:
+                    self.model.fit(self.data.Close[-self.train_window - 1:-1])
+                forecast, conf_int = self.model.forecast(n_periods=self.n_periods, alpha=1 - self.band_level)
+                if not self.arima_orders or self.arima_orders[-1][1] != self.model.order:
+                    self.arima_orders.append((len(self.data) - 1, self.model.order))
+                self.model.update(self.data.Close[-1])
+            else:
+                forecast, conf_int = self.model.predict(n_periods=self.n_periods, return_conf_int=True,
+                                                        alpha=1 - self.band_level)
+            increment('strategy.forecast_calls')
+            lo, hi = aggregate_band(conf_int, self.band_agg)
+            self._trade(self.data.Close[-1], lo, hi)
+                    
+        except Exception:
+            # If forecast fails, do nothing for this bar but keep count
+            increment('strategy.forecast_errors')
+
+    def _trade(self, current_price, lo, hi):
+        # Trading signals based on ARIMA confidence intervals
+        if current_price < lo:  # Price below lower bound - go long
+            if not self.position:
+                self.buy()
+        elif current_price > hi:  # Price above upper bound - go short
+            if not self.position:
+                self.sell()
+        else:  # Price within range - close position
+            if self.position:
+                self.position.close()
+
+def strategy_bands(close, orders=None, **params):
+    """
+    The (lo, hi) bands ``ARIMAStrategy`` trades on, computed without a Backtest
+    
+    Args:
+        close (array-like): Close prices
+        orders (list): If given, (bar, order) is appended for every order selection
+        **params: Overrides for ARIMAStrategy class parameters
+    
+    Returns:
+        tuple: (lo, hi) arrays of the same length as ``close``, NaN on bars
+        where the strategy does not trade
+    """
+    unknown = [name for name in params if not hasattr(ARIMAStrategy, name)]
+    if unknown:
+        raise ValueError(f"Unknown strategy parameters: {', '.join(unknown)}")
+    settings = SimpleNamespace(**{name: params.get(name, getattr(ARIMAStrategy, name))
+                                  for name in ('walk_forward', 'train_window', 'reselect_every',
+                                               'use_model_cache', 'n_periods', 'band_level', 'band_agg', 'backend',
+                                               'max_p', 'max_q', 'information_criterion')})
+    _check_band_level(settings.band_level)
+    arima_kwargs = ARIMAStrategy._arima_kwargs(settings)
+    close = np.asarray(close, dtype=float)
+    
+    if settings.walk_forward:
+        # Per-bar and precomputed walk-forward runs trade on the same bands
+        lo, hi = walk_forward_bands(close, train_window=settings.train_window,
+                                    reselect_every=settings.reselect_every, n_periods=settings.n_periods,
+                                    alpha=1 - settings.band_level, band_agg=settings.band_agg,
+                                    cache=settings.use_model_cache, orders=orders, **arima_kwargs)
+        _count_forecasts(lo, settings.train_window)
+        return lo, hi
+    
+    # A single model fitted on the full dataset forecasts the same band on every bar
+    lo = np.full(len(close), np.nan)
+    hi = np.full(len(close), np.nan)
+    try:
+        model = cached_auto_arima(close, cache=settings.use_model_cache, **arima_kwargs)
+        _, conf_int = model.predict(n_periods=settings.n_periods, return_conf_int=True,
+                                    alpha=1 - settings.band_level)
+    except Exception as e:
+        print(f"Error fitting ARIMA model: {e}")
+        return lo, hi
+    if orders is not None:
+        orders.append((0, model.order))
+    lo[:], hi[:] = aggregate_band(conf_int, settings.band_agg)
+    return lo, hi
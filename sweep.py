@@ -0,0 +1,207 @@
+"""
+Parallel parameter sweep for the ARIMA trading strategy
+"""
+
+import argparse
+import ast
+import contextlib
+import hashlib
+import io
+import itertools
+import os
+import random
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import pandas as pd
+
+from arima_backtesting import clean_backtest_data, describe_orders, run_backtest
+from instrumentation import collect, merge
+from journal import open_journal, timed_call, unit_key
+from utils import get_spy_data
+
+# Parameters passed to Backtest rather than to the strategy
+BACKTEST_PARAMS = ('cash', 'commission', 'engine')
+
+RESULT_METRICS = ['Return [%]', 'Sharpe Ratio', 'Max. Drawdown [%]', '# Trades', 'Win Rate [%]']
+
+# Data shared by all grid points, set once per worker process
+_sweep_data = None
+
+
+def _init_worker(data):
+    global _sweep_data
+    _sweep_data = data
+
+
+def _evaluate(params):
+    backtest_params = {k: v for k, v in params.items() if k in BACKTEST_PARAMS}
+    strategy_params = {k: v for k, v in params.items() if k not in BACKTEST_PARAMS}
+    with contextlib.redirect_stdout(io.StringIO()):
+        stats, _ = run_backtest(_sweep_data, **backtest_params, **strategy_params)
+    result = {metric: stats[metric] for metric in RESULT_METRICS}
+    result['ARIMA Orders'] = describe_orders(stats['_orders'])
+    return result
+
+
+def build_grid(param_grid, n_iter=None, seed=42):
+    """
+    Expand a parameter grid into a list of parameter dicts
+
+    Args:
+        param_grid (dict): Parameter name -> list of values
+        n_iter (int): If given, sample this many distinct grid points at random
+        seed (int): Seed for the random search
+
+    Returns:
+        list: Parameter dicts
+    """
+    from strategy import ARIMAStrategy
+
+    unknown = [name for name in param_grid
+               if name not in BACKTEST_PARAMS and not hasattr(ARIMAStrategy, name)]
+    if unknown:
+        raise ValueError(f"Unknown sweep parameters: {', '.join(unknown)}")
+
+    names = list(param_grid)
+    points = [dict(zip(names, values)) for values in itertools.product(*(param_grid[n] for n in names))]
+    if n_iter is not None and n_iter < len(points):
+        points = random.Random(seed).sample(points, n_iter)
+    return points
+
+
+def run_sweep(data, param_grid, n_iter=None, metric='Sharpe Ratio', max_workers=None, seed=42,
+              journal=None):
+    """
+    Backtest every grid point in a process pool and rank the results
+
+    The OHLC data is sent to each worker once; all grid points share the
+    on-disk model cache, so grid points that only differ in signal settings
+    (``n_periods``, ``band_level``, ``band_agg``, ``cash``, ``commission``)
+    reuse the same fits.
+
+    Args:
+        data (pandas.DataFrame): Cleaned OHLCV data
+        param_grid (dict): Parameter name -> list of values; names are
+            ARIMAStrategy parameters or ``cash``/``commission``/``engine``
+        n_iter (int): Random search over this many grid points instead of the full grid
+        metric (str): Statistic used for ranking (higher is better)
+        max_workers (int): Upper bound on worker processes (default: number of CPUs)
+        seed (int): Seed for the random search
+        journal (RunJournal or str): Record every finished grid point in this
+            run journal (see ``journal.py``) and skip grid points a previous
+            sweep over the same data already completed
+
+    Returns:
+        pandas.DataFrame: One row per grid point, sorted by ``metric``
+    """
+    points = build_grid(param_grid, n_iter=n_iter, seed=seed)
+    rows = []
+    pending = points
+    if journal:
+        journal = open_journal(journal)
+        fingerprint = hashlib.sha256(pd.util.hash_pandas_object(data).to_numpy().tobytes()).hexdigest()
+        job = journal.start_job('sweep', dict(data=fingerprint, start=str(data.index[0]), end=str(data.index[-1])))
+        completed = journal.completed(job)
+        pending = []
+        for params in points:
+            key = unit_key(params)
+            if key in completed:
+                rows.append({**params, **completed[key], 'Error': None})
+            else:
+                pending.append(params)
+        if rows:
+            print(f"Resuming job {job}: {len(rows)} of {len(points)} parameter sets already done")
+    if max_workers is None:
+        max_workers = os.cpu_count() or 1
+    max_workers = max(1, min(max_workers, len(pending)))
+
+    if pending:
+        print(f"Evaluating {len(pending)} parameter sets with {max_workers} worker processes...")
+        with ProcessPoolExecutor(max_workers=max_workers, initializer=_init_worker,
+                                 initargs=(data,)) as executor:
+            futures = {executor.submit(collect, timed_call, _evaluate, params): params for params in pending}
+            for done, future in enumerate(as_completed(futures), start=1):
+                params = futures[future]
+                row = dict(params)
+                try:
+                    (result, started, elapsed), metrics = future.result()
+                    merge(metrics)
+                    row.update(result)
+                    row['Error'] = None
+                    if journal:
+                        journal.record(job, 'sweep', params, result, orders=result['ARIMA Orders'],
+                                       started=started, elapsed=elapsed)
+                except Exception as e:
+                    merge(getattr(e, 'metrics', None))
+                    row['Error'] = str(e)
+                    if journal:
+                        journal.record(job, 'sweep', params, error=str(e))
+                rows.append(row)
+                print(f"[{done}/{len(pending)}] {params}: {metric} = {row.get(metric, 'N/A')}")
+
+    results = pd.DataFrame(rows)
+    if metric not in results.columns:
+        # Every grid point failed, so there is nothing to rank
+        print(f"No parameter set produced {metric}")
+        results.index.name = 'Rank'
+        return results
+    results = results.sort_values(metric, ascending=False, na_position='last').reset_index(drop=True)
+    results.index.name = 'Rank'
+    return results
+
+
+def _parse_grid(items):
+    grid = {}
+    for item in items:
+        name, _, values = item.partition('=')
+        parsed = []
+        for value in values.split(','):
+            try:
+                parsed.append(ast.literal_eval(value))
+            except (ValueError, SyntaxError):
+                parsed.append(value)
+        grid[name] = parsed
+    return grid
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Parameter sweep for the ARIMA trading strategy")
+    parser.add_argument('--grid', action='append', default=None, metavar='NAME=V1,V2,...',
+                        help="Parameter values to sweep, e.g. --grid n_periods=1,3,5 --grid max_p=1,2,3")
+    parser.add_argument('--n-iter', type=int, default=None, help="Random search over N grid points")
+    parser.add_argument('--metric', default='Sharpe Ratio', help="Statistic used for ranking")
+    parser.add_argument('--workers', type=int, default=None, help="Maximum number of worker processes")
+    parser.add_argument('--engine', default="backtesting", choices=['backtesting', 'fast'],
+                        help="Backtest engine (default: backtesting)")
+    parser.add_argument('--start', default="2020-01-01", help="Start date (YYYY-MM-DD)")
+    parser.add_argument('--end', default="2025-06-24", help="End date (YYYY-MM-DD)")
+    parser.add_argument('--journal', default=None,
+                        help="Run journal file (e.g. run_journal.sqlite); completed grid points are skipped on re-runs")
+    args = parser.parse_args(argv)
+
+    param_grid = _parse_grid(args.grid) if args.grid else {
+        'n_periods': [1, 3, 5, 10, 20],
+        'band_agg': ['envelope', 'mean', 'first', 'last'],
+    }
+    # Heatmap axes come from the swept strategy parameters, not from constant backtest settings
+    names = [name for name in param_grid if name not in BACKTEST_PARAMS]
+    param_grid.setdefault('engine', [args.engine])
+
+    data = get_spy_data(for_backtesting=True, date_range=(args.start, args.end))
+    if data is None or data.empty:
+        print("Failed to obtain data. Exiting.")
+        exit(1)
+    data = clean_backtest_data(data)
+
+    results = run_sweep(data, param_grid, n_iter=args.n_iter, metric=args.metric,
+                        max_workers=args.workers, journal=args.journal)
+    print("\n=== Sweep Results ===")
+    print(results.to_string())
+
+    if len(names) >= 2 and args.metric in results.columns:
+        from plotting import create_sweep_heatmap
+        create_sweep_heatmap(results, names[0], names[1], metric=args.metric)
+
+
+if __name__ == "__main__":
+    main()
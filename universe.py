@@ -0,0 +1,178 @@
+"""
+Parallel ARIMA strategy backtests over a universe of tickers
+"""
+
+import argparse
+import contextlib
+import io
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import pandas as pd
+
+from arima_backtesting import clean_backtest_data, describe_orders, run_backtest
+from instrumentation import collect, merge
+from journal import open_journal, timed_call
+from price_store import open_store
+from results_store import ResultsStore, new_run_id
+from utils import get_ticker_data
+
+
+def backtest_ticker(ticker, date_range, cash=10000, commission=.001, strategy_params=None,
+                    allow_synthetic=False, quiet=True, store=None, results=None, run=None):
+    """
+    Load data for one ticker and run the ARIMA strategy backtest on it
+
+    With a ``store`` (``price_store.PriceStore`` or its path) the cleaned data
+    is read from the memory-mapped store instead of being downloaded. With a
+    ``results`` store (``results_store.ResultsStore`` or its directory) the
+    full statistics, trades and equity curve are written there under ``run``.
+
+    Returns:
+        pandas.Series: Scalar backtest statistics (``_equity_curve``, ``_trades``
+        and ``_strategy`` are dropped so results stay cheap to send between
+        processes) and the fitted ``ARIMA Orders``
+    """
+    output = io.StringIO() if quiet else None
+    with contextlib.redirect_stdout(output) if quiet else contextlib.nullcontext():
+        if store is not None:
+            data = open_store(store).frame(ticker, *date_range)
+        else:
+            data = get_ticker_data(ticker, for_backtesting=True, date_range=date_range,
+                                   allow_synthetic=allow_synthetic)
+        if data is None or data.empty:
+            raise ValueError(f"No data available for {ticker}")
+        if store is None:
+            data = clean_backtest_data(data)
+        stats, _ = run_backtest(data, cash=cash, commission=commission, **(strategy_params or {}))
+        if results is not None:
+            results_store = results if isinstance(results, ResultsStore) else ResultsStore(results)
+            results_store.write_backtest(run, ticker, stats, params=dict(strategy_params or {}, cash=cash,
+                                                                         commission=commission))
+
+    result = stats[[key for key in stats.index if not key.startswith('_')]].copy()
+    result['ARIMA Orders'] = describe_orders(stats['_orders'])
+    return result
+
+
+def run_universe(tickers, date_range=("2020-01-01", "2025-06-24"), max_workers=None,
+                 cash=10000, commission=.001, strategy_params=None, allow_synthetic=False, store=None,
+                 journal=None, results=None, run=None):
+    """
+    Backtest the ARIMA strategy on every ticker in a process pool
+
+    Args:
+        tickers (list): Ticker symbols
+        date_range (tuple): (start_date, end_date) as strings
+        max_workers (int): Upper bound on worker processes (default: number of CPUs)
+        cash (float): Initial capital per backtest
+        commission (float): Commission per trade as a fraction
+        strategy_params (dict): Overrides for ARIMAStrategy class parameters
+        allow_synthetic (bool): Backtest on synthetic data when every data source
+            fails for a ticker (default: False)
+        store (PriceStore or str): Read prices from this memory-mapped store
+            (see ``price_store.build_store``); all workers share one copy of it
+        journal (RunJournal or str): Record every finished ticker in this run
+            journal (see ``journal.py``) and skip tickers a previous run with
+            the same settings already completed
+        results (ResultsStore or str): Write every ticker's statistics, trades
+            and equity curve to this results store (see ``results_store.py``)
+        run (str): Run identifier in the results store (default: the journal
+            job, so resumed runs add to the same run, or a new identifier)
+
+    Returns:
+        pandas.DataFrame: One row of statistics per ticker plus an ``Error``
+        column; ``attrs['run']`` holds the results store run
+    """
+    tickers = list(dict.fromkeys(t.upper() for t in tickers))
+    rows = {}
+    if journal:
+        journal = open_journal(journal)
+        # A rebuilt price store may hold different prices, so its contents are part of the key
+        data = open_store(store).fingerprint() if store is not None else 'download'
+        job = journal.start_job('universe', dict(date_range=list(date_range), cash=cash, commission=commission,
+                                                 strategy_params=strategy_params or {},
+                                                 allow_synthetic=allow_synthetic, data=data))
+        rows = {ticker: result for ticker, result in journal.completed(job).items() if ticker in tickers}
+        if rows:
+            print(f"Resuming job {job}: {len(rows)} of {len(tickers)} tickers already done")
+    pending = [ticker for ticker in tickers if ticker not in rows]
+    if results is not None and run is None:
+        run = job if journal else new_run_id()
+    if max_workers is None:
+        max_workers = os.cpu_count() or 1
+    max_workers = max(1, min(max_workers, len(pending)))
+
+    if pending:
+        print(f"Backtesting {len(pending)} tickers with {max_workers} worker processes...")
+        with ProcessPoolExecutor(max_workers=max_workers) as executor:
+            futures = {
+                executor.submit(collect, timed_call, backtest_ticker, ticker, date_range, cash, commission,
+                                strategy_params, allow_synthetic, True, store, results, run): ticker
+                for ticker in pending
+            }
+            for done, future in enumerate(as_completed(futures), start=1):
+                ticker = futures[future]
+                try:
+                    (rows[ticker], started, elapsed), metrics = future.result()
+                    merge(metrics)
+                    print(f"[{done}/{len(pending)}] {ticker}: Return {rows[ticker]['Return [%]']:.2f}%")
+                    if journal:
+                        journal.record(job, 'universe', ticker, rows[ticker], orders=rows[ticker]['ARIMA Orders'],
+                                       started=started, elapsed=elapsed)
+                except Exception as e:
+                    merge(getattr(e, 'metrics', None))
+                    rows[ticker] = pd.Series({'Error': str(e)})
+                    print(f"[{done}/{len(pending)}] {ticker}: failed ({e})")
+                    if journal:
+                        journal.record(job, 'universe', ticker, error=str(e))
+
+    summary = pd.DataFrame.from_dict(rows, orient='index').reindex(tickers)
+    if 'Error' not in summary.columns:
+        summary['Error'] = None
+    summary.index.name = 'Ticker'
+    summary.attrs['run'] = run
+    return summary
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run the ARIMA strategy backtest over a list of tickers")
+    parser.add_argument('tickers', nargs='+', help="Ticker symbols, e.g. SPY QQQ IWM")
+    parser.add_argument('--start', default="2020-01-01", help="Start date (YYYY-MM-DD)")
+    parser.add_argument('--end', default="2025-06-24", help="End date (YYYY-MM-DD)")
+    parser.add_argument('--workers', type=int, default=None, help="Maximum number of worker processes")
+    parser.add_argument('--allow-synthetic', action='store_true',
+                        help="Use synthetic data for tickers whose download fails")
+    parser.add_argument('--store', default=None,
+                        help="Price store directory (see price_store.py) to read prices from instead of downloading")
+    parser.add_argument('--journal', default=None,
+                        help="Run journal file (e.g. run_journal.sqlite); completed tickers are skipped on re-runs")
+    parser.add_argument('--results', default=None,
+                        help="Results store directory (e.g. results) for statistics, trades and equity curves")
+    parser.add_argument('--output', default=None, help="Optional CSV file for the results table")
+    args = parser.parse_args(argv)
+
+    results = run_universe(args.tickers, date_range=(args.start, args.end), max_workers=args.workers,
+                           allow_synthetic=args.allow_synthetic, store=args.store, journal=args.journal,
+                           results=args.results)
+
+    columns = ['Return [%]', 'Sharpe Ratio', 'Max. Drawdown [%]', '# Trades', 'Win Rate [%]', 'Error']
+    print("\n=== Universe Results ===")
+    table = results[[c for c in columns if c in results.columns]]
+    # Without a single successful backtest there is only the Error column
+    if 'Return [%]' in table.columns:
+        table = table.sort_values('Return [%]', ascending=False)
+    print(table)
+
+    if args.output:
+        results.to_csv(args.output)
+        print(f"Results saved to: {args.output}")
+    if args.results:
+        from results_store import build_report
+        run = results.attrs['run']
+        print(f"Results recorded in {args.results} (run {run})")
+        build_report(args.results, runs=[run], path=os.path.join(args.results, 'reports', f"universe_{run}.md"))
+
+
+if __name__ == "__main__":
+    main()
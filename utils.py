@@ -2,19 +2,30 @@
 Utility functions for data download and processing
 """
 
-from alpha_vantage.timeseries import TimeSeries
 import pandas as pd
 import numpy as np
+import hashlib
 import os
-from dotenv import load_dotenv
+from collections import OrderedDict
 
-# Load environment variables from .env file
-load_dotenv()
+from instrumentation import increment, span, timed
 
-def download_data_with_alpha_vantage(ticker, outputsize='full', api_key=None, date_range=None):
+_dotenv_loaded = False
+
+def _load_env():
+    """Load environment variables from the .env file (once, on first use)"""
+    global _dotenv_loaded
+    if not _dotenv_loaded:
+        from dotenv import load_dotenv
+        load_dotenv()
+        _dotenv_loaded = True
+
+def download_data_with_alpha_vantage(ticker, outputsize='full', api_key=None, date_range=None,
+                                     fallback_to_synthetic=True):
     """Download data using Alpha Vantage API with fallback to synthetic data"""
     if api_key is None:
         # Try to get API key from environment variable
+        _load_env()
         api_key = os.getenv('ALPHA_VANTAGE_API_KEY')
         
         if api_key and api_key != 'your_api_key_here':
@@ -31,6 +42,7 @@ def download_data_with_alpha_vantage(ticker, outputsize='full', api_key=None, da
         date_range = ("2024-01-01", "2025-06-01")
     
     try:
+        from alpha_vantage.timeseries import TimeSeries
         print(f"Downloading {ticker} data from Alpha Vantage...")
         ts = TimeSeries(key=api_key, output_format='pandas')
         
@@ -39,6 +51,8 @@ def download_data_with_alpha_vantage(ticker, outputsize='full', api_key=None, da
         
         if data.empty:
             print(f"No data received for {ticker} from Alpha Vantage.")
+            if not fallback_to_synthetic:
+                return None
             return generate_synthetic_spy_data(date_range[0], date_range[1])
         
         # Alpha Vantage returns data in descending order, so we need to reverse it
@@ -54,6 +68,8 @@ def download_data_with_alpha_vantage(ticker, outputsize='full', api_key=None, da
         
     except Exception as e:
         print(f"Error downloading data from Alpha Vantage: {e}")
+        if not fallback_to_synthetic:
+            return None
         print("Using synthetic data for demonstration...")
         return generate_synthetic_spy_data(date_range[0], date_range[1])
 
@@ -85,17 +101,12 @@ def download_data_with_yfinance(ticker, date_range=None):
         print(f"Error downloading data from Yahoo Finance: {e}")
         return None
 
-def download_data_alternative_free_sources(ticker, date_range=None):
-    """Alternative free data sources without API keys"""
+def download_data_from_fred(ticker, date_range=None):
+    """Download S&P 500 index data from FRED (only available for SPY)"""
     # Set default date range if not provided
     if date_range is None:
         date_range = ("2024-01-01", "2025-06-01")
     
-    # Try yfinance first (most reliable free source)
-    yf_data = download_data_with_yfinance(ticker, date_range)
-    if yf_data is not None and not yf_data.empty:
-        return yf_data
-    
     try:
         # Try using pandas_datareader with FRED (Federal Reserve Economic Data)
         # This works for major indices like SP500
@@ -116,34 +127,117 @@ def download_data_alternative_free_sources(ticker, date_range=None):
     
     return None
 
-def generate_synthetic_spy_data(start, end, for_backtesting=False):
+def _download_alpha_vantage_no_fallback(ticker, date_range):
+    return download_data_with_alpha_vantage(ticker, date_range=date_range, fallback_to_synthetic=False)
+
+def _download(ticker, source, fetch, date_range, cache=None):
+    """Run a download function, through the on-disk cache if one is given"""
+    with span('data.fetch', ticker=ticker, source=source):
+        if cache is None:
+            return fetch(ticker, date_range)
+        return cache.get(ticker, source, date_range, fetch)
+
+def _resolve_cache(cache):
+    """Turn the ``cache`` argument (True/False/None or an OHLCVCache) into a cache or None"""
+    if cache is True:
+        from data_cache import OHLCVCache
+        return OHLCVCache()
+    return cache or None
+
+def download_data_alternative_free_sources(ticker, date_range=None, cache=None):
+    """Alternative free data sources without API keys"""
+    # Set default date range if not provided
+    if date_range is None:
+        date_range = ("2024-01-01", "2025-06-01")
+    
+    # Try yfinance first (most reliable free source)
+    yf_data = _download(ticker, 'yfinance', download_data_with_yfinance, date_range, cache)
+    if yf_data is not None and not yf_data.empty:
+        return yf_data
+    
+    return _download(ticker, 'fred', download_data_from_fred, date_range, cache)
+
+def _volatility_paths(rng, n_paths, n_steps, sigma, volatility_model,
+                      regime_multiplier=2.5, regime_persistence=0.98, garch_alpha=0.08, garch_beta=0.9):
+    """Return daily return shocks of shape (n_paths, n_steps) for the given volatility model"""
+    shocks = rng.standard_normal((n_paths, n_steps))
+    if volatility_model is None or volatility_model == 'constant':
+        return sigma * shocks
+    
+    if volatility_model == 'regime':
+        # Two-state Markov switching between calm and turbulent volatility;
+        # calm and turbulent regimes last 1 / (1 - regime_persistence) days on average
+        switches = rng.random((n_paths, n_steps)) > regime_persistence
+        switches[:, 0] = rng.random(n_paths) < 0.5
+        turbulent = np.cumsum(switches, axis=1) % 2 == 1
+        return np.where(turbulent, sigma * regime_multiplier, sigma) * shocks
+    
+    if volatility_model == 'garch':
+        # GARCH(1,1) with the unconditional volatility equal to sigma; the
+        # recursion runs over time but is vectorized across paths
+        omega = sigma ** 2 * (1 - garch_alpha - garch_beta)
+        variance = np.full(n_paths, sigma ** 2)
+        returns = np.empty((n_paths, n_steps))
+        for t in range(n_steps):
+            returns[:, t] = np.sqrt(variance) * shocks[:, t]
+            variance = omega + garch_alpha * returns[:, t] ** 2 + garch_beta * variance
+        return returns
+    
+    raise ValueError(f"Unknown volatility model: {volatility_model}")
+
+def generate_synthetic_paths(n_steps, n_paths=1, base_price=450, mu=0.0005, sigma=0.015, trend=0.0002,
+                             volatility_model=None, seed=42, rng=None):
+    """
+    Generate independent synthetic SPY-like close price paths
+    
+    Args:
+        n_steps (int): Number of prices per path
+        n_paths (int): Number of independent paths
+        base_price (float): Starting price of every path
+        mu (float): Mean daily return
+        sigma (float): Daily return volatility (unconditional for 'garch')
+        trend (float): Additional drift that grows linearly over the path
+        volatility_model (str): None/'constant', 'regime' (two-state switching)
+            or 'garch' (GARCH(1,1))
+        seed (int): Seed for a new ``numpy.random.Generator`` if ``rng`` is None
+        rng (numpy.random.Generator): Generator to draw from
+    
+    Returns:
+        numpy.ndarray: Prices of shape (n_paths, n_steps)
+    """
+    if n_steps < 1:
+        # Every path starts at base_price, so there is no empty path to return
+        raise ValueError(f"n_steps must be at least 1, got {n_steps}")
+    if rng is None:
+        rng = np.random.default_rng(seed)
+    returns = mu + _volatility_paths(rng, n_paths, n_steps, sigma, volatility_model)
+    
+    # Trending behavior: the drift added on step i grows as trend * i / n_steps
+    growth = 1 + returns[:, 1:] + trend * np.arange(n_steps - 1) / n_steps
+    prices = np.empty((n_paths, n_steps))
+    prices[:, 0] = base_price
+    np.cumprod(growth, axis=1, out=prices[:, 1:])
+    prices[:, 1:] *= base_price
+    return prices
+
+def generate_synthetic_spy_data(start, end, for_backtesting=False, seed=42, volatility_model=None):
     """Generate synthetic SPY-like data for demonstration purposes"""
     print("Generating synthetic SPY data for demonstration...")
     date_range = pd.date_range(start=start, end=end, freq='D')
     # Remove weekends
     date_range = date_range[date_range.weekday < 5]
     
-    # Start with a base price around SPY's typical range
-    np.random.seed(42)  # For reproducible results
-    base_price = 450
-    returns = np.random.normal(0.0005, 0.015, len(date_range))  # Daily returns with realistic volatility
-    
-    # Generate price series with some trending behavior
-    prices = [base_price]
-    trend = 0.0002  # Small upward trend
-    for i, ret in enumerate(returns[1:]):
-        # Add some trending behavior
-        trend_component = trend * (i / len(returns))
-        prices.append(prices[-1] * (1 + ret + trend_component))
-    
-    close_prices = np.array(prices)
+    # Local generator for reproducible results without touching the global random state
+    rng = np.random.default_rng(seed)
+    close_prices = generate_synthetic_paths(len(date_range), volatility_model=volatility_model, rng=rng)[0]
     
     if for_backtesting:
         # Create OHLC data for backtesting
-        open_prices = close_prices * (1 + np.random.normal(0, 0.002, len(close_prices)))
-        high_prices = np.maximum(open_prices, close_prices) * (1 + np.abs(np.random.normal(0, 0.008, len(close_prices))))
-        low_prices = np.minimum(open_prices, close_prices) * (1 - np.abs(np.random.normal(0, 0.008, len(close_prices))))
-        volumes = np.random.randint(50000000, 200000000, len(close_prices))
+        n = len(close_prices)
+        open_prices = close_prices * (1 + rng.normal(0, 0.002, n))
+        high_prices = np.maximum(open_prices, close_prices) * (1 + np.abs(rng.normal(0, 0.008, n)))
+        low_prices = np.minimum(open_prices, close_prices) * (1 - np.abs(rng.normal(0, 0.008, n)))
+        volumes = rng.integers(50000000, 200000000, n)
         
         data = pd.DataFrame({
             'Open': open_prices,
@@ -158,50 +252,115 @@ def generate_synthetic_spy_data(start, end, for_backtesting=False):
         # Return only close prices for ARIMA modeling
         return pd.Series(close_prices, index=date_range[:len(close_prices)])
 
-def prepare_data_for_backtesting(data):
-    """Convert data to OHLC format required for backtesting"""
+def _rolling_std(values, window, fill):
+    """
+    Trailing sample standard deviation down axis 0 with ``min_periods=1``
+    
+    Computed from windowed cumulative sums, so the cost does not grow with the
+    window. Rows with a single observation (the first row) get ``fill``.
+    """
+    n = len(values)
+    zeros = np.zeros((1,) + values.shape[1:])
+    s1 = np.concatenate([zeros, np.cumsum(values, axis=0)])
+    s2 = np.concatenate([zeros, np.cumsum(values ** 2, axis=0)])
+    end = np.arange(1, n + 1)
+    start = np.maximum(end - window, 0)
+    count = (end - start).reshape((n,) + (1,) * (values.ndim - 1)).astype(float)
+    total = s1[end] - s1[start]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        variance = (s2[end] - s2[start] - total ** 2 / count) / (count - 1)
+    std = np.sqrt(np.clip(variance, 0, None))
+    std[np.broadcast_to(count == 1, std.shape)] = fill
+    return std
+
+def synthesize_ohlcv(close, seed=42, rng=None, daily_volatility=0.02, window=20, base_volume=100000000):
+    """
+    Fabricate Open, High, Low and Volume around close prices
+    
+    Opens lie between the previous and the current close, highs and lows
+    extend beyond them by a half-normal spread of half the trailing
+    ``window``-bar return volatility, and volume grows with the size of the
+    move. All tickers are processed in one pass.
+    
+    Args:
+        close (numpy.ndarray): Close prices of shape (n_bars,) or (n_bars, n_tickers), without NaNs
+        seed (int): Seed for a new ``numpy.random.Generator`` if ``rng`` is None
+        rng (numpy.random.Generator): Generator to draw from
+        daily_volatility (float): Volatility used where fewer than two returns are available
+        window (int): Bars in the trailing volatility estimate
+        base_volume (float): Volume on a bar without a price change
+    
+    Returns:
+        numpy.ndarray: Array of shape close.shape + (5,) with Open, High, Low, Close, Volume
+    """
+    close = np.asarray(close, dtype=float)
+    if np.isnan(close).any():
+        raise ValueError("Close prices must not contain NaN values")
+    if rng is None:
+        rng = np.random.default_rng(seed)
+    
+    previous = np.concatenate([close[:1], close[:-1]])
+    returns = close / previous - 1
+    spread = 0.5 * _rolling_std(returns, window, daily_volatility)
+    
+    open_ = previous + (close - previous) * rng.uniform(0.1, 0.9, close.shape)
+    high = np.maximum(open_, close) * (1 + np.abs(rng.standard_normal(close.shape) * spread))
+    low = np.minimum(open_, close) * (1 - np.abs(rng.standard_normal(close.shape) * spread))
+    volume = np.floor(base_volume * (1 + np.abs(returns) * 5))
+    return np.stack([open_, high, low, close, volume], axis=-1)
+
+def ohlc_bounds(values):
+    """
+    Make High and Low the maximum and minimum of each bar's prices, in place
+    
+    Args:
+        values (numpy.ndarray): Array whose last axis starts with Open, High, Low, Close
+    
+    Returns:
+        numpy.ndarray: ``values``
+    """
+    # High first, so Low is taken over the corrected bar (a High below the
+    # Low is treated as bad, not as the bar's low)
+    values[..., 1] = values[..., :4].max(axis=-1)
+    values[..., 2] = values[..., :4].min(axis=-1)
+    return values
+
+# Synthesized OHLCV frames keyed by a hash of the close series and the synthesis settings
+_ohlcv_cache = OrderedDict()
+OHLCV_CACHE_SIZE = 64
+
+def _synthesized_frame(close, seed):
+    """OHLCV frame synthesized from a close Series, memoized on its values, index and seed"""
+    key = hashlib.sha256(pd.util.hash_pandas_object(close, index=True).to_numpy().tobytes()
+                         + str(seed).encode()).hexdigest()
+    cached = _ohlcv_cache.get(key)
+    if cached is not None:
+        _ohlcv_cache.move_to_end(key)
+        increment('data.ohlcv_cache_hit')
+        return cached.copy()
+    
+    values = synthesize_ohlcv(close.to_numpy(), seed=seed)
+    frame = pd.DataFrame(values, index=close.index, columns=['Open', 'High', 'Low', 'Close', 'Volume'])
+    frame['Volume'] = frame['Volume'].astype(int)
+    _ohlcv_cache[key] = frame
+    if len(_ohlcv_cache) > OHLCV_CACHE_SIZE:
+        _ohlcv_cache.popitem(last=False)
+    return frame.copy()
+
+def prepare_data_for_backtesting(data, seed=42):
+    """
+    Convert data to OHLC format required for backtesting
+    
+    Close-only Series get synthetic Open, High, Low and Volume (see
+    ``synthesize_ohlcv``), drawn from a generator seeded with ``seed`` and
+    memoized on the close series.
+    """
     if isinstance(data, pd.Series):
         # If we only have close prices, create synthetic OHLC data
         close_data = data.dropna()  # Remove any NaN values first
-        
-        # Generate realistic OHLC data based on close prices
-        np.random.seed(42)  # For reproducible results
-        daily_volatility = 0.02  # 2% typical daily volatility
-        
-        # Calculate daily returns to estimate realistic spreads
-        returns = close_data.pct_change().fillna(0)
-        volatility = returns.rolling(window=20, min_periods=1).std().fillna(daily_volatility)
-        
-        # Generate OHLC with realistic relationships
-        spread_factor = volatility * 0.5  # Half the volatility for intraday spread
-        
-        open_data = close_data.shift(1).fillna(close_data.iloc[0])  # Previous close as open
-        open_data = open_data + (close_data - open_data) * np.random.uniform(0.1, 0.9, len(close_data))
-        
-        high_data = np.maximum(open_data, close_data) * (1 + np.abs(np.random.normal(0, spread_factor, len(close_data))))
-        low_data = np.minimum(open_data, close_data) * (1 - np.abs(np.random.normal(0, spread_factor, len(close_data))))
-        
-        # Ensure proper OHLC relationships
-        high_data = np.maximum(high_data, np.maximum(open_data, close_data))
-        low_data = np.minimum(low_data, np.minimum(open_data, close_data))
-        
-        # Generate realistic volume based on price movements
-        price_change = np.abs(returns)
-        base_volume = 100000000  # 100M average volume
-        volume_data = base_volume * (1 + price_change * 5)  # Higher volume on big moves
-        
-        result_data = pd.DataFrame({
-            'Open': open_data,
-            'High': high_data,
-            'Low': low_data,
-            'Close': close_data,
-            'Volume': volume_data.astype(int)
-        }, index=close_data.index)
-        
-        # Final cleanup to ensure no NaN values
-        result_data = result_data.ffill().bfill().dropna()
-        
-        return result_data
+        if close_data.empty:
+            raise ValueError("Cannot convert an empty close series to OHLC")
+        return _synthesized_frame(close_data, seed)
     
     elif isinstance(data, pd.DataFrame):
         # Check if it's already in the right format
@@ -227,16 +386,45 @@ def prepare_data_for_backtesting(data):
     # If we can't handle the format, raise an error
     raise ValueError(f"Cannot convert data format to OHLC. Data type: {type(data)}, Columns: {data.columns if hasattr(data, 'columns') else 'N/A'}")
 
-def get_spy_data(for_backtesting=False, date_range=None):
+def _race_data_sources(ticker, date_range, cache=None, hedge_delay=1.0):
+    """Query yfinance, FRED and Alpha Vantage concurrently, keeping their priority order"""
+    from functools import partial
+    from async_fetch import race_sources
+    
+    sources = [
+        ('yfinance', download_data_with_yfinance),
+        ('fred', download_data_from_fred),
+        ('alpha_vantage', _download_alpha_vantage_no_fallback),
+    ]
+    # Every source goes through _download for the cache and the timing span
+    sources = [(name, partial(_source_fetch, cache, name, fetch)) for name, fetch in sources]
+    name, data = race_sources(ticker, date_range, sources, hedge_delay=hedge_delay)
+    if name is not None:
+        print(f"Successfully obtained data from {name}!")
+    return data
+
+def _source_fetch(cache, source, fetch, ticker, date_range):
+    return _download(ticker, source, fetch, date_range, cache)
+
+@timed('data.get_ticker_data')
+def get_ticker_data(ticker, for_backtesting=False, date_range=None, cache=True, allow_synthetic=True,
+                    race=True):
     """
-    Main function to get SPY data with multiple fallback options
+    Main function to get price data for a ticker with multiple fallback options
     
     Args:
+        ticker (str): Ticker symbol, e.g. "SPY"
         for_backtesting (bool): If True, returns OHLC data suitable for backtesting
         date_range (tuple): (start_date, end_date) as strings
+        cache (bool or OHLCVCache): Serve downloads from the on-disk cache in
+            ``data_cache/`` and only fetch missing data (default: True)
+        allow_synthetic (bool): Fall back to synthetic data if every source
+            fails; otherwise None is returned (default: True)
+        race (bool): Query the data sources concurrently with per-source
+            deadlines instead of one after another (default: True)
     
     Returns:
-        pandas.DataFrame or pandas.Series: SPY data
+        pandas.DataFrame or pandas.Series: Price data
     """
     # Set default date range
     if date_range is None:
@@ -245,24 +433,34 @@ def get_spy_data(for_backtesting=False, date_range=None):
         else:
             date_range = ("2024-01-01", "2025-06-01")
     
-    print(f"Starting data download for SPY (backtesting: {for_backtesting})...")
+    print(f"Starting data download for {ticker} (backtesting: {for_backtesting})...")
     data = None
+    cache = _resolve_cache(cache)
     
-    # Try free alternatives first (yfinance is much more reliable)
-    print("Trying free data sources...")
-    alt_data = download_data_alternative_free_sources("SPY", date_range=date_range)
-    if alt_data is not None and not alt_data.empty:
-        data = alt_data
-        print("Successfully obtained data from free sources!")
+    if race:
+        # Same priority order as below, but slow sources do not block the others
+        print("Querying data sources concurrently...")
+        data = _race_data_sources(ticker, date_range, cache=cache)
+    else:
+        # Try free alternatives first (yfinance is much more reliable)
+        print("Trying free data sources...")
+        alt_data = download_data_alternative_free_sources(ticker, date_range=date_range, cache=cache)
+        if alt_data is not None and not alt_data.empty:
+            data = alt_data
+            print("Successfully obtained data from free sources!")
     
     # Only try Alpha Vantage as a fallback if free sources fail
-    if data is None or data.empty:
+    if not race and (data is None or data.empty):
         print("Free sources failed, trying Alpha Vantage...")
-        data = download_data_with_alpha_vantage("SPY", date_range=date_range)
+        data = _download(ticker, 'alpha_vantage', _download_alpha_vantage_no_fallback, date_range, cache)
     
     # If all else fails, use synthetic data
     if data is None or data.empty:
+        if not allow_synthetic:
+            print(f"All data sources failed for {ticker}.")
+            return None
         print("All data sources failed. Using synthetic data...")
+        increment('data.synthetic_fallback')
         data = generate_synthetic_spy_data(date_range[0], date_range[1], for_backtesting=for_backtesting)
     
     # Prepare data for backtesting if needed
@@ -281,3 +479,18 @@ def get_spy_data(for_backtesting=False, date_range=None):
                 data = data.iloc[:, 0]
     
     return data
+
+def get_spy_data(for_backtesting=False, date_range=None, cache=True):
+    """
+    Main function to get SPY data with multiple fallback options
+    
+    Args:
+        for_backtesting (bool): If True, returns OHLC data suitable for backtesting
+        date_range (tuple): (start_date, end_date) as strings
+        cache (bool or OHLCVCache): Serve downloads from the on-disk cache in
+            ``data_cache/`` and only fetch missing data (default: True)
+    
+    Returns:
+        pandas.DataFrame or pandas.Series: SPY data
+    """
+    return get_ticker_data("SPY", for_backtesting=for_backtesting, date_range=date_range, cache=cache)
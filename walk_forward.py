@@ -0,0 +1,89 @@
+"""
+Walk-forward ARIMA model that is advanced bar-by-bar with Kalman filter updates
+"""
+
+from collections import deque
+
+import numpy as np
+from model_cache import cached_auto_arima
+
+
+class WalkForwardARIMA:
+    """
+    ARIMA model for rolling (walk-forward) forecasting.
+
+    The order is selected with ``auto_arima`` on a training window. Each new
+    observation is then appended to the fitted state-space model with a single
+    Kalman filter step (``SARIMAXResults.extend``), keeping the estimated
+    coefficients fixed. Every ``reselect_every`` observations the order and
+    coefficients are selected again on the most recent ``train_window`` bars.
+
+    Parameters:
+    -----------
+    train_window : int, optional
+        Number of most recent observations used for order selection (default: 252)
+    reselect_every : int or None, optional
+        Number of updates between full re-selections; ``None`` or 0 disables
+        re-selection (default: 63)
+    cache : ModelCache or bool, optional
+        Model selection cache passed to ``cached_auto_arima`` (default: True)
+    **arima_kwargs
+        Keyword arguments passed on to ``auto_arima``
+    """
+
+    def __init__(self, train_window=252, reselect_every=63, cache=True, **arima_kwargs):
+        self.train_window = train_window
+        self.reselect_every = reselect_every
+        self.cache = cache
+        self.arima_kwargs = dict(seasonal=False, stepwise=True, max_p=3, max_q=3,
+                                 suppress_warnings=True)
+        self.arima_kwargs.update(arima_kwargs)
+
+        self.order = None
+        self.results = None
+        self._history = deque(maxlen=train_window)
+        self._updates_since_selection = 0
+
+    @property
+    def is_fitted(self):
+        return self.results is not None
+
+    def fit(self, y):
+        """Select the order and fit the coefficients on the last ``train_window`` values of ``y``"""
+        y = np.asarray(y, dtype=float)[-self.train_window:]
+        model = cached_auto_arima(y, cache=self.cache, **self.arima_kwargs)
+        self.order = model.order
+        self.results = model.arima_res_
+        self._history.clear()
+        self._history.extend(y)
+        self._updates_since_selection = 0
+        return self
+
+    def update(self, value):
+        """Advance the model by one (or more) new observations"""
+        if not self.is_fitted:
+            raise RuntimeError("WalkForwardARIMA.update() called before fit()")
+
+        values = np.atleast_1d(np.asarray(value, dtype=float))
+        self._history.extend(values)
+        self._updates_since_selection += len(values)
+        self.results = self.results.extend(values)
+
+        if self.reselect_every and self._updates_since_selection >= self.reselect_every:
+            self.fit(self._history)
+        return self
+
+    def forecast(self, n_periods=5, alpha=0.05):
+        """
+        Forecast from the current state
+
+        Returns:
+            tuple: (forecast, conf_int) as NumPy arrays, ``conf_int`` has shape (n_periods, 2)
+        """
+        if not self.is_fitted:
+            raise RuntimeError("WalkForwardARIMA.forecast() called before fit()")
+
+        prediction = self.results.get_forecast(n_periods)
+        forecast = np.asarray(prediction.predicted_mean)
+        conf_int = np.asarray(prediction.conf_int(alpha=alpha))
+        return forecast, conf_int